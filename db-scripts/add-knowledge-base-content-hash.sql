@@ -0,0 +1,11 @@
+-- Track what each knowledge base embedding was computed from
+-- content_hash is the hex SHA-256 of "<chunker version>\n<embedding model>\n<chunk text>"
+-- (see lib/knowledge_ingest.py). Re-indexing compares it with the current
+-- chunks and only embeds chunks that are new or changed. Rows written before
+-- this column existed have a NULL hash and are re-embedded once.
+ALTER TABLE knowledge_base_embeddings
+ADD COLUMN IF NOT EXISTS content_hash TEXT;
+
+-- Re-indexing reads the stored hashes of a source and deletes rows by content_id
+CREATE INDEX IF NOT EXISTS knowledge_base_embeddings_source_content_id_idx
+ON knowledge_base_embeddings (source, content_id);
@@ -0,0 +1,6 @@
+-- Record where each knowledge base chunk came from
+-- provenance is written by lib/knowledge_ingest.py from lib/chunker.py: the
+-- file, guideline or protocol, section, page range, window number within
+-- the section and chunker version.
+ALTER TABLE knowledge_base_embeddings
+ADD COLUMN IF NOT EXISTS provenance JSONB;
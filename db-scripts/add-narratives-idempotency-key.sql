@@ -0,0 +1,9 @@
+-- Add an idempotency key to narratives
+-- Narratives queued in the offline outbox carry a client-generated key, so a
+-- batch that is replayed after a lost response does not create duplicates.
+ALTER TABLE public.narratives
+  ADD COLUMN IF NOT EXISTS idempotency_key text;
+
+-- Unique index used as the upsert conflict target
+CREATE UNIQUE INDEX IF NOT EXISTS narratives_idempotency_key_idx
+  ON public.narratives (idempotency_key);
@@ -0,0 +1,11 @@
+-- Backfill ISO dates on sessions
+-- Sessions used to store their date as "Apr 26, 2025". New sessions store
+-- "2025-04-26", and the session list pages through sessions ordered by
+-- (date, id), which only sorts chronologically with ISO dates.
+UPDATE public.sessions
+SET date = to_char(to_date(date, 'Mon DD, YYYY'), 'YYYY-MM-DD')
+WHERE date ~ '^[A-Z][a-z]{2} [0-9]{1,2}, [0-9]{4}$';
+
+-- Index for paging through a user's sessions newest first
+CREATE INDEX IF NOT EXISTS sessions_user_id_date_id_idx
+  ON public.sessions (user_id, date DESC, id DESC);
@@ -0,0 +1,49 @@
+-- Benchmark for match_embeddings
+-- Compares the plan of the old query shape (similarity threshold in WHERE,
+-- ORDER BY the similarity alias) with the index-driven shape used by
+-- create-match-embeddings-procedure.sql.
+--
+-- Usage: psql "$PG_CONNECTION_STRING" -f db-scripts/benchmark-match-embeddings.sql
+--
+-- Expected: the old shape shows "Seq Scan on knowledge_base_embeddings" under
+-- a Sort node; the new shape shows "Index Scan using ..._hnsw_..." (or the
+-- ivfflat index) under a Limit node, with far fewer buffers read.
+
+\timing on
+
+-- Use a stored embedding as the query vector
+SELECT embedding::TEXT AS query_embedding, source AS query_source
+FROM knowledge_base_embeddings
+ORDER BY random()
+LIMIT 1 \gset
+
+\echo '== Old: threshold in WHERE, ORDER BY similarity =='
+EXPLAIN (ANALYZE, BUFFERS, COSTS OFF)
+SELECT kbe.id, 1 - (kbe.embedding <=> :'query_embedding'::VECTOR) AS similarity
+FROM knowledge_base_embeddings kbe
+WHERE kbe.source = ANY(ARRAY[:'query_source'])
+  AND 1 - (kbe.embedding <=> :'query_embedding'::VECTOR) > 0.7
+ORDER BY similarity DESC
+LIMIT 5;
+
+\echo '== New: ORDER BY distance LIMIT k, threshold afterwards =='
+SET ivfflat.probes = 10;
+SET hnsw.ef_search = 40;
+EXPLAIN (ANALYZE, BUFFERS, COSTS OFF)
+SELECT nearest.id, 1 - nearest.distance AS similarity
+FROM (
+  SELECT kbe.id, kbe.embedding <=> :'query_embedding'::VECTOR AS distance
+  FROM knowledge_base_embeddings kbe
+  WHERE kbe.source = :'query_source'
+  ORDER BY kbe.embedding <=> :'query_embedding'::VECTOR
+  LIMIT 5
+) nearest
+WHERE 1 - nearest.distance > 0.7
+ORDER BY nearest.distance;
+RESET ivfflat.probes;
+RESET hnsw.ef_search;
+
+\echo '== match_embeddings end to end (probes 1, 10, 100) =='
+SELECT count(*) FROM match_embeddings(:'query_embedding'::VECTOR, 0.7, 5, ARRAY[:'query_source'], 1);
+SELECT count(*) FROM match_embeddings(:'query_embedding'::VECTOR, 0.7, 5, ARRAY[:'query_source'], 10);
+SELECT count(*) FROM match_embeddings(:'query_embedding'::VECTOR, 0.7, 5, ARRAY[:'query_source'], 100);
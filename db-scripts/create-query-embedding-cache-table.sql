@@ -0,0 +1,17 @@
+-- Cache of query embeddings
+-- Shared by the protocol-query edge function and the Python app
+-- (EMBEDDING_CACHE_BACKEND=postgres) so repeated questions such as
+-- "stroke protocol" are embedded once. cache_key is the hex SHA-256 of
+-- "<model>\n<lowercased, whitespace-collapsed text>"; embedding holds the
+-- vector as packed little-endian float32 (4 bytes per dimension), about a
+-- quarter of the size of a JSON array of numbers.
+CREATE TABLE IF NOT EXISTS public.query_embedding_cache (
+  cache_key TEXT PRIMARY KEY,
+  model TEXT NOT NULL,
+  dimensions INT NOT NULL,
+  embedding BYTEA NOT NULL,
+  created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Only the service role and direct database connections use the cache
+ALTER TABLE public.query_embedding_cache ENABLE ROW LEVEL SECURITY;
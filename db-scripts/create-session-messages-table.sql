@@ -0,0 +1,55 @@
+-- Create an append-only session_messages table
+-- Each chat message is one row, so adding a message is a single insert
+-- instead of rewriting the whole sessions.messages array.
+CREATE TABLE IF NOT EXISTS public.session_messages (
+  id bigint GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+  session_id text NOT NULL REFERENCES public.sessions(id) ON DELETE CASCADE,
+  user_id uuid REFERENCES auth.users(id) ON DELETE CASCADE,
+  type text NOT NULL CHECK (type IN ('user', 'assistant')),
+  content text NOT NULL,
+  timestamp text,
+  created_at timestamp with time zone DEFAULT now() NOT NULL
+);
+
+-- Index for loading a session's messages in order
+CREATE INDEX IF NOT EXISTS session_messages_session_id_created_at_idx
+  ON public.session_messages (session_id, created_at, id);
+
+-- Add RLS policies
+ALTER TABLE public.session_messages ENABLE ROW LEVEL SECURITY;
+
+-- Policy to allow users to select messages from their own sessions
+CREATE POLICY "Users can view their own session messages" 
+  ON public.session_messages 
+  FOR SELECT 
+  USING (auth.uid() = user_id);
+
+-- Policy to allow users to append messages to their own sessions
+CREATE POLICY "Users can insert their own session messages" 
+  ON public.session_messages 
+  FOR INSERT 
+  WITH CHECK (auth.uid() = user_id);
+
+-- Policy to allow users to delete their own session messages
+CREATE POLICY "Users can delete their own session messages" 
+  ON public.session_messages 
+  FOR DELETE 
+  USING (auth.uid() = user_id);
+
+-- Migrate existing messages out of the sessions.messages JSON array,
+-- preserving their original order
+INSERT INTO public.session_messages (session_id, user_id, type, content, timestamp, created_at)
+SELECT
+  s.id,
+  s.user_id,
+  m.value->>'type',
+  m.value->>'content',
+  m.value->>'timestamp',
+  now() + (m.ordinality * interval '1 microsecond')
+FROM
+  public.sessions s
+  CROSS JOIN LATERAL jsonb_array_elements(coalesce(s.messages::jsonb, '[]'::jsonb)) WITH ORDINALITY AS m(value, ordinality)
+WHERE
+  NOT EXISTS (
+    SELECT 1 FROM public.session_messages sm WHERE sm.session_id = s.id
+  );
@@ -5,6 +5,9 @@
  * for use with the RAG system. It should be run once to set up the knowledge base.
  * 
  * Usage: node initialize-knowledge-base.js
+ *
+ * For a faster, resumable rebuild (batched embeddings, bulk COPY), use the
+ * Python pipeline instead: cd eznarratives_reflex_kivy && python -m lib.knowledge_ingest
  */
 
 import { createClient } from '@supabase/supabase-js';
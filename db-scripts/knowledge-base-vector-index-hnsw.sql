@@ -0,0 +1,17 @@
+-- Vector index option 2: replace the ivfflat index with one HNSW index
+-- Requires pgvector >= 0.5.0.
+--
+-- Run only one of the knowledge-base-vector-index-*.sql scripts.
+--
+-- HNSW gives better recall at the same latency, needs no training step and
+-- stays accurate as rows are added, at the cost of a slower build and more
+-- memory. Tune recall per call with match_embeddings(..., ef_search => n).
+
+DROP INDEX IF EXISTS knowledge_base_embeddings_embedding_idx;
+CREATE INDEX IF NOT EXISTS knowledge_base_embeddings_embedding_hnsw_idx
+  ON knowledge_base_embeddings
+  USING hnsw (embedding vector_cosine_ops)
+  WITH (m = 16, ef_construction = 64);
+
+-- Refresh planner statistics for the new index
+ANALYZE knowledge_base_embeddings;
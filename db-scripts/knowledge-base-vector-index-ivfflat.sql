@@ -0,0 +1,18 @@
+-- Vector index option 1: rebuild the ivfflat index for knowledge_base_embeddings
+-- Run after the knowledge base has been loaded (initialize-knowledge-base.js);
+-- ivfflat picks its lists from the rows present at build time.
+--
+-- Run only one of the knowledge-base-vector-index-*.sql scripts.
+--
+-- supabase-setup.sql creates this index with lists = 100. Rebuild it with
+-- about rows / 1000 lists (at least 10) once the table is loaded, and probe
+-- about sqrt(lists) lists per query with match_embeddings(..., probes => n).
+
+DROP INDEX IF EXISTS knowledge_base_embeddings_embedding_idx;
+CREATE INDEX knowledge_base_embeddings_embedding_idx
+  ON knowledge_base_embeddings
+  USING ivfflat (embedding vector_cosine_ops)
+  WITH (lists = 10);
+
+-- Refresh planner statistics for the new index
+ANALYZE knowledge_base_embeddings;
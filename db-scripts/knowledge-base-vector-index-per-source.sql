@@ -0,0 +1,32 @@
+-- Vector index option 3: one partial HNSW index per knowledge base source
+-- Requires pgvector >= 0.5.0. Run after the knowledge base has been loaded
+-- (initialize-knowledge-base.js), and again when a source is added.
+--
+-- Run only one of the knowledge-base-vector-index-*.sql scripts.
+--
+-- match_embeddings searches one source at a time with the source inlined, so
+-- the planner picks the source's own index. A filtered search then walks only
+-- that source's graph instead of discarding other sources' rows after the
+-- index scan, which can return fewer than match_count rows. Every search is
+-- filtered by source, so the table-wide ivfflat index is dropped.
+
+DROP INDEX IF EXISTS knowledge_base_embeddings_embedding_idx;
+
+DO $$
+DECLARE
+  src TEXT;
+BEGIN
+  FOR src IN SELECT DISTINCT source FROM knowledge_base_embeddings LOOP
+    EXECUTE format(
+      'CREATE INDEX IF NOT EXISTS %I ON knowledge_base_embeddings
+         USING hnsw (embedding vector_cosine_ops) WITH (m = 16, ef_construction = 64)
+         WHERE source = %L',
+      'knowledge_base_embeddings_hnsw_' || md5(src),
+      src
+    );
+  END LOOP;
+END;
+$$;
+
+-- Refresh planner statistics for the new indexes
+ANALYZE knowledge_base_embeddings;
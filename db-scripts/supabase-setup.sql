@@ -12,15 +12,23 @@ CREATE TABLE IF NOT EXISTS knowledge_base_embeddings (
   content TEXT NOT NULL,
   embedding VECTOR(1536),
   source TEXT NOT NULL,
+  content_hash TEXT,
+  provenance JSONB,
   created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
--- Create an index for similarity search
+-- Create an index for similarity search (see the
+-- knowledge-base-vector-index-*.sql scripts for the rebuild, HNSW and
+-- per-source options)
 CREATE INDEX IF NOT EXISTS knowledge_base_embeddings_embedding_idx 
 ON knowledge_base_embeddings 
 USING ivfflat (embedding vector_cosine_ops) 
 WITH (lists = 100);
 
+-- Used by incremental re-indexing (lib/knowledge_ingest.py)
+CREATE INDEX IF NOT EXISTS knowledge_base_embeddings_source_content_id_idx
+ON knowledge_base_embeddings (source, content_id);
+
 -- Create a table to track knowledge base sources
 CREATE TABLE IF NOT EXISTS knowledge_base_sources (
   id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
@@ -116,11 +124,34 @@ CREATE POLICY "Users can update their own KB preferences"
   USING (auth.uid() = user_id);
 
 -- Create a stored procedure for vector similarity search
+--
+-- The nearest neighbours are found with ORDER BY embedding <=> query LIMIT k,
+-- which is the only shape pgvector can answer from an ivfflat/hnsw index.
+-- Filtering on the computed similarity in WHERE (as earlier versions did)
+-- forces a sequential scan, so the threshold is applied to the k results.
+--
+-- Each source is searched in its own subquery with the source inlined as a
+-- literal, so the per-source partial indexes from
+-- knowledge-base-vector-index-per-source.sql can be used, and a selective
+-- source filter cannot starve the result of rows.
+--
+-- Migrating existing callers: earlier versions of this script took
+-- source_paths (knowledge_base_sources.file_path values) as the fourth
+-- argument. match_embeddings now takes the source ids themselves as
+-- source_filter. Callers that still pass file paths should call
+-- match_embeddings_by_path below with the same arguments instead.
+
+-- The signature gained the probes/ef_search arguments; drop the old one so
+-- RPC calls with four arguments are not ambiguous
+DROP FUNCTION IF EXISTS match_embeddings(VECTOR(1536), FLOAT, INT, TEXT[]);
+
 CREATE OR REPLACE FUNCTION match_embeddings(
   query_embedding VECTOR(1536),
   match_threshold FLOAT,
   match_count INT,
-  source_paths TEXT[]
+  source_filter TEXT[],
+  probes INT DEFAULT 10,
+  ef_search INT DEFAULT 40
 )
 RETURNS TABLE (
   id UUID,
@@ -132,30 +163,69 @@ RETURNS TABLE (
 )
 LANGUAGE plpgsql
 AS $$
+DECLARE
+  per_source TEXT;
 BEGIN
-  RETURN QUERY
-  SELECT
-    kbe.id,
-    kbe.content_id,
-    kbe.title,
-    kbe.content,
-    kbe.source,
-    1 - (kbe.embedding <=> query_embedding) AS similarity
-  FROM
-    knowledge_base_embeddings kbe
-  WHERE
-    kbe.source IN (
-      SELECT id FROM knowledge_base_sources 
-      WHERE file_path = ANY(source_paths)
-    )
-    AND 1 - (kbe.embedding <=> query_embedding) > match_threshold
-  ORDER BY
-    similarity DESC
-  LIMIT
-    match_count;
+  -- Recall/speed trade-off for this call only (is_local = true)
+  PERFORM set_config('ivfflat.probes', probes::TEXT, true);
+  PERFORM set_config('hnsw.ef_search', GREATEST(ef_search, match_count)::TEXT, true);
+
+  SELECT string_agg(format(
+    '(SELECT kbe.id, kbe.content_id, kbe.title, kbe.content, kbe.source,
+             kbe.embedding <=> $1 AS distance
+      FROM knowledge_base_embeddings kbe
+      WHERE kbe.source = %L
+      ORDER BY kbe.embedding <=> $1
+      LIMIT $2)', src), ' UNION ALL ')
+  INTO per_source
+  FROM unnest(source_filter) AS src;
+
+  IF per_source IS NULL THEN
+    RETURN;
+  END IF;
+
+  RETURN QUERY EXECUTE format(
+    'SELECT nearest.id, nearest.content_id, nearest.title, nearest.content, nearest.source,
+            1 - nearest.distance AS similarity
+     FROM (%s) nearest
+     WHERE 1 - nearest.distance > $3
+     ORDER BY nearest.distance
+     LIMIT $2', per_source)
+  USING query_embedding, match_count, match_threshold;
 END;
 $$;
 
+-- Path-based lookup kept for callers of the old source_paths signature. It
+-- cannot keep the name match_embeddings: a second four-argument overload
+-- would make positional calls to the function above ambiguous.
+CREATE OR REPLACE FUNCTION match_embeddings_by_path(
+  query_embedding VECTOR(1536),
+  match_threshold FLOAT,
+  match_count INT,
+  source_paths TEXT[]
+)
+RETURNS TABLE (
+  id UUID,
+  content_id TEXT,
+  title TEXT,
+  content TEXT,
+  source TEXT,
+  similarity FLOAT
+)
+LANGUAGE sql
+AS $$
+  SELECT *
+  FROM match_embeddings(
+    query_embedding,
+    match_threshold,
+    match_count,
+    ARRAY(
+      SELECT kbs.id::TEXT FROM knowledge_base_sources kbs
+      WHERE kbs.file_path = ANY(source_paths)
+    )
+  );
+$$;
+
 -- Create a function that can be called to create the procedure
 CREATE OR REPLACE FUNCTION create_match_embeddings_procedure()
 RETURNS VOID
@@ -5,7 +5,12 @@ EZ Narratives - Reflex Web Application
 This is the main entry point for the Reflex web application.
 """
 
+import contextlib
 import reflex as rx
+from lib.narrative_repository import narrative_repository
+from lib.knowledge_base import knowledge_base
+from lib.connectivity import connectivity_monitor
+from lib.openai_client import close_client
 from .app.states.session_state import SessionState
 from .app.states.ui_state import UIState
 from .app.states.ems_state import EMSState
@@ -24,6 +29,22 @@ app = rx.App(
     ],
 )
 
+@contextlib.asynccontextmanager
+async def app_services():
+    """Start shared services with the server and release them when it stops."""
+    # Build the knowledge base index before the first narrative needs it
+    knowledge_base.start()
+    yield
+    await knowledge_base.close()
+    # Stop the shared connectivity poller the state watchers wait on
+    await connectivity_monitor.stop()
+    # Narratives still in the write-behind queue would otherwise be lost
+    await narrative_repository.close()
+    # Close the pooled OpenAI connections last; nothing above needs them
+    await close_client()
+
+app.register_lifespan_task(app_services)
+
 # Define the index page
 def index() -> rx.Component:
     """The main index page."""
@@ -34,6 +34,8 @@ class ChatPanel(rx.Component):
     is_recording: bool
     toggle_speech_recognition: Callable[[], None]
     transcript: str
+    has_older_messages: bool
+    on_load_older: Callable[[], None]
 
 
 def chat_panel(
@@ -45,6 +47,8 @@ def chat_panel(
     is_recording: bool = False,
     toggle_speech_recognition: Callable[[], None] = None,
     transcript: str = "",
+    has_older_messages: bool = False,
+    on_load_older: Callable[[], None] = None,
 ) -> rx.Component:
     """Create a chat panel component.
     
@@ -57,6 +61,8 @@ def chat_panel(
         is_recording: Whether speech recognition is active.
         toggle_speech_recognition: Function to toggle speech recognition.
         transcript: Current speech recognition transcript.
+        has_older_messages: Whether older messages can be loaded.
+        on_load_older: Function to load the previous window of messages.
         
     Returns:
         A chat panel component.
@@ -68,6 +74,20 @@ def chat_panel(
             # Chat messages area
             rx.box(
                 rx.vstack(
+                    # Load older messages (only when more history exists)
+                    rx.cond(
+                        has_older_messages,
+                        rx.button(
+                            rx.hstack(
+                                rx.icon("chevron-up", size=4),
+                                rx.text("Load older messages", size="sm"),
+                            ),
+                            variant="ghost",
+                            size="sm",
+                            width="100%",
+                            on_click=on_load_older,
+                        ),
+                    ),
                     *[
                         rx.box(
                             rx.vstack(
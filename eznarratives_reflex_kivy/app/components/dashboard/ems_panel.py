@@ -8,6 +8,9 @@ This component provides a form interface for generating EMS narratives.
 import reflex as rx
 from typing import Dict, Any, List, Callable, Optional
 
+from app.components.dashboard.form_sync import field_sync_handlers, flush_pending_fields
+from app.components.dashboard.generation_controls import generation_controls
+
 
 class EMSPanel(rx.Component):
     """A component for the EMS narrative form."""
@@ -21,12 +24,22 @@ class EMSPanel(rx.Component):
     # Define the properties
     narrative_text: str
     on_generate_narrative: Callable[[Dict[str, Any]], None]
+    on_update_fields: Callable[[Dict[str, Any]], None]
+    is_generating: bool
+    generation_status: str
+    generation_progress: int
+    on_cancel: Callable[[], None]
     default_form_data: Dict[str, Any]
 
 
 def ems_panel(
     narrative_text: str = "No narrative generated yet. Fill out the form below and click 'Generate Narrative'.",
     on_generate_narrative: Optional[Callable[[Dict[str, Any]], None]] = None,
+    on_update_fields: Optional[Callable[[Dict[str, Any]], None]] = None,
+    is_generating: bool = False,
+    generation_status: str = "",
+    generation_progress: int = 0,
+    on_cancel: Optional[Callable[[], None]] = None,
     default_form_data: Optional[Dict[str, Any]] = None,
 ) -> rx.Component:
     """Create an EMS panel component.
@@ -34,6 +47,11 @@ def ems_panel(
     Args:
         narrative_text: The generated narrative text.
         on_generate_narrative: Function to handle narrative generation.
+        on_update_fields: Bulk setter that receives batched field edits.
+        is_generating: Whether a narrative is being generated.
+        generation_status: Description of the current generation step.
+        generation_progress: Generation progress in percent.
+        on_cancel: Function to cancel the running generation.
         default_form_data: Default values for the form.
         
     Returns:
@@ -85,6 +103,13 @@ def ems_panel(
         "custom_format": default_form_data.get("custom_format", "") if default_form_data else "",
     })
     
+    # Field edits not yet flushed to the server
+    pending_fields = rx.State({})
+    
+    def sync_field(field: str) -> Dict[str, Any]:
+        """Batched change/blur handlers for a form field."""
+        return field_sync_handlers(field, form_data, pending_fields, on_update_fields)
+    
     # Dropdown options
     response_delay_options = ["No response delays", "Weather", "Traffic", "Distance", "Directions", "Custom"]
     sex_options = ["Male", "Female", "Other"]
@@ -107,8 +132,11 @@ def ems_panel(
     
     def handle_submit(form_data):
         """Handle form submission."""
+        # Flush pending edits so the server state is current before generating
+        events = flush_pending_fields(pending_fields, on_update_fields)
         if on_generate_narrative:
-            on_generate_narrative(form_data)
+            events.append(on_generate_narrative(form_data))
+        return events
     
     return rx.motion.div(
         rx.flex(
@@ -165,7 +193,7 @@ def ems_panel(
                                             rx.input(
                                                 id="unit",
                                                 value=form_data["unit"],
-                                                on_change=lambda value: form_data.update({"unit": value}),
+                                                **sync_field("unit"),
                                             ),
                                             spacing="1",
                                         ),
@@ -174,7 +202,7 @@ def ems_panel(
                                             rx.input(
                                                 id="dispatch_reason",
                                                 value=form_data["dispatch_reason"],
-                                                on_change=lambda value: form_data.update({"dispatch_reason": value}),
+                                                **sync_field("dispatch_reason"),
                                             ),
                                             spacing="1",
                                         ),
@@ -184,7 +212,7 @@ def ems_panel(
                                                 response_delay_options,
                                                 id="response_delay",
                                                 value=form_data["response_delay"],
-                                                on_change=lambda value: form_data.update({"response_delay": value}),
+                                                **sync_field("response_delay"),
                                             ),
                                             spacing="1",
                                             col_span=2,
@@ -196,7 +224,7 @@ def ems_panel(
                                                 rx.input(
                                                     id="response_delay_custom",
                                                     value=form_data["response_delay_custom"],
-                                                    on_change=lambda value: form_data.update({"response_delay_custom": value}),
+                                                    **sync_field("response_delay_custom"),
                                                 ),
                                                 spacing="1",
                                                 col_span=2,
@@ -222,7 +250,7 @@ def ems_panel(
                                                 sex_options,
                                                 id="patient_sex",
                                                 value=form_data["patient_sex"],
-                                                on_change=lambda value: form_data.update({"patient_sex": value}),
+                                                **sync_field("patient_sex"),
                                             ),
                                             spacing="1",
                                         ),
@@ -231,7 +259,7 @@ def ems_panel(
                                             rx.input(
                                                 id="patient_age",
                                                 value=form_data["patient_age"],
-                                                on_change=lambda value: form_data.update({"patient_age": value}),
+                                                **sync_field("patient_age"),
                                             ),
                                             spacing="1",
                                         ),
@@ -240,7 +268,7 @@ def ems_panel(
                                             rx.input(
                                                 id="chief_complaint",
                                                 value=form_data["chief_complaint"],
-                                                on_change=lambda value: form_data.update({"chief_complaint": value}),
+                                                **sync_field("chief_complaint"),
                                             ),
                                             spacing="1",
                                             col_span=2,
@@ -250,7 +278,7 @@ def ems_panel(
                                             rx.input(
                                                 id="duration",
                                                 value=form_data["duration"],
-                                                on_change=lambda value: form_data.update({"duration": value}),
+                                                **sync_field("duration"),
                                             ),
                                             spacing="1",
                                         ),
@@ -259,7 +287,7 @@ def ems_panel(
                                             rx.textarea(
                                                 id="patient_presentation",
                                                 value=form_data["patient_presentation"],
-                                                on_change=lambda value: form_data.update({"patient_presentation": value}),
+                                                **sync_field("patient_presentation"),
                                             ),
                                             spacing="1",
                                             col_span=2,
@@ -275,13 +303,14 @@ def ems_panel(
                                     mt="6",
                                 ),
                                 
-                                # Submit Button
-                                rx.button(
+                                # Submit Button / progress
+                                generation_controls(
                                     "Generate Narrative",
-                                    type="submit",
-                                    width="100%",
-                                    on_click=lambda: handle_submit(form_data),
-                                    mt="6",
+                                    on_submit=lambda: handle_submit(form_data),
+                                    is_generating=is_generating,
+                                    generation_status=generation_status,
+                                    generation_progress=generation_progress,
+                                    on_cancel=on_cancel,
                                 ),
                                 
                                 on_submit=lambda: handle_submit(form_data),
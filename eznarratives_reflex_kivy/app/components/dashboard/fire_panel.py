@@ -8,6 +8,9 @@ This component provides a form interface for generating Fire/NFIRS narratives.
 import reflex as rx
 from typing import Dict, Any, List, Callable, Optional
 
+from app.components.dashboard.form_sync import field_sync_handlers, flush_pending_fields
+from app.components.dashboard.generation_controls import generation_controls
+
 
 class FirePanel(rx.Component):
     """A component for the Fire narrative form."""
@@ -21,17 +24,32 @@ class FirePanel(rx.Component):
     # Define the properties
     report_text: str
     on_generate_report: Callable[[Dict[str, Any]], None]
+    on_update_fields: Callable[[Dict[str, Any]], None]
+    is_generating: bool
+    generation_status: str
+    generation_progress: int
+    on_cancel: Callable[[], None]
 
 
 def fire_panel(
     report_text: str = "No NFIRS report generated yet. Fill out the form below and click 'Generate Report'.",
     on_generate_report: Optional[Callable[[Dict[str, Any]], None]] = None,
+    on_update_fields: Optional[Callable[[Dict[str, Any]], None]] = None,
+    is_generating: bool = False,
+    generation_status: str = "",
+    generation_progress: int = 0,
+    on_cancel: Optional[Callable[[], None]] = None,
 ) -> rx.Component:
     """Create a Fire panel component.
     
     Args:
         report_text: The generated report text.
         on_generate_report: Function to handle report generation.
+        on_update_fields: Bulk setter that receives batched field edits.
+        is_generating: Whether a narrative is being generated.
+        generation_status: Description of the current generation step.
+        generation_progress: Generation progress in percent.
+        on_cancel: Function to cancel the running generation.
         
     Returns:
         A Fire panel component.
@@ -47,6 +65,13 @@ def fire_panel(
         "additional_info": "",
     })
     
+    # Field edits not yet flushed to the server
+    pending_fields = rx.State({})
+    
+    def sync_field(field: str) -> Dict[str, Any]:
+        """Batched change/blur handlers for a form field."""
+        return field_sync_handlers(field, form_data, pending_fields, on_update_fields)
+    
     # Emergency types list
     emergency_types = [
         "Structure Fire", "Vehicle Fire", "Cooking Fire (Confined)", "Chimney/Flue Fire",
@@ -62,6 +87,8 @@ def fire_panel(
     
     def handle_submit(form_data):
         """Handle form submission."""
+        # Flush pending edits so the server state is current before generating
+        events = flush_pending_fields(pending_fields, on_update_fields)
         if on_generate_report:
             # Format fire data for narrative generation
             emergency_type_text = form_data["custom_emergency_type"] if form_data["emergency_type"] == "Other" else form_data["emergency_type"]
@@ -73,7 +100,8 @@ def fire_panel(
                 "additional_info": form_data["additional_info"],
             }
             
-            on_generate_report(narrative_data)
+            events.append(on_generate_report(narrative_data))
+        return events
     
     return rx.motion.div(
         rx.flex(
@@ -134,7 +162,7 @@ def fire_panel(
                                             rx.input(
                                                 id="unit",
                                                 value=form_data["unit"],
-                                                on_change=lambda value: form_data.update({"unit": value}),
+                                                **sync_field("unit"),
                                                 placeholder="Enter responding unit",
                                                 required=True,
                                             ),
@@ -150,7 +178,7 @@ def fire_panel(
                                                 emergency_types,
                                                 id="emergency_type",
                                                 value=form_data["emergency_type"],
-                                                on_change=lambda value: form_data.update({"emergency_type": value}),
+                                                **sync_field("emergency_type"),
                                                 placeholder="Select Emergency Type",
                                                 required=True,
                                             ),
@@ -167,7 +195,7 @@ def fire_panel(
                                                 rx.input(
                                                     id="custom_emergency_type",
                                                     value=form_data["custom_emergency_type"],
-                                                    on_change=lambda value: form_data.update({"custom_emergency_type": value}),
+                                                    **sync_field("custom_emergency_type"),
                                                     placeholder="Specify emergency type",
                                                     required=True,
                                                 ),
@@ -180,7 +208,7 @@ def fire_panel(
                                             rx.textarea(
                                                 id="additional_info",
                                                 value=form_data["additional_info"],
-                                                on_change=lambda value: form_data.update({"additional_info": value}),
+                                                **sync_field("additional_info"),
                                                 placeholder="Enter any additional remarks or information",
                                                 rows=6,
                                             ),
@@ -197,14 +225,15 @@ def fire_panel(
                                     p="4",
                                 ),
                                 
-                                # Submit Button
-                                rx.button(
+                                # Submit Button / progress
+                                generation_controls(
                                     "Generate NFIRS Report",
-                                    type="submit",
-                                    width="100%",
+                                    on_submit=lambda: handle_submit(form_data),
+                                    is_generating=is_generating,
+                                    generation_status=generation_status,
+                                    generation_progress=generation_progress,
+                                    on_cancel=on_cancel,
                                     color_scheme="red",
-                                    on_click=lambda: handle_submit(form_data),
-                                    mt="6",
                                 ),
                                 
                                 on_submit=lambda: handle_submit(form_data),
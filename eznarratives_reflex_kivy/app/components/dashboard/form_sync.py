@@ -0,0 +1,72 @@
+"""
+Form Sync Helpers for EZ Narratives
+==================================
+
+Helpers for batching form field edits on the client. Edits are kept in the
+panel's local form state and collected in a pending dict; the pending edits
+are flushed to the server as a single ``update_fields`` event on debounce,
+blur or submit instead of one event per keystroke.
+"""
+
+import reflex as rx
+from typing import Dict, Any, Callable, Optional
+
+# Milliseconds of typing inactivity before pending edits are flushed
+FORM_SYNC_DEBOUNCE_MS = 600
+
+
+def flush_pending_fields(
+    pending_fields: Any,
+    on_update_fields: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> list:
+    """Create the events that flush pending field edits to the server.
+
+    Args:
+        pending_fields: Client-side dict of edits not yet sent.
+        on_update_fields: Server-side bulk setter (e.g. EMSState.update_fields).
+
+    Returns:
+        A list of events to attach to a trigger.
+    """
+    if not on_update_fields:
+        return []
+
+    return [
+        on_update_fields(pending_fields),
+        lambda: pending_fields.set({}),
+    ]
+
+
+def field_sync_handlers(
+    field: str,
+    form_data: Any,
+    pending_fields: Any,
+    on_update_fields: Optional[Callable[[Dict[str, Any]], None]] = None,
+    debounce_ms: int = FORM_SYNC_DEBOUNCE_MS,
+) -> Dict[str, Any]:
+    """Create batched change/blur handlers for a form field.
+
+    Typing only touches client state; the pending edits are sent once the
+    user pauses for ``debounce_ms`` and again (then cleared) on blur.
+
+    Args:
+        field: Name of the form field.
+        form_data: Client-side form state.
+        pending_fields: Client-side dict of edits not yet sent.
+        on_update_fields: Server-side bulk setter (e.g. EMSState.update_fields).
+        debounce_ms: Debounce delay before pending edits are flushed.
+
+    Returns:
+        Keyword arguments to spread onto an input component.
+    """
+    on_change = [
+        lambda value: form_data.update({field: value}),
+        lambda value: pending_fields.update({field: value}),
+    ]
+    if on_update_fields:
+        on_change.append(on_update_fields(pending_fields).debounce(debounce_ms))
+
+    return {
+        "on_change": on_change,
+        "on_blur": flush_pending_fields(pending_fields, on_update_fields),
+    }
@@ -0,0 +1,67 @@
+"""
+Generation Controls for EZ Narratives
+=====================================
+
+Submit button shared by the narrative panels. While a narrative is being
+generated it is replaced by a progress bar, the current step and a cancel
+button.
+"""
+
+import reflex as rx
+from typing import Any, Callable, Optional
+
+
+def generation_controls(
+    label: str,
+    on_submit: Callable[[], Any],
+    is_generating: bool = False,
+    generation_status: str = "",
+    generation_progress: int = 0,
+    on_cancel: Optional[Callable[[], None]] = None,
+    color_scheme: Optional[str] = None,
+) -> rx.Component:
+    """Create the submit/progress controls for a narrative form.
+
+    Args:
+        label: Text of the submit button.
+        on_submit: Handler for the submit button.
+        is_generating: Whether a narrative is being generated.
+        generation_status: Description of the current generation step.
+        generation_progress: Generation progress in percent.
+        on_cancel: Function to cancel the running generation.
+        color_scheme: Color scheme of the submit button.
+
+    Returns:
+        A generation controls component.
+    """
+    return rx.cond(
+        is_generating,
+        rx.vstack(
+            rx.progress(value=generation_progress, width="100%"),
+            rx.hstack(
+                rx.spinner(size="sm"),
+                rx.text(generation_status, font_size="sm", color="gray.500"),
+                rx.spacer(),
+                rx.button(
+                    "Cancel",
+                    variant="outline",
+                    size="sm",
+                    on_click=on_cancel,
+                    is_disabled=not on_cancel,
+                ),
+                width="100%",
+                align_items="center",
+            ),
+            width="100%",
+            spacing="2",
+            mt="6",
+        ),
+        rx.button(
+            label,
+            type="submit",
+            width="100%",
+            color_scheme=color_scheme,
+            on_click=on_submit,
+            mt="6",
+        ),
+    )
@@ -31,13 +31,6 @@ def integrated_dashboard() -> rx.Component:
     # Check if we're on mobile
     is_mobile = rx.use_media_query("(max-width: 768px)")
     
-    # Get the active session data
-    active_session_data = None
-    for session in session_state.sessions:
-        if session.id == session_state.active_session:
-            active_session_data = session
-            break
-    
     # Welcome message for new sessions
     welcome_message = {
         "type": "assistant",
@@ -62,8 +55,8 @@ Need help? Just ask me anything about EMS narratives, protocols, or how to use t
     
     # Determine which messages to show
     messages = []
-    if active_session_data and active_session_data.messages:
-        messages = active_session_data.messages
+    if session_state.active_messages:
+        messages = session_state.active_messages
     else:
         messages = [welcome_message]
     
@@ -90,6 +83,8 @@ Need help? Just ask me anything about EMS narratives, protocols, or how to use t
                         is_recording=session_state.is_recording,
                         toggle_speech_recognition=session_state.toggle_speech_recognition,
                         transcript=session_state.transcript,
+                        has_older_messages=session_state.has_older_messages,
+                        on_load_older=session_state.load_older_messages,
                     ),
                 ),
                 
@@ -99,7 +94,12 @@ Need help? Just ask me anything about EMS narratives, protocols, or how to use t
                     ems_panel(
                         narrative_text=ems_state.narrative_text,
                         on_generate_narrative=ems_state.generate_narrative,
-                        default_form_data=ems_state.form_data,
+                        on_update_fields=ems_state.update_fields,
+                        is_generating=ems_state.is_generating,
+                        generation_status=ems_state.generation_status,
+                        generation_progress=ems_state.generation_progress,
+                        on_cancel=ems_state.cancel_generation,
+                        default_form_data=ems_state._build_form_data(),
                     ),
                 ),
                 
@@ -109,6 +109,11 @@ Need help? Just ask me anything about EMS narratives, protocols, or how to use t
                     fire_panel(
                         report_text=fire_state.narrative_text,
                         on_generate_report=fire_state.generate_narrative,
+                        on_update_fields=fire_state.update_fields,
+                        is_generating=fire_state.is_generating,
+                        generation_status=fire_state.generation_status,
+                        generation_progress=fire_state.generation_progress,
+                        on_cancel=fire_state.cancel_generation,
                     ),
                 ),
                 
@@ -190,8 +195,23 @@ Need help? Just ask me anything about EMS narratives, protocols, or how to use t
                                     dark_bg=rx.cond(session.id == session_state.active_session, "gray.800", "transparent"),
                                     _hover={"bg": "gray.100", "dark_bg": "gray.800"},
                                 )
-                                for session in session_state.sessions
+                                for session in [
+                                    session_state.sessions[session_id]
+                                    for session_id in session_state.session_order
+                                ]
                             ],
+                            
+                            # Load the next page of sessions
+                            rx.cond(
+                                session_state.has_more_sessions,
+                                rx.button(
+                                    "Load more sessions",
+                                    variant="ghost",
+                                    size="sm",
+                                    width="100%",
+                                    on_click=session_state.load_more_sessions,
+                                ),
+                            ),
                             width="100%",
                             spacing="1",
                             p="2",
@@ -289,6 +309,11 @@ Need help? Just ask me anything about EMS narratives, protocols, or how to use t
         overflow="hidden",
         bg="gray.50",
         dark_bg="gray.900",
+        # Stop the connectivity watchers started by on_load
+        on_unmount=[
+            ems_state.stop_watching_connectivity,
+            fire_state.stop_watching_connectivity,
+        ],
     )
 
 
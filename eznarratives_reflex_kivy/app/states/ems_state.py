@@ -5,8 +5,68 @@ from typing import Dict, Any, List, Optional
 from datetime import datetime
 import asyncio
 
-from lib.openai_client import generate_ems_narrative
-from lib.supabase import supabase
+from lib.openai_client import stream_ems_narrative, coalesce_deltas
+from lib.connectivity import connectivity_monitor, CONNECTIVITY_POLL_INTERVAL
+from lib.narrative_repository import narrative_repository
+from lib.supabase import insert_session_message
+from lib.knowledge_base import knowledge_base, build_ems_query
+from lib.cancellation import (
+    GenerationCancelled,
+    await_unless_cancelled,
+    begin_cancellable,
+    end_cancellable,
+    iter_unless_cancelled,
+    request_cancel
+)
+
+# Progress reported while streaming runs between these percentages; the
+# stream's share is estimated from a typical narrative length
+GENERATION_RETRIEVAL_START = 5
+GENERATION_STREAM_START = 10
+GENERATION_STREAM_END = 90
+EXPECTED_NARRATIVE_CHARS = 3000
+
+# Editable form fields and their expected types, used to validate batched
+# updates coming from the client
+EMS_FORM_FIELDS: Dict[str, type] = {
+    "unit": str,
+    "dispatch_reason": str,
+    "response_delay": str,
+    "response_delay_custom": str,
+    "patient_sex": str,
+    "patient_age": str,
+    "chief_complaint": str,
+    "duration": str,
+    "patient_presentation": str,
+    "aao_person": bool,
+    "aao_place": bool,
+    "aao_time": bool,
+    "aao_event": bool,
+    "is_unresponsive": bool,
+    "gcs_score": str,
+    "pupils": str,
+    "selected_pertinent_negatives": list,
+    "unable_to_obtain_negatives": bool,
+    "vital_signs_normal": bool,
+    "selected_abnormal_vitals": list,
+    "all_other_vitals_normal": bool,
+    "dcap_btls": bool,
+    "additional_assessment": str,
+    "treatment_provided": str,
+    "add_protocol_treatments": bool,
+    "protocol_exclusions": str,
+    "refused_transport": bool,
+    "refusal_details": str,
+    "transport_destination": str,
+    "transport_position": str,
+    "room_number": str,
+    "nurse_name": str,
+    "unit_in_service": bool,
+    "format_type": str,
+    "use_abbreviations": bool,
+    "include_headers": bool,
+    "custom_format": str,
+}
 
 class EMSState(rx.State):
     """State for managing EMS narrative form data and generation."""
@@ -67,6 +127,10 @@ class EMSState(rx.State):
     is_form_collapsed: bool = False
     is_generating: bool = False
     generation_error: Optional[str] = None
+    generation_status: str = ""
+    generation_progress: int = 0
+    _cancel_requested: bool = False
+    _watching_connectivity: bool = False
     is_offline: bool = False
     
     # Generated narrative
@@ -106,9 +170,15 @@ class EMSState(rx.State):
         "D.R.A.T.T.", "S.O.A.P.", "C.H.A.R.T.", "Custom"
     ]
     
-    @rx.var
-    def form_data(self) -> Dict[str, Any]:
-        """Get the complete form data."""
+    def _build_form_data(self, timestamp: Optional[str] = None) -> Dict[str, Any]:
+        """Build a snapshot of the complete form data.
+        
+        This is deliberately not a reactive var: it is only materialized on
+        generate/save, so field setters only ship the field that changed.
+        
+        Args:
+            timestamp: Submission timestamp (defaults to now)
+        """
         return {
             # Dispatch section
             "unit": self.unit,
@@ -162,7 +232,7 @@ class EMSState(rx.State):
             "custom_format": self.custom_format,
             
             # Timestamp
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            "timestamp": timestamp or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         }
     
     @rx.event
@@ -192,61 +262,68 @@ class EMSState(rx.State):
         
         # Process any cached narratives if we're back online
         if not self.is_offline:
-            await self._process_cached_narratives()
+            await self._process_cached_narratives(self._get_user_id())
+        
+        # Keep is_offline current without probing on every event
+        return EMSState.watch_connectivity
     
     async def _check_network(self) -> bool:
-        """Check if we have network connectivity by pinging Supabase."""
-        try:
-            # Try a simple query to check connectivity
-            await supabase.from_("narratives").select("count", count="exact").limit(1).execute()
-            return True
-        except Exception:
-            return False
-    
-    async def _get_cache_dir(self) -> str:
-        """Get the cache directory path."""
-        try:
-            # Try to use plyer for mobile platforms
-            from plyer import storagepath
-            cache_dir = os.path.join(storagepath.get_documents_dir(), 'eznarratives_cache')
-        except ImportError:
-            # Fall back to a local directory for desktop
-            cache_dir = os.path.join(os.path.expanduser('~'), '.eznarratives_cache')
-        
-        # Create the directory if it doesn't exist
-        os.makedirs(cache_dir, exist_ok=True)
-        return cache_dir
-    
-    async def _cache_narrative(self, narrative_data: Dict[str, Any]):
-        """Cache a narrative for later submission when online."""
-        cache_dir = await self._get_cache_dir()
-        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-        cache_file = os.path.join(cache_dir, f"ems_narrative_{timestamp}.json")
-        
-        with open(cache_file, 'w') as f:
-            json.dump(narrative_data, f)
+        """Check network connectivity using the shared, cached monitor."""
+        return await connectivity_monitor.is_online()
     
-    async def _process_cached_narratives(self):
-        """Process any cached narratives."""
-        cache_dir = await self._get_cache_dir()
-        if not os.path.exists(cache_dir):
-            return
+    @rx.event(background=True)
+    async def watch_connectivity(self):
+        """Push connectivity changes to the client as they happen.
         
-        cached_files = [f for f in os.listdir(cache_dir) if f.startswith("ems_narrative_") and f.endswith(".json")]
+        Only one watcher runs per state; reloading the page does not start
+        another. The watcher wakes at least once per poll interval and stops
+        when stop_watching_connectivity() clears its flag or the client's
+        state is gone.
+        """
+        async with self:
+            if self._watching_connectivity:
+                return
+            self._watching_connectivity = True
+            online = not self.is_offline
         
-        for file_name in cached_files:
-            file_path = os.path.join(cache_dir, file_name)
+        while True:
+            online = await connectivity_monitor.wait_for_change(
+                online, CONNECTIVITY_POLL_INTERVAL
+            )
             try:
-                with open(file_path, 'r') as f:
-                    narrative_data = json.load(f)
-                
-                # Submit to Supabase
-                await self.save_narrative_to_supabase(narrative_data)
-                
-                # Remove the cached file
-                os.remove(file_path)
+                async with self:
+                    if not self._watching_connectivity:
+                        return
+                    self.is_offline = not online
+                    user_id = self._get_user_id()
             except Exception as e:
-                print(f"Error processing cached narrative {file_name}: {str(e)}")
+                # The client disconnected and its state was cleaned up
+                print(f"Stopped watching connectivity: {e}")
+                return
+            
+            # Replay cached narratives once we are back online, without
+            # holding the state lock during the network writes
+            if online:
+                await self._process_cached_narratives(user_id)
+    
+    @rx.event
+    def stop_watching_connectivity(self):
+        """Stop the connectivity watcher when the page is unloaded."""
+        self._watching_connectivity = False
+    
+    def _get_user_id(self) -> Optional[str]:
+        """Get the id of the signed-in user, if any."""
+        from app.states.session_state import SessionState
+        session_state = SessionState.get_current_state()
+        
+        return session_state.user["id"] if session_state.user else None
+    
+    async def _process_cached_narratives(self, user_id: Optional[str] = None):
+        """Replay narratives queued while offline."""
+        try:
+            await narrative_repository.replay(user_id=user_id)
+        except Exception as e:
+            print(f"Error replaying cached narratives: {e}")
     
     @rx.event
     async def set_active_section(self, section: str):
@@ -258,6 +335,27 @@ class EMSState(rx.State):
         """Toggle form collapsed state."""
         self.is_form_collapsed = not self.is_form_collapsed
     
+    @rx.event
+    async def update_fields(self, fields: Dict[str, Any]):
+        """Apply a batch of form field edits flushed from the client.
+        
+        Unknown fields and values of the wrong type are ignored.
+        """
+        for name, value in fields.items():
+            expected_type = EMS_FORM_FIELDS.get(name)
+            if expected_type is None:
+                print(f"Ignoring unknown EMS form field: {name}")
+                continue
+            
+            if not isinstance(value, expected_type):
+                print(f"Ignoring invalid value for EMS form field {name}: {value!r}")
+                continue
+            
+            if expected_type is list:
+                value = [str(item) for item in value]
+            
+            setattr(self, name, value)
+    
     # Form field setters
     
     # Dispatch section
@@ -475,95 +573,174 @@ class EMSState(rx.State):
         await ui_state.update_narrative_settings(settings)
         return rx.toast.success("Settings updated")
     
-    @rx.event
-    async def save_narrative_to_supabase(self, narrative_data: Dict[str, Any]) -> str:
-        """Save a narrative to Supabase."""
-        from app.states.session_state import SessionState
-        session_state = SessionState.get_current_state()
-        
-        # Add user_id if authenticated
-        if session_state.user:
-            narrative_data["user_id"] = session_state.user["id"]
-        
-        # Add narrative type
-        narrative_data["type"] = "ems"
-        
-        try:
-            # Insert into Supabase
-            response = await supabase.from_("narratives").insert(narrative_data).execute()
-            
-            if response.data:
-                return response.data[0]["id"]
-            return ""
-        except Exception as e:
-            print(f"Error saving narrative to Supabase: {str(e)}")
-            return ""
-    
-    @rx.event
+    @rx.event(background=True)
     async def generate_narrative(self):
-        """Generate an EMS narrative based on form data."""
-        if not self.unit:
-            return rx.window_alert("Please enter a unit.")
-        
-        if not self.dispatch_reason:
-            return rx.window_alert("Please enter a dispatch reason.")
-        
-        if not self.patient_sex:
-            return rx.window_alert("Please select a patient sex.")
+        """Generate an EMS narrative based on form data.
         
-        if not self.patient_age:
-            return rx.window_alert("Please enter a patient age.")
+        Runs as a background task: the state lock is only held while reading
+        the form and applying results, so other events from the tab (typing,
+        chat, cancel) are processed while the narrative streams in.
+        """
+        from app.states.session_state import SessionState
+        from app.states.ui_state import UIState
         
-        if not self.chief_complaint:
-            return rx.window_alert("Please enter a chief complaint.")
+        async with self:
+            if self.is_generating:
+                return
+            
+            session_state = await self.get_state(SessionState)
+            user_id = session_state.user["id"] if session_state.user else None
+            
+            error = self._validate_form()
+            if not error:
+                self.is_generating = True
+                self.generation_error = None
+                self._cancel_requested = False
+                cancel_key = self._cancel_key()
+                cancelled = begin_cancellable(cancel_key)
+                self.narrative_text = ""
+                self._set_progress("Checking connection", 0)
+                
+                # Snapshot the form once, stamped at submission time
+                form_data = self._build_form_data()
+                chief_complaint = self.chief_complaint
         
-        self.is_generating = True
-        self.generation_error = None
+        if error:
+            yield rx.window_alert(error)
+            return
         
         try:
             # Check network status
-            self.is_offline = not await self._check_network()
+            is_offline = not await await_unless_cancelled(cancelled, self._check_network())
+            async with self:
+                if self._cancel_requested:
+                    raise GenerationCancelled()
+                self.is_offline = is_offline
+                self._set_progress("Retrieving protocols", GENERATION_RETRIEVAL_START)
+            
+            # Ground the narrative in the matching guidelines and protocols
+            context_snippets = []
+            if not is_offline:
+                context_snippets = await await_unless_cancelled(cancelled, knowledge_base.retrieve_snippets(
+                    build_ems_query(form_data), user_id=user_id
+                ))
             
-            # Generate the narrative
-            self.narrative_text = await generate_ems_narrative(self.form_data)
+            async with self:
+                if self._cancel_requested:
+                    raise GenerationCancelled()
+                self._set_progress("Generating narrative", GENERATION_STREAM_START)
+            
+            # Stream the narrative, applying each coalesced chunk under the lock.
+            # Admission and a hedged first token can take a while, so each
+            # chunk is awaited as a cancellable stage.
+            chunks = iter_unless_cancelled(
+                cancelled, coalesce_deltas(stream_ems_narrative(form_data, context_snippets, user_id=user_id))
+            )
+            try:
+                async for chunk in chunks:
+                    async with self:
+                        if self._cancel_requested:
+                            raise GenerationCancelled()
+                        self.narrative_text += chunk
+                        self.generation_progress = self._streaming_progress()
+            finally:
+                await chunks.aclose()
+            
+            async with self:
+                if self._cancel_requested:
+                    raise GenerationCancelled()
+                self._set_progress("Saving narrative", GENERATION_STREAM_END)
+                narrative_text = self.narrative_text
             
             # Create narrative data for saving
             narrative_data = {
-                "content": self.narrative_text,
-                "form_data": self.form_data,
+                "content": narrative_text,
+                "form_data": form_data,
                 "created_at": datetime.now().isoformat(),
-                "title": f"EMS Narrative - {self.chief_complaint} - {datetime.now().strftime('%Y-%m-%d %H:%M')}"
+                "title": f"EMS Narrative - {chief_complaint} - {datetime.now().strftime('%Y-%m-%d %H:%M')}"
             }
             
-            # Add the narrative to the session
-            from app.states.session_state import SessionState
-            session_state = SessionState.get_current_state()
+            # Add the narrative to the session, inserting it after releasing the lock
+            async with self:
+                session_state = await self.get_state(SessionState)
+                timestamp = datetime.now().strftime("%I:%M %p")
+                message_row = session_state._append_message(
+                    message_type="assistant",
+                    content=narrative_text,
+                    timestamp=timestamp
+                )
+            if message_row:
+                await insert_session_message(message_row)
             
-            timestamp = datetime.now().strftime("%I:%M %p")
-            await session_state.add_message_to_session(
-                message_type="assistant",
-                content=self.narrative_text,
-                timestamp=timestamp
+            # Save in the background, or queue locally if offline
+            narrative_id = await narrative_repository.save(
+                "ems",
+                narrative_data,
+                user_id=user_id,
+                offline=is_offline
             )
             
-            # Save to Supabase or cache if offline
-            if self.is_offline:
-                await self._cache_narrative(narrative_data)
-                rx.toast.info("You are offline. Narrative saved locally and will be uploaded when connection is restored.")
-            else:
-                self.narrative_id = await self.save_narrative_to_supabase(narrative_data)
-            
-            # Switch to the EMS tab
-            from app.states.ui_state import UIState
-            ui_state = UIState.get_current_state()
-            await ui_state.set_active_tab("ems")
+            async with self:
+                self.narrative_id = narrative_id
+                self._set_progress("Done", 100)
+                
+                # Switch to the EMS tab
+                ui_state = await self.get_state(UIState)
+                await ui_state.set_active_tab("ems")
             
-            return rx.toast.success("EMS narrative generated successfully")
+            if is_offline:
+                yield rx.toast.info("You are offline. Narrative saved locally and will be uploaded when connection is restored.")
+            yield rx.toast.success("EMS narrative generated successfully")
+        except GenerationCancelled:
+            async with self:
+                self._set_progress("Cancelled", 0)
+            yield rx.toast.info("Narrative generation cancelled")
         except Exception as e:
-            self.generation_error = str(e)
-            return rx.toast.error(f"Error generating narrative: {str(e)}")
+            async with self:
+                self.generation_error = str(e)
+            yield rx.toast.error(f"Error generating narrative: {str(e)}")
         finally:
-            self.is_generating = False
+            end_cancellable(cancel_key, cancelled)
+            async with self:
+                self.is_generating = False
+    
+    @rx.event
+    async def cancel_generation(self):
+        """Stop the narrative that is currently being generated."""
+        if self.is_generating:
+            self._cancel_requested = True
+            self.generation_status = "Cancelling"
+            # Interrupt the stage the background task is waiting on
+            request_cancel(self._cancel_key())
+    
+    def _cancel_key(self) -> str:
+        """Key of this client's generation in the cancellation registry."""
+        return f"ems:{self.router.session.client_token}"
+    
+    def _validate_form(self) -> Optional[str]:
+        """Get the message for the first missing required field, if any."""
+        if not self.unit:
+            return "Please enter a unit."
+        if not self.dispatch_reason:
+            return "Please enter a dispatch reason."
+        if not self.patient_sex:
+            return "Please select a patient sex."
+        if not self.patient_age:
+            return "Please enter a patient age."
+        if not self.chief_complaint:
+            return "Please enter a chief complaint."
+        return None
+    
+    def _set_progress(self, status: str, progress: int):
+        """Update the progress indicator."""
+        self.generation_status = status
+        self.generation_progress = progress
+    
+    def _streaming_progress(self) -> int:
+        """Estimate progress from the length of the streamed text so far."""
+        fraction = min(1.0, len(self.narrative_text) / EXPECTED_NARRATIVE_CHARS)
+        return int(GENERATION_STREAM_START + fraction * (GENERATION_STREAM_END - GENERATION_STREAM_START))
+    
     @rx.event
     async def reset_form(self):
         """Reset the form to default values."""
@@ -1,11 +1,36 @@
 import reflex as rx
 import os
 import json
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List
 from datetime import datetime
 
-from lib.openai_client import generate_fire_narrative
-from lib.supabase import supabase
+from lib.openai_client import stream_fire_narrative, coalesce_deltas
+from lib.connectivity import connectivity_monitor, CONNECTIVITY_POLL_INTERVAL
+from lib.narrative_repository import narrative_repository
+from lib.supabase import insert_session_message
+from lib.cancellation import (
+    GenerationCancelled,
+    await_unless_cancelled,
+    begin_cancellable,
+    end_cancellable,
+    iter_unless_cancelled,
+    request_cancel
+)
+
+# Progress reported while streaming runs between these percentages; the
+# stream's share is estimated from a typical narrative length
+GENERATION_STREAM_START = 10
+GENERATION_STREAM_END = 90
+EXPECTED_NARRATIVE_CHARS = 2000
+
+# Editable form fields and their expected types, used to validate batched
+# updates coming from the client
+FIRE_FORM_FIELDS: Dict[str, type] = {
+    "unit": str,
+    "emergency_type": str,
+    "custom_emergency_type": str,
+    "additional_info": str,
+}
 
 class FireState(rx.State):
     """State for managing fire narrative form data and generation."""
@@ -24,6 +49,10 @@ class FireState(rx.State):
     show_custom_emergency_type: bool = False
     is_generating: bool = False
     generation_error: Optional[str] = None
+    generation_status: str = ""
+    generation_progress: int = 0
+    _cancel_requested: bool = False
+    _watching_connectivity: bool = False
     is_offline: bool = False
     narrative_id: Optional[str] = None
     
@@ -40,16 +69,43 @@ class FireState(rx.State):
         "Electrical Fire", "Outdoor Fire", "Other"
     ]
     
-    @rx.var
-    def form_data(self) -> Dict[str, Any]:
-        """Get the complete form data."""
+    def _build_form_data(self, timestamp: Optional[str] = None) -> Dict[str, Any]:
+        """Build a snapshot of the complete form data.
+        
+        This is deliberately not a reactive var: it is only materialized on
+        generate/save, so field setters only ship the field that changed.
+        
+        Args:
+            timestamp: Submission timestamp (defaults to now)
+        """
         return {
             "unit": self.unit,
             "emergency_type": self.emergency_type if self.emergency_type != "Other" else self.custom_emergency_type,
             "additional_info": self.additional_info,
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            "timestamp": timestamp or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         }
     
+    @rx.event
+    async def update_fields(self, fields: Dict[str, Any]):
+        """Apply a batch of form field edits flushed from the client.
+        
+        Unknown fields and values of the wrong type are ignored.
+        """
+        for name, value in fields.items():
+            expected_type = FIRE_FORM_FIELDS.get(name)
+            if expected_type is None:
+                print(f"Ignoring unknown Fire form field: {name}")
+                continue
+            
+            if not isinstance(value, expected_type):
+                print(f"Ignoring invalid value for Fire form field {name}: {value!r}")
+                continue
+            
+            setattr(self, name, value)
+        
+        if "emergency_type" in fields:
+            self.show_custom_emergency_type = (self.emergency_type == "Other")
+    
     @rx.event
     async def set_unit(self, value: str):
         """Set the unit value."""
@@ -84,154 +140,220 @@ class FireState(rx.State):
         
         # Process any cached narratives if we're back online
         if not self.is_offline:
-            await self._process_cached_narratives()
-    
-    async def _check_network(self) -> bool:
-        """Check if we have network connectivity by pinging Supabase."""
-        try:
-            # Try a simple query to check connectivity
-            await supabase.from_("narratives").select("count", count="exact").limit(1).execute()
-            return True
-        except Exception:
-            return False
-    
-    async def _get_cache_dir(self) -> str:
-        """Get the cache directory path."""
-        try:
-            # Try to use plyer for mobile platforms
-            from plyer import storagepath
-            cache_dir = os.path.join(storagepath.get_documents_dir(), 'eznarratives_cache')
-        except ImportError:
-            # Fall back to a local directory for desktop
-            cache_dir = os.path.join(os.path.expanduser('~'), '.eznarratives_cache')
+            await self._process_cached_narratives(self._get_user_id())
         
-        # Create the directory if it doesn't exist
-        os.makedirs(cache_dir, exist_ok=True)
-        return cache_dir
+        # Keep is_offline current without probing on every event
+        return FireState.watch_connectivity
     
-    async def _cache_narrative(self, narrative_data: Dict[str, Any]):
-        """Cache a narrative for later submission when online."""
-        cache_dir = await self._get_cache_dir()
-        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-        cache_file = os.path.join(cache_dir, f"fire_narrative_{timestamp}.json")
-        
-        with open(cache_file, 'w') as f:
-            json.dump(narrative_data, f)
+    async def _check_network(self) -> bool:
+        """Check network connectivity using the shared, cached monitor."""
+        return await connectivity_monitor.is_online()
     
-    async def _process_cached_narratives(self):
-        """Process any cached narratives."""
-        cache_dir = await self._get_cache_dir()
-        if not os.path.exists(cache_dir):
-            return
+    @rx.event(background=True)
+    async def watch_connectivity(self):
+        """Push connectivity changes to the client as they happen.
         
-        cached_files = [f for f in os.listdir(cache_dir) if f.startswith("fire_narrative_") and f.endswith(".json")]
+        Only one watcher runs per state; reloading the page does not start
+        another. The watcher wakes at least once per poll interval and stops
+        when stop_watching_connectivity() clears its flag or the client's
+        state is gone.
+        """
+        async with self:
+            if self._watching_connectivity:
+                return
+            self._watching_connectivity = True
+            online = not self.is_offline
         
-        for file_name in cached_files:
-            file_path = os.path.join(cache_dir, file_name)
+        while True:
+            online = await connectivity_monitor.wait_for_change(
+                online, CONNECTIVITY_POLL_INTERVAL
+            )
             try:
-                with open(file_path, 'r') as f:
-                    narrative_data = json.load(f)
-                
-                # Submit to Supabase
-                await self._save_narrative_to_supabase(narrative_data)
-                
-                # Remove the cached file
-                os.remove(file_path)
+                async with self:
+                    if not self._watching_connectivity:
+                        return
+                    self.is_offline = not online
+                    user_id = self._get_user_id()
             except Exception as e:
-                print(f"Error processing cached narrative {file_name}: {str(e)}")
+                # The client disconnected and its state was cleaned up
+                print(f"Stopped watching connectivity: {e}")
+                return
+            
+            # Replay cached narratives once we are back online, without
+            # holding the state lock during the network writes
+            if online:
+                await self._process_cached_narratives(user_id)
+    
+    @rx.event
+    def stop_watching_connectivity(self):
+        """Stop the connectivity watcher when the page is unloaded."""
+        self._watching_connectivity = False
     
-    async def _save_narrative_to_supabase(self, narrative_data: Dict[str, Any]) -> str:
-        """Save a narrative to Supabase."""
+    def _get_user_id(self) -> Optional[str]:
+        """Get the id of the signed-in user, if any."""
         from app.states.session_state import SessionState
         session_state = SessionState.get_current_state()
         
-        # Add user_id if authenticated
-        if session_state.user:
-            narrative_data["user_id"] = session_state.user["id"]
-        
-        # Add narrative type
-        narrative_data["type"] = "fire"
-        
+        return session_state.user["id"] if session_state.user else None
+    
+    async def _process_cached_narratives(self, user_id: Optional[str] = None):
+        """Replay narratives queued while offline."""
         try:
-            # Insert into Supabase
-            response = await supabase.from_("narratives").insert(narrative_data).execute()
-            
-            if response.data:
-                return response.data[0]["id"]
-            return ""
+            await narrative_repository.replay(user_id=user_id)
         except Exception as e:
-            print(f"Error saving narrative to Supabase: {str(e)}")
-            return ""
+            print(f"Error replaying cached narratives: {e}")
     
-    @rx.event
+    @rx.event(background=True)
     async def generate_narrative(self):
-        """Generate a fire narrative based on form data."""
-        if not self.unit:
-            return rx.window_alert("Please enter a unit.")
+        """Generate a fire narrative based on form data.
         
-        if not self.emergency_type:
-            return rx.window_alert("Please select an emergency type.")
+        Runs as a background task: the state lock is only held while reading
+        the form and applying results, so other events from the tab (typing,
+        chat, cancel) are processed while the narrative streams in.
+        """
+        from app.states.session_state import SessionState
+        from app.states.ui_state import UIState
         
-        if self.emergency_type == "Other" and not self.custom_emergency_type:
-            return rx.window_alert("Please specify the emergency type.")
+        async with self:
+            if self.is_generating:
+                return
+            
+            session_state = await self.get_state(SessionState)
+            user_id = session_state.user["id"] if session_state.user else None
+            
+            error = self._validate_form()
+            if not error:
+                self.is_generating = True
+                self.generation_error = None
+                self._cancel_requested = False
+                cancel_key = self._cancel_key()
+                cancelled = begin_cancellable(cancel_key)
+                self.narrative_text = ""
+                self._set_progress("Checking connection", 0)
+                
+                # Snapshot the fire incident data once, stamped at submission time
+                fire_data = self._build_form_data()
+                emergency_type_text = fire_data["emergency_type"]
         
-        self.is_generating = True
-        self.generation_error = None
+        if error:
+            yield rx.window_alert(error)
+            return
         
         try:
             # Check network status
-            self.is_offline = not await self._check_network()
-            
-            # Format fire data for narrative generation
-            emergency_type_text = self.custom_emergency_type if self.emergency_type == "Other" else self.emergency_type
+            is_offline = not await await_unless_cancelled(cancelled, self._check_network())
+            async with self:
+                if self._cancel_requested:
+                    raise GenerationCancelled()
+                self.is_offline = is_offline
+                self._set_progress("Generating narrative", GENERATION_STREAM_START)
             
-            # Create narrative data with fire incident information
-            fire_data = {
-                "unit": self.unit,
-                "emergency_type": emergency_type_text,
-                "additional_info": self.additional_info
-            }
+            # Stream the narrative, applying each coalesced chunk under the lock.
+            # Admission and a hedged first token can take a while, so each
+            # chunk is awaited as a cancellable stage.
+            chunks = iter_unless_cancelled(
+                cancelled, coalesce_deltas(stream_fire_narrative(fire_data, user_id=user_id))
+            )
+            try:
+                async for chunk in chunks:
+                    async with self:
+                        if self._cancel_requested:
+                            raise GenerationCancelled()
+                        self.narrative_text += chunk
+                        self.generation_progress = self._streaming_progress()
+            finally:
+                await chunks.aclose()
             
-            # Generate the narrative
-            self.narrative_text = await generate_fire_narrative(fire_data)
+            async with self:
+                if self._cancel_requested:
+                    raise GenerationCancelled()
+                self._set_progress("Saving narrative", GENERATION_STREAM_END)
+                narrative_text = self.narrative_text
             
             # Create narrative data for saving
             narrative_data = {
-                "content": self.narrative_text,
+                "content": narrative_text,
                 "form_data": fire_data,
                 "created_at": datetime.now().isoformat(),
                 "title": f"Fire Narrative - {emergency_type_text} - {datetime.now().strftime('%Y-%m-%d %H:%M')}"
             }
             
-            # Add the narrative to the session
-            from app.states.session_state import SessionState
-            session_state = SessionState.get_current_state()
+            # Add the narrative to the session, inserting it after releasing the lock
+            async with self:
+                session_state = await self.get_state(SessionState)
+                timestamp = datetime.now().strftime("%I:%M %p")
+                message_row = session_state._append_message(
+                    message_type="assistant",
+                    content=narrative_text,
+                    timestamp=timestamp
+                )
+            if message_row:
+                await insert_session_message(message_row)
             
-            timestamp = datetime.now().strftime("%I:%M %p")
-            await session_state.add_message_to_session(
-                message_type="assistant",
-                content=self.narrative_text,
-                timestamp=timestamp
+            # Save in the background, or queue locally if offline
+            narrative_id = await narrative_repository.save(
+                "fire",
+                narrative_data,
+                user_id=user_id,
+                offline=is_offline
             )
             
-            # Save to Supabase or cache if offline
-            if self.is_offline:
-                await self._cache_narrative(narrative_data)
-                rx.toast.info("You are offline. Narrative saved locally and will be uploaded when connection is restored.")
-            else:
-                self.narrative_id = await self._save_narrative_to_supabase(narrative_data)
-            
-            # Switch to the fire tab
-            from app.states.ui_state import UIState
-            ui_state = UIState.get_current_state()
-            await ui_state.set_active_tab("fire")
+            async with self:
+                self.narrative_id = narrative_id
+                self._set_progress("Done", 100)
+                
+                # Switch to the fire tab
+                ui_state = await self.get_state(UIState)
+                await ui_state.set_active_tab("fire")
             
-            return rx.toast.success("Fire narrative generated successfully")
+            if is_offline:
+                yield rx.toast.info("You are offline. Narrative saved locally and will be uploaded when connection is restored.")
+            yield rx.toast.success("Fire narrative generated successfully")
+        except GenerationCancelled:
+            async with self:
+                self._set_progress("Cancelled", 0)
+            yield rx.toast.info("Narrative generation cancelled")
         except Exception as e:
-            self.generation_error = str(e)
-            return rx.toast.error(f"Error generating narrative: {str(e)}")
+            async with self:
+                self.generation_error = str(e)
+            yield rx.toast.error(f"Error generating narrative: {str(e)}")
         finally:
-            self.is_generating = False
+            end_cancellable(cancel_key, cancelled)
+            async with self:
+                self.is_generating = False
+    
+    @rx.event
+    async def cancel_generation(self):
+        """Stop the narrative that is currently being generated."""
+        if self.is_generating:
+            self._cancel_requested = True
+            self.generation_status = "Cancelling"
+            # Interrupt the stage the background task is waiting on
+            request_cancel(self._cancel_key())
+    
+    def _cancel_key(self) -> str:
+        """Key of this client's generation in the cancellation registry."""
+        return f"fire:{self.router.session.client_token}"
+    
+    def _validate_form(self) -> Optional[str]:
+        """Get the message for the first missing required field, if any."""
+        if not self.unit:
+            return "Please enter a unit."
+        if not self.emergency_type:
+            return "Please select an emergency type."
+        if self.emergency_type == "Other" and not self.custom_emergency_type:
+            return "Please specify the emergency type."
+        return None
+    
+    def _set_progress(self, status: str, progress: int):
+        """Update the progress indicator."""
+        self.generation_status = status
+        self.generation_progress = progress
+    
+    def _streaming_progress(self) -> int:
+        """Estimate progress from the length of the streamed text so far."""
+        fraction = min(1.0, len(self.narrative_text) / EXPECTED_NARRATIVE_CHARS)
+        return int(GENERATION_STREAM_START + fraction * (GENERATION_STREAM_END - GENERATION_STREAM_START))
     
     @rx.event
     async def reset_form(self):
@@ -5,7 +5,10 @@ from lib.supabase import (
     sign_in_with_email_password,
     sign_out,
     get_current_user,
-    check_admin_status
+    check_admin_status,
+    fetch_session_page,
+    fetch_message_page,
+    insert_session_message
 )
 
 class Message:
@@ -15,13 +18,20 @@ class Message:
     timestamp: str
 
 class Session:
-    """Session model for user sessions."""
+    """Session model for user sessions.
+    
+    Messages are not stored on the session; only the active session's
+    messages are held, in SessionState.active_messages.
+    """
     id: str
     name: str
     date: str
-    messages: List[Message]
     active: bool = False
 
+# Page sizes for lazy session and message loading
+SESSION_PAGE_SIZE = 20
+MESSAGE_PAGE_SIZE = 50
+
 class SessionState(rx.State):
     """State for managing user sessions and authentication."""
     
@@ -42,9 +52,19 @@ class SessionState(rx.State):
     new_password: str = ""
     confirm_new_password: str = ""
     
-    # Session state
-    sessions: List[Session] = []
+    # Session state. Sessions are keyed by id for O(1) lookup and update;
+    # session_order holds the display order (newest first).
+    sessions: Dict[str, Session] = {}
+    session_order: List[str] = []
     active_session: Optional[str] = None
+    active_messages: List[Message] = []
+    has_more_sessions: bool = False
+    has_older_messages: bool = False
+    is_loading_messages: bool = False
+    
+    # Keyset pagination cursors (backend only)
+    _sessions_cursor: Optional[Dict[str, str]] = None
+    _messages_cursor: Optional[Dict[str, Any]] = None
     
     # UI state
     is_dark_mode: bool = False
@@ -62,11 +82,7 @@ class SessionState(rx.State):
         if not self.active_session:
             return None
         
-        for session in self.sessions:
-            if session.id == self.active_session:
-                return session
-        
-        return None
+        return self.sessions.get(self.active_session)
     
     @rx.event
     async def on_load(self):
@@ -264,43 +280,126 @@ class SessionState(rx.State):
             if success:
                 self.user = None
                 self.is_admin = False
-                self.sessions = []
+                self.sessions = {}
+                self.session_order = []
                 self.active_session = None
+                self.active_messages = []
                 return rx.redirect("/login")
         except Exception as e:
             print(f"Error logging out: {e}")
         finally:
             self.is_loading = False
     
+    async def _fetch_session_page(self) -> List[Session]:
+        """Fetch the next page of session summaries after the current cursor.
+        
+        Sessions are ordered newest first by (date, id) and only the summary
+        columns are selected; messages are loaded lazily per session.
+        """
+        rows = await fetch_session_page(self.user["id"], self._sessions_cursor, SESSION_PAGE_SIZE + 1)
+        
+        self.has_more_sessions = len(rows) > SESSION_PAGE_SIZE
+        rows = rows[:SESSION_PAGE_SIZE]
+        if rows:
+            self._sessions_cursor = {"date": rows[-1]["date"], "id": rows[-1]["id"]}
+        
+        return [
+            Session(
+                id=session["id"],
+                name=session["name"],
+                date=session["date"],
+                active=False
+            )
+            for session in rows
+        ]
+    
     @rx.event
     async def load_sessions(self):
-        """Load user sessions from database."""
+        """Load the first page of user sessions from database."""
         if not self.is_authenticated:
             return
         
         try:
-            from lib.supabase import supabase
+            self._sessions_cursor = None
+            page = await self._fetch_session_page()
+            self.sessions = {session.id: session for session in page}
+            self.session_order = [session.id for session in page]
             
-            response = await supabase.table("sessions").select("*").eq("user_id", self.user["id"]).execute()
+            if self.session_order and self.active_session not in self.sessions:
+                self.active_session = self.session_order[0]
             
-            if response.data:
-                self.sessions = [
-                    Session(
-                        id=session["id"],
-                        name=session["name"],
-                        date=session["date"],
-                        messages=session.get("messages", []),
-                        active=False
-                    )
-                    for session in response.data
-                ]
-                
-                if self.sessions and not self.active_session:
-                    self.active_session = self.sessions[0].id
-                    self.set_active_session(self.sessions[0].id)
+            if self.active_session:
+                await self.set_active_session(self.active_session)
         except Exception as e:
             print(f"Error loading sessions: {e}")
     
+    @rx.event
+    async def load_more_sessions(self):
+        """Load the next page of user sessions."""
+        if not self.is_authenticated or not self.has_more_sessions:
+            return
+        
+        try:
+            for session in await self._fetch_session_page():
+                self.sessions[session.id] = session
+                self.session_order.append(session.id)
+        except Exception as e:
+            print(f"Error loading more sessions: {e}")
+    
+    async def _fetch_message_page(self, session_id: str) -> List[Dict[str, Any]]:
+        """Fetch a window of messages older than the current message cursor.
+        
+        Returns:
+            Messages in chronological order
+        """
+        rows = await fetch_message_page(session_id, self._messages_cursor, MESSAGE_PAGE_SIZE + 1)
+        
+        self.has_older_messages = len(rows) > MESSAGE_PAGE_SIZE
+        rows = rows[:MESSAGE_PAGE_SIZE]
+        if rows:
+            self._messages_cursor = {"created_at": rows[-1]["created_at"], "id": rows[-1]["id"]}
+        
+        return [
+            {
+                "type": row["type"],
+                "content": row["content"],
+                "timestamp": row["timestamp"]
+            }
+            for row in reversed(rows)
+        ]
+    
+    @rx.event
+    async def load_session_messages(self, session_id: str):
+        """Load the most recent window of messages for a session."""
+        self.is_loading_messages = True
+        
+        try:
+            self._messages_cursor = None
+            messages = await self._fetch_message_page(session_id)
+            # Ignore the result if the user switched sessions meanwhile
+            if session_id == self.active_session:
+                self.active_messages = messages
+        except Exception as e:
+            print(f"Error loading session messages: {e}")
+        finally:
+            self.is_loading_messages = False
+    
+    @rx.event
+    async def load_older_messages(self):
+        """Load the previous window of messages for the active session."""
+        if not self.active_session or not self.has_older_messages:
+            return
+        
+        self.is_loading_messages = True
+        
+        try:
+            older_messages = await self._fetch_message_page(self.active_session)
+            self.active_messages = older_messages + self.active_messages
+        except Exception as e:
+            print(f"Error loading older messages: {e}")
+        finally:
+            self.is_loading_messages = False
+    
     @rx.event
     async def create_new_session(self):
         """Create a new session."""
@@ -311,25 +410,30 @@ class SessionState(rx.State):
             return
         
         session_id = f"session-{int(time.time() * 1000)}"
-        date = datetime.now().strftime("%b %d, %Y")
+        # ISO dates sort chronologically, which the keyset pagination relies on;
+        # db-scripts/backfill-session-iso-dates.sql converts older sessions
+        date = datetime.now().strftime("%Y-%m-%d")
         name = f"Session {datetime.now().strftime('%b %d, %Y %I:%M %p')}"
         
         new_session = Session(
             id=session_id,
             name=name,
             date=date,
-            messages=[],
             active=True
         )
         
-        # Update local state
-        updated_sessions = [session.copy() for session in self.sessions]
-        for session in updated_sessions:
-            session.active = False
+        # Update local state, touching only the previously active entry
+        previous = self.active_session_data
+        if previous:
+            previous.active = False
         
-        updated_sessions.append(new_session)
-        self.sessions = updated_sessions
+        # Newest sessions are listed first
+        self.sessions[session_id] = new_session
+        self.session_order.insert(0, session_id)
         self.active_session = session_id
+        self.active_messages = []
+        self.has_older_messages = False
+        self._messages_cursor = None
         
         # Save to database
         try:
@@ -347,16 +451,20 @@ class SessionState(rx.State):
     
     @rx.event
     async def set_active_session(self, session_id: str):
-        """Set the active session."""
-        self.active_session = session_id
+        """Set the active session and lazily load its latest messages."""
+        if session_id not in self.sessions:
+            return
         
-        updated_sessions = []
-        for session in self.sessions:
-            updated_session = session.copy()
-            updated_session.active = (session.id == session_id)
-            updated_sessions.append(updated_session)
+        # Flip the active flag on the two affected entries only
+        previous = self.active_session_data
+        if previous:
+            previous.active = False
+        self.sessions[session_id].active = True
         
-        self.sessions = updated_sessions
+        self.active_session = session_id
+        self.active_messages = []
+        
+        await self.load_session_messages(session_id)
     
     @rx.event
     async def rename_session(self, session_id: str, new_name: str):
@@ -365,14 +473,9 @@ class SessionState(rx.State):
             return
         
         # Update local state
-        updated_sessions = []
-        for session in self.sessions:
-            updated_session = session.copy()
-            if session.id == session_id:
-                updated_session.name = new_name
-            updated_sessions.append(updated_session)
-        
-        self.sessions = updated_sessions
+        session = self.sessions.get(session_id)
+        if session:
+            session.name = new_name
         
         # Update in database
         try:
@@ -388,16 +491,17 @@ class SessionState(rx.State):
     async def delete_session(self, session_id: str):
         """Delete a session."""
         # Update local state
-        updated_sessions = [session for session in self.sessions if session.id != session_id]
-        self.sessions = updated_sessions
+        self.sessions.pop(session_id, None)
+        if session_id in self.session_order:
+            self.session_order.remove(session_id)
         
         # If we deleted the active session, set a new active session
         if self.active_session == session_id:
-            if updated_sessions:
-                self.active_session = updated_sessions[0].id
-                self.set_active_session(updated_sessions[0].id)
+            self.active_session = None
+            self.active_messages = []
+            if self.session_order:
+                await self.set_active_session(self.session_order[0])
             else:
-                self.active_session = None
                 await self.create_new_session()
         
         # Delete from database
@@ -411,8 +515,21 @@ class SessionState(rx.State):
     @rx.event
     async def add_message_to_session(self, message_type: str, content: str, timestamp: str):
         """Add a message to the active session."""
+        row = self._append_message(message_type, content, timestamp)
+        if row:
+            await insert_session_message(row)
+    
+    def _append_message(self, message_type: str, content: str, timestamp: str) -> Optional[Dict[str, Any]]:
+        """Add a message to the active session in local state only.
+        
+        Background tasks call this while holding the state lock and insert
+        the returned row with insert_session_message() after releasing it.
+        
+        Returns:
+            The session_messages row to insert, or None without an active session
+        """
         if not self.active_session:
-            return
+            return None
         
         new_message = Message(
             type=message_type,
@@ -421,35 +538,12 @@ class SessionState(rx.State):
         )
         
         # Update local state
-        updated_sessions = []
-        for session in self.sessions:
-            updated_session = session.copy()
-            if session.id == self.active_session:
-                updated_messages = session.messages.copy() if session.messages else []
-                updated_messages.append(new_message)
-                updated_session.messages = updated_messages
-            updated_sessions.append(updated_session)
-        
-        self.sessions = updated_sessions
-        
-        # Update in database
-        try:
-            from lib.supabase import supabase
-            
-            # Get current messages
-            response = await supabase.table("sessions").select("messages").eq("id", self.active_session).execute()
-            current_messages = response.data[0].get("messages", []) if response.data else []
-            
-            # Append new message
-            updated_messages = current_messages + [{
-                "type": message_type,
-                "content": content,
-                "timestamp": timestamp
-            }]
-            
-            # Update in database
-            await supabase.table("sessions").update({
-                "messages": updated_messages
-            }).eq("id", self.active_session).execute()
-        except Exception as e:
-            print(f"Error adding message to session: {e}")
\ No newline at end of file
+        self.active_messages.append(new_message)
+        
+        return {
+            "session_id": self.active_session,
+            "user_id": self.user["id"] if self.user else None,
+            "type": message_type,
+            "content": content,
+            "timestamp": timestamp
+        }
@@ -3,6 +3,14 @@
 from lib.supabase import (
     supabase,
     get_pg_connection,
+    release_pg_connection,
+    pg_connection,
+    async_pg_connection,
+    get_pg_pool_stats,
+    bulk_save_narratives,
+    fetch_session_page,
+    fetch_message_page,
+    insert_session_message,
     is_supabase_configured,
     get_current_user,
     sign_in_with_email_password,
@@ -13,14 +21,44 @@ from lib.supabase import (
 from lib.openai_client import (
     generate_ems_narrative,
     generate_fire_narrative,
+    stream_ems_narrative,
+    stream_fire_narrative,
+    coalesce_deltas,
     chat_completion,
     generate_embeddings,
+    generate_embeddings_batch,
+    close_client,
+    prompt_stats,
     MODELS
 )
 
+from lib.narrative_cache import get_narrative_cache
+
+from lib.embedding_cache import get_embedding_cache
+
+from lib.llm_limiter import llm_limiter
+
+from lib.llm_retry import openai_retry
+
+from lib.connectivity import connectivity_monitor
+
+from lib.outbox import get_outbox
+
+from lib.narrative_repository import narrative_repository
+
+from lib.knowledge_base import knowledge_base
+
 __all__ = [
     "supabase",
     "get_pg_connection",
+    "release_pg_connection",
+    "pg_connection",
+    "async_pg_connection",
+    "get_pg_pool_stats",
+    "bulk_save_narratives",
+    "fetch_session_page",
+    "fetch_message_page",
+    "insert_session_message",
     "is_supabase_configured",
     "get_current_user",
     "sign_in_with_email_password",
@@ -28,7 +66,21 @@ __all__ = [
     "check_admin_status",
     "generate_ems_narrative",
     "generate_fire_narrative",
+    "stream_ems_narrative",
+    "stream_fire_narrative",
+    "coalesce_deltas",
     "chat_completion",
     "generate_embeddings",
-    "MODELS"
+    "generate_embeddings_batch",
+    "close_client",
+    "prompt_stats",
+    "MODELS",
+    "get_narrative_cache",
+    "get_embedding_cache",
+    "llm_limiter",
+    "openai_retry",
+    "connectivity_monitor",
+    "get_outbox",
+    "narrative_repository",
+    "knowledge_base"
 ]
\ No newline at end of file
@@ -0,0 +1,94 @@
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Dict
+
+class GenerationCancelled(Exception):
+    """Raised when the user cancels the narrative being generated."""
+
+# Cancel events of the generations running in this worker, by key
+_cancel_events: Dict[str, asyncio.Event] = {}
+
+def begin_cancellable(key: str) -> asyncio.Event:
+    """Register a new cancellable operation under ``key``.
+
+    Args:
+        key: Identifies the operation, e.g. the client token and state
+
+    Returns:
+        The event request_cancel() sets for this operation
+    """
+    event = asyncio.Event()
+    _cancel_events[key] = event
+    return event
+
+def end_cancellable(key: str, event: asyncio.Event):
+    """Unregister an operation once it has finished."""
+    if _cancel_events.get(key) is event:
+        del _cancel_events[key]
+
+def request_cancel(key: str) -> bool:
+    """Cancel the operation registered under ``key``, if any is running."""
+    event = _cancel_events.get(key)
+    if event is None:
+        return False
+    event.set()
+    return True
+
+async def await_unless_cancelled(cancelled: asyncio.Event, awaitable: Awaitable[Any]) -> Any:
+    """Await one stage of an operation, stopping as soon as it is cancelled.
+
+    The stage is raced against the cancel event, so a cancel takes effect
+    during a connectivity probe, retrieval, admission or a slow first
+    token, not only between streamed chunks. A cancelled stage is awaited
+    until it has unwound before this returns.
+
+    Args:
+        cancelled: Event set when the operation is cancelled
+        awaitable: The stage to run
+
+    Returns:
+        The result of the stage
+
+    Raises:
+        GenerationCancelled: If the operation was cancelled before the stage finished
+    """
+    task = asyncio.ensure_future(awaitable)
+    waiter = asyncio.ensure_future(cancelled.wait())
+    try:
+        await asyncio.wait({task, waiter}, return_when=asyncio.FIRST_COMPLETED)
+        if task.done():
+            return task.result()
+        raise GenerationCancelled()
+    finally:
+        waiter.cancel()
+        if not task.done():
+            task.cancel()
+            # Let the stage unwind, e.g. so its async generator can be closed
+            await asyncio.gather(task, return_exceptions=True)
+
+async def iter_unless_cancelled(cancelled: asyncio.Event, stream: AsyncIterator[str]) -> AsyncIterator[str]:
+    """Iterate a stream, stopping as soon as the operation is cancelled.
+
+    Each item is awaited with await_unless_cancelled(), and the stream is
+    closed when iteration stops for any reason.
+
+    Args:
+        cancelled: Event set when the operation is cancelled
+        stream: Async iterator to read
+
+    Returns:
+        Async iterator over the items of the stream
+
+    Raises:
+        GenerationCancelled: If the operation was cancelled while an item was pending
+    """
+    try:
+        while True:
+            try:
+                item = await await_unless_cancelled(cancelled, stream.__anext__())
+            except StopAsyncIteration:
+                return
+            yield item
+    finally:
+        aclose = getattr(stream, "aclose", None)
+        if aclose is not None:
+            await aclose()
@@ -0,0 +1,189 @@
+import os
+import json
+import uuid
+import mmap
+import shutil
+import struct
+import tempfile
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+# File layout (all integers little-endian):
+#   magic (8 bytes) | footer offset (uint64)
+#   vectors         float32[count][dimensions], L2-normalized
+#   hashes          uint8[count][32], SHA-256 content hash of each chunk
+#   source ids      uint16[count], index into the footer's source list
+#   offsets         uint64[count + 1], start of each record in the text section
+#   text            UTF-8 JSON record per chunk (content_id, title, content, source and provenance if any)
+#   footer          UTF-8 JSON with the counts, section offsets and metadata
+CHUNK_STORE_MAGIC = b"KBCHUNK1"
+_PREAMBLE = struct.Struct("<8sQ")
+
+VECTOR_DTYPE = np.dtype("<f4")
+OFFSET_DTYPE = np.dtype("<u8")
+SOURCE_ID_DTYPE = np.dtype("<u2")
+HASH_SIZE = 32
+
+class ChunkStoreWriter:
+    """Writes a chunk store one chunk at a time.
+
+    Vectors go straight to the file and record text to a temporary spool,
+    so memory use does not grow with the number of chunks beyond a few bytes
+    of bookkeeping each. The store is written to a temporary file and moved
+    into place by close().
+    """
+
+    def __init__(self, path: str, metadata: Optional[Dict[str, Any]] = None):
+        self.path = path
+        self.metadata = metadata or {}
+        # Unique per writer, so concurrent builds (e.g. several app workers)
+        # never write into the same file; the last close() wins
+        self._tmp_path = f"{path}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+        self._file = open(self._tmp_path, "wb")
+        self._file.write(_PREAMBLE.pack(CHUNK_STORE_MAGIC, 0))
+        self._text = tempfile.TemporaryFile()
+        self._hashes = tempfile.TemporaryFile()
+        self._offsets: List[int] = [0]
+        self._source_ids: List[int] = []
+        self._sources: Dict[str, int] = {}
+        self.dimensions: Optional[int] = None
+
+    def add(self, chunk: Dict[str, Any], chunk_hash: str, embedding: Any):
+        """Append a chunk with its content hash (hex) and embedding."""
+        vector = np.asarray(embedding, dtype=VECTOR_DTYPE).ravel()
+        if self.dimensions is None:
+            self.dimensions = len(vector)
+        elif len(vector) != self.dimensions:
+            raise ValueError(f"Expected {self.dimensions} dimensions, got {len(vector)}")
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector = vector / norm
+        self._file.write(vector.astype(VECTOR_DTYPE).tobytes())
+        self._hashes.write(bytes.fromhex(chunk_hash))
+
+        record = {
+            "content_id": chunk["content_id"],
+            "title": chunk["title"],
+            "content": chunk["content"],
+            "source": chunk["source"]
+        }
+        if chunk.get("provenance") is not None:
+            record["provenance"] = chunk["provenance"]
+        data = json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self._text.write(data)
+        self._offsets.append(self._offsets[-1] + len(data))
+        self._source_ids.append(self._sources.setdefault(chunk["source"], len(self._sources)))
+
+    def close(self):
+        """Write the remaining sections and move the store into place."""
+        count = len(self._source_ids)
+        footer = {
+            "count": count,
+            "dimensions": self.dimensions or 0,
+            "sources": list(self._sources),
+            "metadata": self.metadata,
+            "vectors": _PREAMBLE.size
+        }
+
+        footer["hashes"] = self._file.tell()
+        self._hashes.seek(0)
+        shutil.copyfileobj(self._hashes, self._file)
+
+        footer["source_ids"] = self._file.tell()
+        self._file.write(np.asarray(self._source_ids, dtype=SOURCE_ID_DTYPE).tobytes())
+
+        footer["offsets"] = self._file.tell()
+        self._file.write(np.asarray(self._offsets, dtype=OFFSET_DTYPE).tobytes())
+
+        footer["text"] = self._file.tell()
+        self._text.seek(0)
+        shutil.copyfileobj(self._text, self._file)
+
+        footer_offset = self._file.tell()
+        self._file.write(json.dumps(footer).encode("utf-8"))
+        self._file.seek(0)
+        self._file.write(_PREAMBLE.pack(CHUNK_STORE_MAGIC, footer_offset))
+
+        self._file.close()
+        self._text.close()
+        self._hashes.close()
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self):
+        """Discard a partly written store."""
+        self._file.close()
+        self._text.close()
+        self._hashes.close()
+        try:
+            os.remove(self._tmp_path)
+        except OSError:
+            pass
+
+class ChunkStore:
+    """Read-only, memory-mapped chunk store.
+
+    Opening a store only reads its footer; vectors are a memory-mapped
+    matrix and chunk records are decoded on access, so the operating system
+    pages in just what a search touches.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            magic, footer_offset = _PREAMBLE.unpack(self._file.read(_PREAMBLE.size))
+            if magic != CHUNK_STORE_MAGIC:
+                raise ValueError(f"{path} is not a chunk store")
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self._file.close()
+            raise
+
+        footer = json.loads(self._mmap[footer_offset:].decode("utf-8"))
+        count = footer["count"]
+        self.dimensions = footer["dimensions"]
+        self.sources: List[str] = footer["sources"]
+        self.metadata: Dict[str, Any] = footer.get("metadata", {})
+
+        self.vectors = np.frombuffer(
+            self._mmap, dtype=VECTOR_DTYPE, count=count * self.dimensions, offset=footer["vectors"]
+        ).reshape(count, self.dimensions)
+        self.hashes = np.frombuffer(
+            self._mmap, dtype=np.uint8, count=count * HASH_SIZE, offset=footer["hashes"]
+        ).reshape(count, HASH_SIZE)
+        self.source_ids = np.frombuffer(self._mmap, dtype=SOURCE_ID_DTYPE, count=count, offset=footer["source_ids"])
+        self._offsets = np.frombuffer(self._mmap, dtype=OFFSET_DTYPE, count=count + 1, offset=footer["offsets"])
+        self._text_start = footer["text"]
+
+    def __len__(self) -> int:
+        return len(self.source_ids)
+
+    def __getitem__(self, i: int) -> Dict[str, Any]:
+        """Decode the record of chunk ``i``."""
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        start = self._text_start + int(self._offsets[i])
+        end = self._text_start + int(self._offsets[i + 1])
+        return json.loads(self._mmap[start:end].decode("utf-8"))
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def hash_rows(self) -> Dict[str, int]:
+        """Map each content hash (hex) to its row."""
+        return {bytes(row).hex(): i for i, row in enumerate(self.hashes)}
+
+    def close(self):
+        """Unmap and close the file.
+
+        Arrays taken from the store must not be used afterwards.
+        """
+        self.vectors = self.hashes = self.source_ids = self._offsets = None
+        try:
+            self._mmap.close()
+        except BufferError:
+            # A numpy view is still alive; the mapping is released with it
+            pass
+        self._file.close()
@@ -0,0 +1,337 @@
+import os
+import re
+import hashlib
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from lib.llm_limiter import estimate_tokens
+
+# Version of the chunking rules. Bump it whenever chunk boundaries or text
+# normalization change so every chunk is re-embedded.
+CHUNKER_VERSION = "2"
+
+# Chunk size settings, in estimated tokens
+KB_CHUNK_TOKENS = int(os.getenv("KB_CHUNK_TOKENS", "350"))
+KB_CHUNK_OVERLAP = int(os.getenv("KB_CHUNK_OVERLAP", "50"))
+# Smaller windows (e.g. "None noted") carry no retrievable information
+KB_CHUNK_MIN_TOKENS = int(os.getenv("KB_CHUNK_MIN_TOKENS", "8"))
+
+# Section headings of the national guidelines. PDF extraction splits some of
+# them (e.g. "Patient Care Goal s"), so headings are compared without spaces.
+GUIDELINE_SECTIONS = [
+    "Aliases",
+    "Definitions",
+    "Patient Care Goals",
+    "Patient Presentation",
+    "Inclusion Criteria",
+    "Exclusion Criteria",
+    "Patient Management",
+    "Assessment",
+    "Treatment and Interventions",
+    "Assessment, Treatment, and Interventions",
+    "Patient Safety Considerations",
+    "Notes/Educational Pearls",
+    "Key Considerations",
+    "Pertinent Assessment Findings",
+    "Quality Improvement",
+    "Key Documentation Elements",
+    "Performance Measures",
+    "References",
+    "Revision Date"
+]
+
+# Sections that only hold citations or dates and are not worth retrieving
+SKIPPED_SECTIONS = {"References", "Revision Date"}
+
+# Title used for front matter pages without a guideline header
+GUIDELINES_TITLE = "National Model EMS Clinical Guidelines"
+
+# Filler text the protocol extraction used for protocols it could not parse
+PLACEHOLDER_CONTENT = {"Protocol information not available in detail."}
+
+def _compact(text: str) -> str:
+    """Key for comparing text that PDF extraction may have split with spaces."""
+    return re.sub(r"\s+", "", text).lower()
+
+_SECTION_KEYS = {_compact(heading): heading for heading in GUIDELINE_SECTIONS}
+_DOT_LEADER = re.compile(r"(?:\s*\.){4,}")
+_WHITESPACE = re.compile(r"[^\S\n]+")
+_LIST_ITEM = re.compile(r"^(?:\d+|[a-zA-Z]|[ivxlc]+)[.)]\s|^[•\-–—*]\s")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_PAGE_TITLE = re.compile(r"^(.*?)\s+(\d+)$")
+
+Unit = Tuple[str, Optional[int]]
+
+def normalize_text(text: str) -> str:
+    """Normalize whitespace and remove PDF artifacts.
+
+    Collapses runs of spaces, drops blank lines and table-of-contents dot
+    leaders, and keeps one line per source line.
+    """
+    text = text.replace("\u202f", " ").replace("\xa0", " ").replace("\r", "")
+    lines = []
+    for line in text.split("\n"):
+        line = _WHITESPACE.sub(" ", _DOT_LEADER.sub(" ", line)).strip()
+        if line:
+            lines.append(line)
+    return "\n".join(lines)
+
+def _section_heading(line: str) -> Optional[str]:
+    """Get the guideline section a heading line starts, if it is one."""
+    return _SECTION_KEYS.get(_compact(line))
+
+def _parse_page(text: str) -> Tuple[Optional[Dict[str, Any]], List[str]]:
+    """Split a guideline page into its running header and body lines.
+
+    Pages start with the document title, the category and revision, the
+    guideline title with the page number and "Version 3.0".
+    """
+    lines = normalize_text(text).split("\n")
+    try:
+        version = next(i for i, line in enumerate(lines[:8]) if line.replace(" ", "") == "Version3.0")
+    except StopIteration:
+        return None, lines
+
+    header = {"category": None, "guideline": None, "page": None}
+    for line in lines[1:version]:
+        if "Go To TOC" in line:
+            continue
+        if "Rev." in line:
+            header["category"] = line.split("Rev.")[0].strip() or None
+            continue
+        match = _PAGE_TITLE.match(line)
+        if match:
+            header["guideline"] = match.group(1) or None
+            header["page"] = int(match.group(2))
+        elif line.isdigit():
+            header["page"] = int(line)
+    return header, lines[version + 1:]
+
+def join_lines(lines: Iterable[Unit]) -> List[Unit]:
+    """Rejoin (line, page) pairs the PDF wrapped mid-sentence.
+
+    A line starts a new unit if it is a list item or the previous line ended
+    a sentence or clause; otherwise it continues the previous unit, even
+    across a page break. A unit keeps the page it starts on.
+    """
+    units: List[Unit] = []
+    for line, page in lines:
+        if units and not _LIST_ITEM.match(line) and not units[-1][0].endswith((".", ":", ";", "?", "!")):
+            units[-1] = (f"{units[-1][0]} {line}", units[-1][1])
+        else:
+            units.append((line, page))
+    return units
+
+def _split_long_unit(text: str, max_tokens: int) -> List[str]:
+    """Split a unit longer than a window at sentences, then at words."""
+    pieces: List[str] = []
+    for sentence in _SENTENCE_END.split(text):
+        if estimate_tokens(text=sentence) <= max_tokens:
+            pieces.append(sentence)
+            continue
+        words: List[str] = []
+        for word in sentence.split(" "):
+            if words and estimate_tokens(text=" ".join(words + [word])) > max_tokens:
+                pieces.append(" ".join(words))
+                words = []
+            words.append(word)
+        if words:
+            pieces.append(" ".join(words))
+    return pieces
+
+def window_units(
+    units: List[Unit],
+    max_tokens: int = KB_CHUNK_TOKENS,
+    overlap: int = KB_CHUNK_OVERLAP
+) -> List[List[Unit]]:
+    """Pack text units into token-budgeted windows with overlap.
+
+    Windows break between units (sentences or list items). Each window
+    after the first starts with the trailing units of the previous one, up
+    to ``overlap`` tokens, so context spanning a boundary is kept.
+
+    Args:
+        units: (text, page) pairs in document order
+        max_tokens: Token budget of a window
+        overlap: Tokens repeated from the end of the previous window
+
+    Returns:
+        List of windows, each a list of units
+    """
+    pieces: List[Unit] = []
+    for text, page in units:
+        if estimate_tokens(text=text) > max_tokens:
+            pieces.extend((piece, page) for piece in _split_long_unit(text, max_tokens))
+        else:
+            pieces.append((text, page))
+
+    windows: List[List[Unit]] = []
+    window: List[Unit] = []
+    tokens = 0
+    fresh = 0
+    for piece in pieces:
+        cost = estimate_tokens(text=piece[0])
+        if window and tokens + cost > max_tokens:
+            windows.append(window)
+            # Carry the tail of the window over, leaving room for the new piece
+            carried: List[Unit] = []
+            carried_tokens = 0
+            for previous in reversed(window):
+                previous_cost = estimate_tokens(text=previous[0])
+                if carried_tokens + previous_cost > min(overlap, max_tokens - cost):
+                    break
+                carried.insert(0, previous)
+                carried_tokens += previous_cost
+            window, tokens, fresh = carried, carried_tokens, 0
+        window.append(piece)
+        tokens += cost
+        fresh += 1
+    if window and fresh:
+        windows.append(window)
+    return windows
+
+def _content_id(source: str, *parts: Any) -> str:
+    """Build a content id that stays the same when unrelated text changes."""
+    key = hashlib.sha256("\n".join(str(part) for part in parts).encode("utf-8")).hexdigest()[:12]
+    return f"{source}-{key}"
+
+def _window_chunks(
+    units: List[Unit],
+    source: str,
+    title: str,
+    provenance: Dict[str, Any],
+    max_tokens: int,
+    overlap: int
+) -> Iterator[Dict[str, Any]]:
+    """Turn the lines of one section into windowed chunks."""
+    base_id = _content_id(source, *provenance.values())
+    for i, window in enumerate(window_units(join_lines(units), max_tokens, overlap)):
+        content = "\n".join(text for text, _ in window)
+        if estimate_tokens(text=content) < KB_CHUNK_MIN_TOKENS:
+            continue
+        pages = [page for _, page in window if page is not None]
+        yield {
+            "content_id": f"{base_id}-{i}",
+            "title": title,
+            "content": content,
+            "source": source,
+            "provenance": dict(
+                provenance,
+                pages=[min(pages), max(pages)] if pages else None,
+                window=i,
+                chunker_version=CHUNKER_VERSION
+            )
+        }
+
+def chunk_guideline_pages(
+    pages: Iterable[Dict[str, Any]],
+    source: str,
+    filename: str,
+    max_tokens: int = KB_CHUNK_TOKENS,
+    overlap: int = KB_CHUNK_OVERLAP
+) -> Iterator[Dict[str, Any]]:
+    """Chunk the pages of the national guidelines by guideline and section.
+
+    Consecutive pages of the same guideline are read as one document, split
+    at its section headings and windowed by tokens. Page headers are
+    removed from the text and recorded as provenance instead.
+
+    Args:
+        pages: Page entries with title and content (or text)
+        source: Source identifier of the chunks
+        filename: Knowledge base file the pages come from
+        max_tokens: Token budget of a chunk
+        overlap: Tokens repeated between consecutive chunks of a section
+
+    Returns:
+        Iterator over chunks with content_id, title, content, source and provenance
+    """
+    occurrences: Dict[Tuple[str, str, Optional[str]], int] = {}
+    current: Optional[Tuple[str, str, Optional[str]]] = None
+    units: List[Unit] = []
+
+    def flush() -> Iterator[Dict[str, Any]]:
+        if current is None or not units or current[2] in SKIPPED_SECTIONS:
+            return
+        category, guideline, section = current
+        occurrence = occurrences.get(current, 0)
+        occurrences[current] = occurrence + 1
+        provenance = {
+            "file": filename,
+            "category": category,
+            "guideline": guideline,
+            "section": section,
+            "occurrence": occurrence
+        }
+        title = f"{guideline} - {section}" if section else guideline
+        yield from _window_chunks(units, source, title, provenance, max_tokens, overlap)
+
+    for entry in pages:
+        header, lines = _parse_page(entry.get("content") or entry.get("text") or "")
+        page = header["page"] if header else None
+        guideline = (header or {}).get("guideline") or GUIDELINES_TITLE
+        category = (header or {}).get("category") or ""
+
+        # Running headers of the same guideline may be split differently
+        if current is None or _compact(f"{current[0]}\n{current[1]}") != _compact(f"{category}\n{guideline}"):
+            yield from flush()
+            current, units = (category, guideline, None), []
+        category, guideline = current[:2]
+
+        for line in lines:
+            heading = _section_heading(line)
+            if heading is None:
+                units.append((line, page))
+                continue
+            yield from flush()
+            current, units = (category, guideline, heading), []
+
+    yield from flush()
+
+def chunk_protocols(
+    protocols: Iterable[Dict[str, Any]],
+    source: str,
+    filename: str,
+    max_tokens: int = KB_CHUNK_TOKENS,
+    overlap: int = KB_CHUNK_OVERLAP
+) -> Iterator[Dict[str, Any]]:
+    """Chunk the subsections of a stream of regional protocols.
+
+    The per-subsection ``chunks`` of the protocol file only hold generated
+    one-line descriptions, so the subsection content is chunked instead.
+    Subsections repeated verbatim across protocols are indexed once.
+
+    Args:
+        protocols: Protocol entries with title and subsections
+        source: Source identifier of the chunks
+        filename: Knowledge base file the protocols come from
+        max_tokens: Token budget of a chunk
+        overlap: Tokens repeated between consecutive chunks of a subsection
+
+    Returns:
+        Iterator over chunks with content_id, title, content, source and provenance
+    """
+    seen = set()
+    occurrences: Dict[Tuple[str, str], int] = {}
+    for protocol in protocols:
+        for subsection in protocol.get("subsections", []):
+            content = normalize_text(subsection.get("content") or "")
+            if not content or content in PLACEHOLDER_CONTENT:
+                continue
+            digest = hashlib.sha256(content.encode("utf-8")).digest()
+            if digest in seen:
+                continue
+            seen.add(digest)
+
+            protocol_title = protocol.get("title", "")
+            subsection_title = subsection.get("title", "")
+            occurrence = occurrences.get((protocol_title, subsection_title), 0)
+            occurrences[(protocol_title, subsection_title)] = occurrence + 1
+            provenance = {
+                "file": filename,
+                "protocol": protocol_title,
+                "subsection": subsection_title,
+                "occurrence": occurrence
+            }
+            units = [(line, None) for line in content.split("\n")]
+            title = f"{protocol_title} - {subsection_title}"
+            yield from _window_chunks(units, source, title, provenance, max_tokens, overlap)
@@ -0,0 +1,159 @@
+import os
+import time
+import asyncio
+from typing import Awaitable, Callable, List, Optional
+
+import httpx
+
+from lib.supabase import supabase_url, supabase_key
+
+# Connectivity settings
+CONNECTIVITY_TTL = float(os.getenv("CONNECTIVITY_TTL", "15"))
+CONNECTIVITY_PROBE_TIMEOUT = float(os.getenv("CONNECTIVITY_PROBE_TIMEOUT", "3"))
+CONNECTIVITY_POLL_INTERVAL = float(os.getenv("CONNECTIVITY_POLL_INTERVAL", "30"))
+
+async def supabase_health_probe() -> bool:
+    """Probe Supabase with a lightweight health request.
+
+    Hits the auth health endpoint, which does not touch any application
+    table, instead of running a query against narratives.
+    """
+    if not supabase_url:
+        return False
+
+    try:
+        async with httpx.AsyncClient(timeout=CONNECTIVITY_PROBE_TIMEOUT) as http:
+            response = await http.get(
+                f"{supabase_url.rstrip('/')}/auth/v1/health",
+                headers={"apikey": supabase_key or ""}
+            )
+        return response.status_code < 500
+    except Exception:
+        return False
+
+class ConnectivityMonitor:
+    """Shared connectivity status with a cached, single-flight probe.
+
+    ``is_online()`` answers from memory while the last probe is younger
+    than ``ttl`` seconds. Concurrent callers share one in-flight probe.
+    Subscribers are notified when the status changes, and ``wait_for_change``
+    lets background tasks push updates instead of polling.
+    """
+
+    def __init__(
+        self,
+        probe: Callable[[], Awaitable[bool]] = supabase_health_probe,
+        ttl: float = CONNECTIVITY_TTL,
+        poll_interval: float = CONNECTIVITY_POLL_INTERVAL
+    ):
+        self._probe = probe
+        self.ttl = ttl
+        self.poll_interval = poll_interval
+
+        self.online: Optional[bool] = None
+        self.last_checked: float = 0.0
+        self._inflight: Optional[asyncio.Task] = None
+        self._poller: Optional[asyncio.Task] = None
+        self._changed: Optional[asyncio.Event] = None
+        self._subscribers: List[Callable[[bool], Awaitable[None]]] = []
+
+    @property
+    def is_fresh(self) -> bool:
+        """Whether the cached status is younger than the TTL."""
+        return self.online is not None and time.monotonic() - self.last_checked < self.ttl
+
+    async def is_online(self, force: bool = False) -> bool:
+        """Get the connectivity status, probing only when the cache is stale."""
+        if not force and self.is_fresh:
+            return self.online
+        return await self.refresh()
+
+    async def refresh(self) -> bool:
+        """Probe now, joining any probe that is already in flight."""
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.ensure_future(self._run_probe())
+        return await asyncio.shield(self._inflight)
+
+    def subscribe(self, callback: Callable[[bool], Awaitable[None]]):
+        """Register a coroutine called with the new status on every change."""
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback: Callable[[bool], Awaitable[None]]):
+        """Remove a previously registered callback."""
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    async def wait_for_change(self, current: Optional[bool], timeout: Optional[float] = None) -> Optional[bool]:
+        """Wait until the status differs from ``current`` and return it.
+
+        Starts the background poller if needed. Returns the unchanged status
+        if the timeout elapses first.
+        """
+        self.start()
+        while self.online == current:
+            event = self._get_changed_event()
+            try:
+                await asyncio.wait_for(event.wait(), timeout)
+            except asyncio.TimeoutError:
+                break
+        return self.online
+
+    def start(self):
+        """Start polling in the background (idempotent)."""
+        if self._poller is None or self._poller.done():
+            self._poller = asyncio.ensure_future(self._poll())
+
+    async def stop(self):
+        """Stop the background poller."""
+        if self._poller is not None:
+            self._poller.cancel()
+            try:
+                await self._poller
+            except asyncio.CancelledError:
+                pass
+            self._poller = None
+
+    def _get_changed_event(self) -> asyncio.Event:
+        """Get the event set on the next status change."""
+        if self._changed is None:
+            self._changed = asyncio.Event()
+        return self._changed
+
+    async def _run_probe(self) -> bool:
+        """Run the probe and publish the result."""
+        try:
+            online = bool(await self._probe())
+        except Exception:
+            online = False
+
+        previous = self.online
+        self.online = online
+        self.last_checked = time.monotonic()
+
+        if previous is not None and previous != online:
+            await self._notify(online)
+        elif previous is None:
+            self._get_changed_event().set()
+            self._changed = None
+
+        return online
+
+    async def _notify(self, online: bool):
+        """Wake waiters and call subscribers after a status change."""
+        self._get_changed_event().set()
+        self._changed = None
+
+        for callback in list(self._subscribers):
+            try:
+                await callback(online)
+            except Exception as e:
+                print(f"Error in connectivity subscriber: {e}")
+
+    async def _poll(self):
+        """Refresh the status periodically."""
+        while True:
+            await self.refresh()
+            await asyncio.sleep(self.poll_interval)
+
+# Shared monitor for the whole worker
+connectivity_monitor = ConnectivityMonitor()
@@ -0,0 +1,258 @@
+import os
+import time
+import asyncio
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import numpy as np
+
+from lib.outbox import get_outbox_dir
+
+# Cache settings. The persistent tier is "sqlite" (per device), "postgres"
+# (the query_embedding_cache table, shared with the protocol-query function)
+# or "none".
+EMBEDDING_CACHE_BACKEND = os.getenv("EMBEDDING_CACHE_BACKEND", "sqlite")
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "2000"))
+
+# Vectors are stored as packed little-endian float32
+EMBEDDING_DTYPE = np.dtype("<f4")
+
+def normalize_query(text: str) -> str:
+    """Normalize a query so trivially different phrasings share a cache entry."""
+    return " ".join(text.lower().split())
+
+def make_embedding_key(text: str, model: str) -> str:
+    """Build the cache key for a text and embedding model.
+
+    Uses the same scheme as supabase/functions/protocol-query so both share
+    the Postgres tier.
+    """
+    return hashlib.sha256(f"{model}\n{normalize_query(text)}".encode("utf-8")).hexdigest()
+
+def pack_embedding(embedding: List[float]) -> bytes:
+    """Pack an embedding as float32 bytes (4 bytes per dimension)."""
+    return np.asarray(embedding, dtype=EMBEDDING_DTYPE).tobytes()
+
+def unpack_embedding(data: bytes) -> List[float]:
+    """Unpack float32 bytes into an embedding."""
+    return np.frombuffer(data, dtype=EMBEDDING_DTYPE).tolist()
+
+class SqliteEmbeddingStore:
+    """Persistent embedding tier in a local SQLite database."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS query_embedding_cache (
+                cache_key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """Get packed embedding bytes, or None if missing or unavailable."""
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT embedding FROM query_embedding_cache WHERE cache_key = ?", (key,)
+                ).fetchone()
+        except sqlite3.Error as e:
+            print(f"Error reading embedding cache: {e}")
+            return None
+        return row[0] if row else None
+
+    async def set(self, key: str, model: str, data: bytes):
+        """Store packed embedding bytes."""
+        try:
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO query_embedding_cache (cache_key, model, embedding, created_at) VALUES (?, ?, ?, ?)",
+                    (key, model, data, time.time())
+                )
+        except sqlite3.Error as e:
+            print(f"Error writing embedding cache: {e}")
+
+    def close(self):
+        """Close the database."""
+        with self._lock:
+            self._conn.close()
+
+class PostgresEmbeddingStore:
+    """Persistent embedding tier in the Postgres query_embedding_cache table.
+
+    See db-scripts/create-query-embedding-cache-table.sql.
+    """
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """Get packed embedding bytes, or None if missing or unavailable."""
+        from lib.supabase import async_pg_connection
+
+        try:
+            async with async_pg_connection() as conn:
+                return await conn.fetchval(
+                    "SELECT embedding FROM query_embedding_cache WHERE cache_key = $1", key
+                )
+        except Exception as e:
+            print(f"Error reading embedding cache: {e}")
+            return None
+
+    async def set(self, key: str, model: str, data: bytes):
+        """Store packed embedding bytes."""
+        from lib.supabase import async_pg_connection
+
+        try:
+            async with async_pg_connection() as conn:
+                await conn.execute(
+                    """
+                    INSERT INTO query_embedding_cache (cache_key, model, dimensions, embedding)
+                    VALUES ($1, $2, $3, $4)
+                    ON CONFLICT (cache_key) DO NOTHING
+                    """,
+                    key, model, len(data) // EMBEDDING_DTYPE.itemsize, data
+                )
+        except Exception as e:
+            print(f"Error writing embedding cache: {e}")
+
+class EmbeddingCache:
+    """Two-tier cache of query embeddings.
+
+    Recently used embeddings are kept in an in-memory LRU; misses fall
+    through to the persistent tier and are promoted on a hit. Concurrent
+    requests for the same text share one API call.
+    """
+
+    def __init__(self, store=None, max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES):
+        self.store = store
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._pending: Dict[str, asyncio.Future] = {}
+
+        self.memory_hits = 0
+        self.store_hits = 0
+        self.misses = 0
+
+    async def get(self, text: str, model: str) -> Optional[List[float]]:
+        """Get a cached embedding, or None if missing."""
+        data = await self._get_packed(make_embedding_key(text, model))
+        return unpack_embedding(data) if data is not None else None
+
+    async def set(self, text: str, model: str, embedding: List[float]):
+        """Store an embedding in both tiers."""
+        key = make_embedding_key(text, model)
+        data = pack_embedding(embedding)
+        self._remember(key, data)
+        if self.store is not None:
+            await self.store.set(key, model, data)
+
+    async def get_or_create(
+        self,
+        text: str,
+        model: str,
+        create: Callable[[], Awaitable[List[float]]]
+    ) -> List[float]:
+        """Get a cached embedding or create, cache and return it.
+
+        Args:
+            text: Text the embedding is for
+            model: Embedding model name
+            create: Coroutine factory calling the embeddings API
+
+        Returns:
+            The embedding
+        """
+        key = make_embedding_key(text, model)
+        data = await self._get_packed(key)
+        if data is not None:
+            return unpack_embedding(data)
+
+        pending = self._pending.get(key)
+        if pending is not None:
+            try:
+                return unpack_embedding(await asyncio.shield(pending))
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+                # The call we were sharing was cancelled; make our own
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            data = pack_embedding(await create())
+            self._remember(key, data)
+            future.set_result(data)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Nobody may be waiting on this future; don't log it as unretrieved
+            future.exception()
+            raise
+        finally:
+            del self._pending[key]
+
+        if self.store is not None:
+            await self.store.set(key, model, data)
+        return unpack_embedding(data)
+
+    def stats(self) -> Dict[str, int]:
+        """Get hit/miss counters."""
+        return {
+            "entries": len(self._entries),
+            "memory_hits": self.memory_hits,
+            "store_hits": self.store_hits,
+            "misses": self.misses
+        }
+
+    async def _get_packed(self, key: str) -> Optional[bytes]:
+        """Look a key up in memory, then in the persistent tier."""
+        data = self._entries.get(key)
+        if data is not None:
+            self._entries.move_to_end(key)
+            self.memory_hits += 1
+            return data
+
+        if self.store is not None:
+            data = await self.store.get(key)
+            if data is not None:
+                self.store_hits += 1
+                self._remember(key, bytes(data))
+                return bytes(data)
+        return None
+
+    def _remember(self, key: str, data: bytes):
+        """Add an entry to the LRU, evicting the least recently used ones."""
+        self._entries[key] = data
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+_cache = None
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Get the configured embedding cache, creating it on first use."""
+    global _cache
+    if _cache is None:
+        store = None
+        if EMBEDDING_CACHE_BACKEND == "postgres":
+            store = PostgresEmbeddingStore()
+        elif EMBEDDING_CACHE_BACKEND == "sqlite":
+            path = os.getenv("EMBEDDING_CACHE_PATH") or os.path.join(get_outbox_dir(), "embedding_cache.sqlite3")
+            try:
+                store = SqliteEmbeddingStore(path)
+            except sqlite3.Error as e:
+                print(f"Warning: could not open embedding cache at {path}, using memory only: {e}")
+        _cache = EmbeddingCache(store)
+    return _cache
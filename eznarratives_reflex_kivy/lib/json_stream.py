@@ -0,0 +1,144 @@
+import json
+from typing import Any, Iterator, List, TextIO
+
+# Characters read from the file at a time
+JSON_STREAM_BUFFER_SIZE = 64 * 1024
+
+_WHITESPACE = " \t\n\r"
+
+class _JsonReader:
+    """Incremental reader over a JSON text file.
+
+    Only the unconsumed part of the current read is kept in memory; values
+    are decoded with the standard library decoder once they are complete.
+    """
+
+    def __init__(self, f: TextIO, buffer_size: int = JSON_STREAM_BUFFER_SIZE):
+        self.f = f
+        self.buffer_size = buffer_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self._decoder = json.JSONDecoder()
+
+    def _fill(self, size: int) -> bool:
+        """Read more of the file; returns False at the end of the file."""
+        data = self.f.read(size)
+        if not data:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Get the next non-whitespace character without consuming it ("" at the end)."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill(self.buffer_size):
+                return ""
+
+    def consume(self, expected: str):
+        """Consume the next non-whitespace character, which must be ``expected``."""
+        char = self.peek()
+        if char != expected:
+            raise json.JSONDecodeError(f"Expecting {expected!r}", self.buf, self.pos)
+        self.pos += 1
+
+    def value(self) -> Any:
+        """Decode the next complete JSON value."""
+        self.peek()
+        size = self.buffer_size
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self.buf, self.pos)
+                # A number or literal running to the end of the buffer may continue
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            # Grow the read size so a large value is not re-parsed too often
+            if not self._fill(size):
+                continue
+            size *= 2
+
+    def items(self) -> Iterator[None]:
+        """Step through an array; the caller reads each item before advancing."""
+        self.consume("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield None
+            char = self.peek()
+            self.pos += 1
+            if char == "]":
+                return
+            if char != ",":
+                raise json.JSONDecodeError("Expecting ',' or ']'", self.buf, self.pos - 1)
+
+    def keys(self) -> Iterator[str]:
+        """Step through an object; the caller reads each value before advancing."""
+        self.consume("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.consume(":")
+            yield key
+            char = self.peek()
+            self.pos += 1
+            if char == "}":
+                return
+            if char != ",":
+                raise json.JSONDecodeError("Expecting ',' or '}'", self.buf, self.pos - 1)
+
+def _iter_prefix(reader: _JsonReader, path: List[str]) -> Iterator[Any]:
+    """Yield the values at ``path`` below the reader's current position."""
+    if not path:
+        yield reader.value()
+        return
+
+    step, rest = path[0], path[1:]
+    if step == "item":
+        if reader.peek() != "[":
+            reader.value()
+            return
+        for _ in reader.items():
+            yield from _iter_prefix(reader, rest)
+        return
+
+    if reader.peek() != "{":
+        reader.value()
+        return
+    for key in reader.keys():
+        if key == step:
+            yield from _iter_prefix(reader, rest)
+        else:
+            reader.value()
+
+def iter_json_items(f: TextIO, prefix: str = "item", buffer_size: int = JSON_STREAM_BUFFER_SIZE) -> Iterator[Any]:
+    """Stream the values at a path of a JSON document one at a time.
+
+    Paths use ijson's prefix notation: object keys joined by dots, with
+    ``item`` standing for every element of an array. ``"item"`` yields the
+    elements of a top-level array; ``"sections.item.protocols.item"`` yields
+    every protocol of every section. Only one yielded value (plus one read
+    buffer) is held in memory at a time.
+
+    Args:
+        f: Text file to read
+        prefix: Path of the values to yield
+        buffer_size: Characters to read at a time
+
+    Returns:
+        Iterator over the values at the path
+    """
+    reader = _JsonReader(f, buffer_size)
+    yield from _iter_prefix(reader, prefix.split(".") if prefix else [])
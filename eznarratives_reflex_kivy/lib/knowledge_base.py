@@ -0,0 +1,394 @@
+import os
+import time
+import asyncio
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from lib.openai_client import generate_embeddings, generate_embeddings_batch, MODELS
+from lib.chunker import CHUNKER_VERSION, chunk_guideline_pages, chunk_protocols
+from lib.knowledge_ingest import (
+    KB_INGEST_BATCH_SIZE,
+    KB_INGEST_CONCURRENCY,
+    content_hash,
+    embed_chunks
+)
+from lib.json_stream import iter_json_items
+from lib.chunk_store import ChunkStore, ChunkStoreWriter
+from lib.outbox import get_outbox_dir
+
+# Knowledge base settings
+KNOWLEDGE_BASE_DIR = os.getenv(
+    "KNOWLEDGE_BASE_DIR",
+    os.path.join(os.path.dirname(__file__), "..", "..", "src", "data", "knowledge-base")
+)
+KNOWLEDGE_BASE_TOP_K = int(os.getenv("KNOWLEDGE_BASE_TOP_K", "4"))
+# text-embedding-3 cosine scores run lower than ada-002's, so the 0.7 used by
+# match_embeddings would filter out nearly everything here
+KNOWLEDGE_BASE_MIN_SIMILARITY = float(os.getenv("KNOWLEDGE_BASE_MIN_SIMILARITY", "0.3"))
+# Seconds to wait before retrying a failed index build, doubled per failure
+KB_INDEX_RETRY_DELAY = float(os.getenv("KB_INDEX_RETRY_DELAY", "30"))
+KB_INDEX_MAX_RETRY_DELAY = float(os.getenv("KB_INDEX_MAX_RETRY_DELAY", "600"))
+
+# Knowledge base files, their source identifiers (same as
+# db-scripts/initialize-knowledge-base.js) and chunkers. ems_guidelines_chunks.json
+# holds the same pages as ems_guidelines.json cut at fixed lengths, so the
+# guidelines are chunked from the page file instead; the source identifier
+# is kept so existing source filters still match.
+KNOWLEDGE_BASE_FILES = [
+    ("ems_guidelines.json", "national-ems-guidelines-chunks", "guidelines"),
+    ("South_FL_Regional_ems_protocols.json", "south-fl-regional-protocols", "protocols")
+]
+
+# Where the entries of each file format are, in json_stream prefix notation,
+# and the chunker for them
+CHUNKERS = {
+    "guidelines": ("sections.item", chunk_guideline_pages),
+    "protocols": ("sections.item.protocols.item", chunk_protocols)
+}
+
+# EMS form fields that describe the call, used as the retrieval query
+EMS_QUERY_FIELDS = [
+    "dispatch_reason",
+    "chief_complaint",
+    "patient_presentation",
+    "additional_assessment",
+    "treatment_provided"
+]
+
+def iter_knowledge_base_chunks(directory: str = KNOWLEDGE_BASE_DIR) -> Iterator[Dict[str, Any]]:
+    """Stream the chunks of the knowledge base JSON files.
+
+    The files are parsed incrementally, so only one entry (one page or one
+    protocol) is held in memory at a time, and chunked by lib.chunker.
+
+    Args:
+        directory: Directory containing the knowledge base files
+
+    Returns:
+        Iterator over chunks with content_id, title, content, source and provenance
+    """
+    for filename, source, kind in KNOWLEDGE_BASE_FILES:
+        path = os.path.join(directory, filename)
+        if not os.path.exists(path):
+            print(f"Warning: knowledge base file {path} not found")
+            continue
+
+        prefix, chunker = CHUNKERS[kind]
+        with open(path, "r", encoding="utf-8") as f:
+            yield from chunker(iter_json_items(f, prefix), source, filename)
+
+def load_knowledge_base_chunks(directory: str = KNOWLEDGE_BASE_DIR) -> List[Dict[str, Any]]:
+    """Load the knowledge base JSON files as a flat list of chunks.
+
+    Args:
+        directory: Directory containing the knowledge base files
+
+    Returns:
+        List of chunks with content_id, title, content, source and provenance
+    """
+    return list(iter_knowledge_base_chunks(directory))
+
+def build_ems_query(form_data: Dict[str, Any]) -> str:
+    """Build the retrieval query for an EMS call from its form data."""
+    parts = [str(form_data.get(field) or "").strip() for field in EMS_QUERY_FIELDS]
+    abnormal_vitals = form_data.get("selected_abnormal_vitals") or []
+    if abnormal_vitals:
+        parts.append("Abnormal vitals: " + ", ".join(abnormal_vitals))
+    return "\n".join(part for part in parts if part)
+
+def _copy_unchanged(
+    chunks: Iterator[Dict[str, Any]],
+    writer: ChunkStoreWriter,
+    previous: Optional[ChunkStore],
+    rows: Dict[str, int],
+    limit: int
+) -> List[Dict[str, Any]]:
+    """Copy chunks whose embedding is already stored into a new store.
+
+    Reads from ``chunks`` until ``limit`` chunks need embedding or the
+    chunks run out, and returns those chunks.
+    """
+    pending: List[Dict[str, Any]] = []
+    for chunk in chunks:
+        chunk_hash = content_hash(chunk)
+        row = rows.get(chunk_hash)
+        if row is not None:
+            writer.add(chunk, chunk_hash, previous.vectors[row])
+            continue
+        pending.append(chunk)
+        if len(pending) >= limit:
+            break
+    return pending
+
+class KnowledgeIndex:
+    """Exact cosine-similarity search over an embedding matrix.
+
+    Embeddings are L2-normalized once when the index is built, so scoring a
+    query is a single matrix-vector product.
+    """
+
+    def __init__(self, chunks: Sequence[Dict[str, Any]], embeddings: Any):
+        matrix = np.asarray(embeddings, dtype=np.float32).reshape(len(chunks), -1)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+
+        self.chunks = chunks
+        self.matrix = matrix / norms
+        self._source_names = sorted({chunk["source"] for chunk in chunks})
+        self._source_ids = np.array(
+            [self._source_names.index(chunk["source"]) for chunk in chunks], dtype=np.uint16
+        )
+
+    @classmethod
+    def from_store(cls, store: ChunkStore) -> "KnowledgeIndex":
+        """Search a chunk store in place.
+
+        The store's vectors are already normalized, so its memory-mapped
+        matrix is used without a copy and chunks are decoded on demand.
+        """
+        index = cls.__new__(cls)
+        index.chunks = store
+        index.matrix = store.vectors
+        index._source_names = store.sources
+        index._source_ids = store.source_ids
+        return index
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def search(
+        self,
+        query_embedding: Any,
+        top_k: int = KNOWLEDGE_BASE_TOP_K,
+        sources: Optional[Iterable[str]] = None,
+        min_similarity: float = KNOWLEDGE_BASE_MIN_SIMILARITY
+    ) -> List[Tuple[Dict[str, Any], float]]:
+        """Find the chunks most similar to a query embedding.
+
+        Args:
+            query_embedding: Embedding of the query
+            top_k: Maximum number of results
+            sources: Only search chunks from these sources
+            min_similarity: Minimum cosine similarity of a result
+
+        Returns:
+            List of (chunk, similarity), most similar first
+        """
+        if not self.chunks or top_k <= 0:
+            return []
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return []
+
+        scores = self.matrix @ (query / norm)
+        if sources is not None:
+            wanted = set(sources)
+            allowed = [i for i, name in enumerate(self._source_names) if name in wanted]
+            scores = np.where(np.isin(self._source_ids, allowed), scores, -np.inf)
+
+        # Partial sort: only the top k scores are ordered
+        k = min(top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.chunks[i], float(scores[i])) for i in top if scores[i] >= min_similarity]
+
+class KnowledgeBase:
+    """Retrieval service over the local knowledge base files.
+
+    The index is kept in a memory-mapped chunk store next to the offline
+    outbox. It is built when the app starts (see start()) or ahead of time
+    with ``python -m lib.knowledge_base``, never while a request waits: until
+    it is ready, searches return no results. A restart with unchanged
+    knowledge base files opens the store without parsing them; when the
+    files change, they are streamed and only chunks whose text, chunker
+    version or embedding model changed are embedded again. Only the query
+    is embedded per request.
+    """
+
+    def __init__(self, directory: str = KNOWLEDGE_BASE_DIR, index_path: Optional[str] = None):
+        self.directory = directory
+        self.index_path = index_path
+        self._index: Optional[KnowledgeIndex] = None
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._failures = 0
+        self._retry_at = 0.0
+
+    def start(self):
+        """Build the index in the background.
+
+        Does nothing if the index is built or being built, or while waiting
+        to retry a failed build.
+        """
+        if self._index is not None or (self._task is not None and not self._task.done()):
+            return
+        if time.monotonic() < self._retry_at:
+            return
+        self._task = asyncio.ensure_future(self._build_in_background())
+
+    async def build_index(self) -> KnowledgeIndex:
+        """Open or build the index and wait for it.
+
+        A failure is remembered, and start() will not try again until the
+        retry delay has passed.
+        """
+        async with self._lock:
+            if self._index is None:
+                try:
+                    self._index = await self._build_index()
+                except Exception:
+                    self._failures += 1
+                    delay = min(KB_INDEX_RETRY_DELAY * 2 ** (self._failures - 1), KB_INDEX_MAX_RETRY_DELAY)
+                    self._retry_at = time.monotonic() + delay
+                    raise
+                self._failures = 0
+                self._retry_at = 0.0
+        return self._index
+
+    async def close(self):
+        """Stop a background build that is still running."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _build_in_background(self):
+        """Build the index, logging instead of raising on failure."""
+        try:
+            await self.build_index()
+        except Exception as e:
+            print(f"Error building knowledge base index: {e}")
+
+    async def search(
+        self,
+        query: str,
+        top_k: int = KNOWLEDGE_BASE_TOP_K,
+        sources: Optional[Iterable[str]] = None,
+        user_id: Optional[str] = None
+    ) -> List[Tuple[Dict[str, Any], float]]:
+        """Find the chunks most relevant to a text query.
+
+        Args:
+            query: Text to search for
+            top_k: Maximum number of results
+            sources: Only search chunks from these sources
+            user_id: User the query embedding is made for, used for fair admission
+
+        Returns:
+            List of (chunk, similarity), most similar first
+        """
+        if not query.strip():
+            return []
+        index = self._index
+        if index is None:
+            self.start()
+            return []
+        embedding = await generate_embeddings(query, user_id=user_id)
+        return index.search(embedding, top_k, sources)
+
+    async def retrieve_snippets(
+        self,
+        query: str,
+        top_k: int = KNOWLEDGE_BASE_TOP_K,
+        sources: Optional[Iterable[str]] = None,
+        user_id: Optional[str] = None
+    ) -> List[str]:
+        """Get context snippets for a narrative prompt.
+
+        Retrieval is best effort: on failure no snippets are returned so
+        generation can go ahead without them.
+
+        Returns:
+            List of snippets, most relevant first
+        """
+        try:
+            results = await self.search(query, top_k, sources, user_id)
+        except Exception as e:
+            print(f"Error retrieving knowledge base context: {e}")
+            return []
+        return [f"{chunk['title']}\n{chunk['content']}" for chunk, _ in results]
+
+    async def _build_index(self) -> KnowledgeIndex:
+        """Open the chunk store, rebuilding it if the knowledge base changed.
+
+        Reading, chunking and hashing the files run in a worker thread; only
+        the embedding requests run on the event loop.
+        """
+        path = self.index_path or os.path.join(get_outbox_dir(), "knowledge_index.kbstore")
+        signature = self._signature()
+
+        previous = await asyncio.to_thread(self._open_store, path)
+        if previous is not None and previous.metadata.get("signature") == signature:
+            return KnowledgeIndex.from_store(previous)
+
+        writer = ChunkStoreWriter(path, {"signature": signature})
+        chunks = iter_knowledge_base_chunks(self.directory)
+        embedded = 0
+
+        async def store_batch(batch: List[Dict[str, Any]], embeddings: List[List[float]]):
+            for chunk, embedding in zip(batch, embeddings):
+                writer.add(chunk, content_hash(chunk), embedding)
+
+        start = time.monotonic()
+        try:
+            rows = await asyncio.to_thread(previous.hash_rows) if previous is not None else {}
+            while True:
+                # Embed as we go so pending chunks stay bounded
+                pending = await asyncio.to_thread(
+                    _copy_unchanged, chunks, writer, previous, rows, KB_INGEST_BATCH_SIZE * KB_INGEST_CONCURRENCY
+                )
+                if not pending:
+                    break
+                await embed_chunks(pending, on_batch=store_batch, embed=generate_embeddings_batch)
+                embedded += len(pending)
+            await asyncio.to_thread(writer.close)
+        except BaseException:
+            # Also on cancellation, so no temporary file is left behind
+            writer.abort()
+            raise
+        finally:
+            if previous is not None:
+                previous.close()
+
+        if embedded:
+            print(f"Embedded {embedded} knowledge base chunks in {time.monotonic() - start:.1f}s")
+        return KnowledgeIndex.from_store(ChunkStore(path))
+
+    def _signature(self) -> str:
+        """Describe the knowledge base files and embedding settings.
+
+        A matching signature lets a restart skip reading the files; file
+        sizes and modification times stand in for their contents.
+        """
+        parts = [CHUNKER_VERSION, MODELS["EMBEDDING"]]
+        for filename, _, _ in KNOWLEDGE_BASE_FILES:
+            try:
+                stat = os.stat(os.path.join(self.directory, filename))
+                parts.append(f"{filename}:{stat.st_size}:{stat.st_mtime_ns}")
+            except OSError:
+                parts.append(f"{filename}:missing")
+        return "\n".join(parts)
+
+    def _open_store(self, path: str) -> Optional[ChunkStore]:
+        """Open an existing chunk store, or None if missing or unreadable."""
+        if not os.path.exists(path):
+            return None
+        try:
+            return ChunkStore(path)
+        except Exception as e:
+            print(f"Error loading knowledge base index: {e}")
+            return None
+
+# Shared knowledge base for the whole worker
+knowledge_base = KnowledgeBase()
+
+if __name__ == "__main__":
+    # Build the index ahead of time, e.g. as a deployment step
+    index = asyncio.run(knowledge_base.build_index())
+    print(f"Knowledge base index has {len(index)} chunks")
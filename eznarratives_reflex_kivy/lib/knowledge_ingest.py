@@ -0,0 +1,323 @@
+import os
+import sys
+import json
+import time
+import struct
+import asyncio
+import hashlib
+import sqlite3
+import threading
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from lib.openai_client import generate_embeddings_batch, MODELS
+from lib.llm_limiter import estimate_tokens
+from lib.outbox import get_outbox_dir
+from lib.chunker import CHUNKER_VERSION
+
+# Ingestion settings. The embeddings API accepts up to 2048 inputs and about
+# 300k tokens per request; batches stay well below both.
+KB_INGEST_BATCH_TOKENS = int(os.getenv("KB_INGEST_BATCH_TOKENS", "100000"))
+KB_INGEST_BATCH_SIZE = int(os.getenv("KB_INGEST_BATCH_SIZE", "256"))
+KB_INGEST_CONCURRENCY = int(os.getenv("KB_INGEST_CONCURRENCY", "4"))
+
+Chunk = Dict[str, Any]
+Embedding = List[float]
+
+def content_hash(chunk: Chunk) -> str:
+    """Hash what a chunk's embedding depends on: its text, the chunker version and the model."""
+    payload = f"{CHUNKER_VERSION}\n{MODELS['EMBEDDING']}\n{chunk['content']}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def batch_by_tokens(
+    chunks: List[Chunk],
+    max_tokens: int = KB_INGEST_BATCH_TOKENS,
+    max_inputs: int = KB_INGEST_BATCH_SIZE
+) -> List[List[Chunk]]:
+    """Group chunks into embedding requests bounded by tokens and input count."""
+    batches: List[List[Chunk]] = []
+    batch: List[Chunk] = []
+    tokens = 0
+    for chunk in chunks:
+        cost = estimate_tokens(text=chunk["content"])
+        if batch and (tokens + cost > max_tokens or len(batch) >= max_inputs):
+            batches.append(batch)
+            batch, tokens = [], 0
+        batch.append(chunk)
+        tokens += cost
+    if batch:
+        batches.append(batch)
+    return batches
+
+async def embed_chunks(
+    chunks: List[Chunk],
+    concurrency: int = KB_INGEST_CONCURRENCY,
+    on_batch: Optional[Callable[[List[Chunk], List[Embedding]], Awaitable[None]]] = None,
+    embed: Optional[Callable[[List[str]], Awaitable[List[Embedding]]]] = None
+) -> List[Embedding]:
+    """Embed chunks with several token-bounded batches in flight.
+
+    Every batch is attempted even if another one fails, so completed work
+    can be checkpointed; the first error is raised at the end.
+
+    Args:
+        chunks: Chunks to embed
+        concurrency: Maximum batches in flight
+        on_batch: Awaited with each batch and its embeddings as it completes
+        embed: Batch embedding function (defaults to generate_embeddings_batch)
+
+    Returns:
+        Embeddings in the same order as the chunks
+    """
+    embed = embed or generate_embeddings_batch
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(batch: List[Chunk]) -> List[Embedding]:
+        async with semaphore:
+            embeddings = await embed([chunk["content"] for chunk in batch])
+            if on_batch is not None:
+                await on_batch(batch, embeddings)
+            return embeddings
+
+    results = await asyncio.gather(
+        *[run(batch) for batch in batch_by_tokens(chunks)],
+        return_exceptions=True
+    )
+
+    embeddings: List[Embedding] = []
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+        embeddings.extend(result)
+    return embeddings
+
+class IngestCheckpoint:
+    """Records which chunks an interrupted ingestion already stored."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS ingested (content_id TEXT PRIMARY KEY, content_hash TEXT NOT NULL)"
+        )
+
+    def completed(self) -> Dict[str, str]:
+        """Get the content hash of every stored chunk by content id."""
+        with self._lock:
+            return dict(self._conn.execute("SELECT content_id, content_hash FROM ingested").fetchall())
+
+    def mark(self, chunks: List[Chunk]):
+        """Record chunks as stored."""
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO ingested (content_id, content_hash) VALUES (?, ?)",
+                [(chunk["content_id"], content_hash(chunk)) for chunk in chunks]
+            )
+
+    def clear(self):
+        """Forget all progress."""
+        with self._lock:
+            self._conn.execute("DELETE FROM ingested")
+
+    def close(self):
+        """Close the database."""
+        with self._lock:
+            self._conn.close()
+
+def _encode_vector(values: List[float]) -> bytes:
+    """Encode a pgvector value in its binary wire format."""
+    return struct.pack(f">HH{len(values)}f", len(values), 0, *values)
+
+def _decode_vector(data: bytes) -> List[float]:
+    """Decode a pgvector value from its binary wire format."""
+    dimensions, _ = struct.unpack_from(">HH", data)
+    return list(struct.unpack_from(f">{dimensions}f", data, 4))
+
+async def _register_vector_codec(conn: Any):
+    """Let asyncpg send pgvector values, which binary COPY requires."""
+    schema = await conn.fetchval(
+        "SELECT n.nspname FROM pg_type t JOIN pg_namespace n ON n.oid = t.typnamespace WHERE t.typname = 'vector'"
+    )
+    await conn.set_type_codec(
+        "vector", schema=schema or "public", encoder=_encode_vector, decoder=_decode_vector, format="binary"
+    )
+
+async def copy_embeddings(chunks: List[Chunk], embeddings: List[Embedding]):
+    """Bulk-load a batch into knowledge_base_embeddings with COPY.
+
+    Existing rows with the same content ids are replaced in the same
+    transaction, so a batch that is written twice (e.g. after a crash
+    before its checkpoint) does not leave duplicates.
+    """
+    from lib.supabase import async_pg_connection
+
+    async with async_pg_connection() as conn:
+        await _register_vector_codec(conn)
+        async with conn.transaction():
+            await conn.execute(
+                "DELETE FROM knowledge_base_embeddings WHERE content_id = ANY($1::text[])",
+                [chunk["content_id"] for chunk in chunks]
+            )
+            await conn.copy_records_to_table(
+                "knowledge_base_embeddings",
+                records=[
+                    (
+                        chunk["content_id"], chunk["title"], chunk["content"], embedding, chunk["source"],
+                        content_hash(chunk), json.dumps(chunk.get("provenance") or {})
+                    )
+                    for chunk, embedding in zip(chunks, embeddings)
+                ],
+                columns=["content_id", "title", "content", "embedding", "source", "content_hash", "provenance"]
+            )
+
+async def fetch_content_hashes(sources: List[str]) -> Dict[str, Optional[str]]:
+    """Get the stored content hash of every chunk of the given sources.
+
+    Content ids stored more than once map to None so they are rewritten.
+    """
+    from lib.supabase import async_pg_connection
+
+    async with async_pg_connection() as conn:
+        rows = await conn.fetch(
+            "SELECT content_id, content_hash FROM knowledge_base_embeddings WHERE source = ANY($1::text[])",
+            sources
+        )
+
+    hashes: Dict[str, Optional[str]] = {}
+    for row in rows:
+        hashes[row["content_id"]] = None if row["content_id"] in hashes else row["content_hash"]
+    return hashes
+
+async def delete_embeddings(content_ids: List[str]):
+    """Delete the rows of chunks that no longer exist."""
+    if not content_ids:
+        return
+    from lib.supabase import async_pg_connection
+
+    async with async_pg_connection() as conn:
+        await conn.execute(
+            "DELETE FROM knowledge_base_embeddings WHERE content_id = ANY($1::text[])",
+            content_ids
+        )
+
+async def ingest_knowledge_base(
+    chunks: List[Chunk],
+    checkpoint_path: Optional[str] = None,
+    concurrency: int = KB_INGEST_CONCURRENCY,
+    writer: Optional[Callable[[List[Chunk], List[Embedding]], Awaitable[None]]] = None,
+    reset: bool = False,
+    embed: Optional[Callable[[List[str]], Awaitable[List[Embedding]]]] = None
+) -> Dict[str, Any]:
+    """Embed chunks and bulk-load them into knowledge_base_embeddings.
+
+    Progress is checkpointed after every stored batch. Running again after
+    an interruption skips chunks that were already stored (unless their text
+    changed); the checkpoint is cleared once a run completes.
+
+    Args:
+        chunks: Chunks to ingest
+        checkpoint_path: Checkpoint database (defaults to the offline cache directory)
+        concurrency: Maximum embedding batches in flight
+        writer: Batch writer (defaults to copy_embeddings)
+        reset: Ignore any previous checkpoint
+        embed: Batch embedding function (defaults to generate_embeddings_batch)
+
+    Returns:
+        Ingestion statistics
+    """
+    writer = writer or copy_embeddings
+    checkpoint = IngestCheckpoint(
+        checkpoint_path or os.path.join(get_outbox_dir(), "knowledge_ingest_checkpoint.sqlite3")
+    )
+    try:
+        if reset:
+            checkpoint.clear()
+        completed = checkpoint.completed()
+        pending = [chunk for chunk in chunks if completed.get(chunk["content_id"]) != content_hash(chunk)]
+        stats = {
+            "chunks": len(chunks),
+            "skipped": len(chunks) - len(pending),
+            "embedded": 0,
+            "batches": 0
+        }
+
+        async def store(batch: List[Chunk], embeddings: List[Embedding]):
+            await writer(batch, embeddings)
+            checkpoint.mark(batch)
+            stats["embedded"] += len(batch)
+            stats["batches"] += 1
+
+        start = time.monotonic()
+        await embed_chunks(pending, concurrency, store, embed)
+        stats["elapsed"] = round(time.monotonic() - start, 3)
+
+        checkpoint.clear()
+        return stats
+    finally:
+        checkpoint.close()
+
+async def reindex_knowledge_base(
+    chunks: List[Chunk],
+    concurrency: int = KB_INGEST_CONCURRENCY,
+    embed: Optional[Callable[[List[str]], Awaitable[List[Embedding]]]] = None
+) -> Dict[str, Any]:
+    """Bring knowledge_base_embeddings in line with the current chunks.
+
+    Only chunks whose content hash differs from the stored one (new or
+    changed text, a new chunker version or embedding model) are embedded
+    and rewritten. Stored chunks of the same sources that no longer exist
+    are deleted. Each batch stores its hashes as it is written, so an
+    interrupted run picks up where it stopped.
+
+    Args:
+        chunks: Current chunks of the sources to re-index
+        concurrency: Maximum embedding batches in flight
+        embed: Batch embedding function (defaults to generate_embeddings_batch)
+
+    Returns:
+        Re-indexing statistics
+    """
+    sources = sorted({chunk["source"] for chunk in chunks})
+    stored = await fetch_content_hashes(sources)
+
+    changed = [chunk for chunk in chunks if stored.get(chunk["content_id"]) != content_hash(chunk)]
+    current_ids = {chunk["content_id"] for chunk in chunks}
+    removed = [content_id for content_id in stored if content_id not in current_ids]
+
+    start = time.monotonic()
+    await embed_chunks(changed, concurrency, copy_embeddings, embed)
+    await delete_embeddings(removed)
+
+    return {
+        "chunks": len(chunks),
+        "unchanged": len(chunks) - len(changed),
+        "embedded": len(changed),
+        "deleted": len(removed),
+        "elapsed": round(time.monotonic() - start, 3)
+    }
+
+async def main():
+    """Update knowledge_base_embeddings from the knowledge base files.
+
+    By default only new and changed chunks are embedded; pass --full to
+    re-embed everything through the checkpointed bulk load.
+    """
+    from lib.knowledge_base import load_knowledge_base_chunks
+
+    chunks = load_knowledge_base_chunks()
+    try:
+        if "--full" in sys.argv:
+            stats = await ingest_knowledge_base(chunks, reset="--reset" in sys.argv)
+            print(f"Ingested {stats['embedded']} chunks in {stats['batches']} batches "
+                  f"({stats['skipped']} already stored) in {stats['elapsed']}s")
+        else:
+            stats = await reindex_knowledge_base(chunks)
+            print(f"Re-indexed {stats['embedded']} changed chunks, deleted {stats['deleted']}, "
+                  f"{stats['unchanged']} unchanged in {stats['elapsed']}s")
+    except Exception as e:
+        print(f"Error ingesting knowledge base (run again to resume): {e}")
+        raise
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,283 @@
+import os
+import time
+import asyncio
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+
+# Admission settings (per worker). Set the rate limits to this worker's share
+# of the organization's OpenAI RPM/TPM limits; 0 disables a limit.
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "16"))
+OPENAI_REQUESTS_PER_MINUTE = int(os.getenv("OPENAI_REQUESTS_PER_MINUTE", "500"))
+OPENAI_TOKENS_PER_MINUTE = int(os.getenv("OPENAI_TOKENS_PER_MINUTE", "200000"))
+OPENAI_ADMISSION_TIMEOUT = float(os.getenv("OPENAI_ADMISSION_TIMEOUT", "120"))
+
+# Key used for calls that are not tied to a user
+ANONYMOUS_USER = "anonymous"
+
+def estimate_tokens(messages: Optional[List[Dict[str, str]]] = None, max_tokens: int = 0, text: str = "") -> int:
+    """Roughly estimate the tokens a request will use.
+
+    Uses ~4 characters per token for the prompt plus the completion limit,
+    which is what OpenAI counts against the TPM limit up front.
+    """
+    chars = len(text)
+    for message in messages or []:
+        chars += len(message.get("content") or "")
+    return chars // 4 + max_tokens + 1
+
+class AdmissionTimeout(Exception):
+    """Raised when a call waited longer than the admission timeout."""
+
+class TokenBucket:
+    """Token bucket refilled continuously at ``per_minute / 60`` per second."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = float(per_minute)
+        self._updated = time.monotonic()
+
+    @property
+    def enabled(self) -> bool:
+        """Whether this bucket enforces a limit."""
+        return self.capacity > 0
+
+    def refill(self):
+        """Add the tokens accrued since the last refill."""
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def time_until(self, amount: float) -> float:
+        """Seconds until ``amount`` tokens are available (0 if available now)."""
+        if not self.enabled:
+            return 0.0
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def consume(self, amount: float):
+        """Take tokens; the level may go negative when settling actual usage."""
+        if self.enabled:
+            self.level -= min(amount, self.capacity)
+
+class _Waiter:
+    """A queued admission request."""
+
+    __slots__ = ("future", "tokens", "enqueued_at")
+
+    def __init__(self, future: asyncio.Future, tokens: int):
+        self.future = future
+        self.tokens = tokens
+        self.enqueued_at = time.monotonic()
+
+class Permit:
+    """An admitted call. Release it when the call finishes."""
+
+    def __init__(self, controller: "AdmissionController", tokens: int):
+        self._controller = controller
+        self.tokens = tokens
+        self.released = False
+
+    def settle(self, actual_tokens: Optional[int]):
+        """Correct the token budget with the usage reported by the API."""
+        if actual_tokens is None:
+            return
+        self._controller._settle(actual_tokens - self.tokens)
+        self.tokens = actual_tokens
+
+    def release(self):
+        """Free the concurrency slot."""
+        if not self.released:
+            self.released = True
+            self._controller._release()
+
+class AdmissionController:
+    """Async admission control in front of OpenAI calls.
+
+    Bounds the number of calls in flight, spends request and token budgets
+    from per-minute token buckets, and serves waiting users round-robin so
+    one user's burst cannot starve everyone else.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = OPENAI_MAX_CONCURRENCY,
+        requests_per_minute: int = OPENAI_REQUESTS_PER_MINUTE,
+        tokens_per_minute: int = OPENAI_TOKENS_PER_MINUTE,
+        timeout: float = OPENAI_ADMISSION_TIMEOUT
+    ):
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self._requests = TokenBucket(requests_per_minute)
+        self._tokens = TokenBucket(tokens_per_minute)
+
+        self._queues: "OrderedDict[str, deque[_Waiter]]" = OrderedDict()
+        self._in_flight = 0
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+
+        self.admitted = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @asynccontextmanager
+    async def admit(self, user_id: Optional[str] = None, tokens: int = 1, timeout: Optional[float] = None):
+        """Wait for admission for the duration of an ``async with`` block."""
+        permit = await self.acquire(user_id, tokens, timeout)
+        try:
+            yield permit
+        finally:
+            permit.release()
+
+    async def acquire(self, user_id: Optional[str] = None, tokens: int = 1, timeout: Optional[float] = None) -> Permit:
+        """Wait for a concurrency slot and enough request/token budget.
+
+        Args:
+            user_id: User the call is made for; waiting users are served in turn
+            tokens: Estimated tokens for the call
+            timeout: Maximum seconds to wait (defaults to the controller timeout)
+
+        Returns:
+            A permit that must be released when the call finishes
+        """
+        key = user_id or ANONYMOUS_USER
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), tokens)
+        self._queues.setdefault(key, deque()).append(waiter)
+        self._dispatch()
+
+        try:
+            return await asyncio.wait_for(
+                asyncio.shield(waiter.future),
+                self.timeout if timeout is None else timeout
+            )
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Admitted just as we gave up; hand the slot back
+                waiter.future.result().release()
+            else:
+                waiter.future.cancel()
+                self._remove(key, waiter)
+                # The waiter may have been holding up the head of the line
+                self._dispatch()
+            if isinstance(e, asyncio.TimeoutError):
+                self.timeouts += 1
+                raise AdmissionTimeout(f"Not admitted within {self.timeout if timeout is None else timeout}s")
+            raise
+
+    def try_acquire(self, user_id: Optional[str] = None, tokens: int = 1) -> Optional[Permit]:
+        """Admit a call only if it can run right now without queuing.
+
+        Used for optional extra work (e.g. hedged requests) that should never
+        wait behind, or take capacity from, queued calls.
+
+        Returns:
+            A permit, or None if there is no spare capacity
+        """
+        if self._queues or self._in_flight >= self.max_concurrency:
+            return None
+
+        self._requests.refill()
+        self._tokens.refill()
+        if self._requests.time_until(1) > 0 or self._tokens.time_until(tokens) > 0:
+            return None
+
+        self._requests.consume(1)
+        self._tokens.consume(tokens)
+        self._in_flight += 1
+        self.admitted += 1
+        return Permit(self, tokens)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get queue depth, wait-time and budget metrics."""
+        self._requests.refill()
+        self._tokens.refill()
+        avg = self.total_wait / self.admitted if self.admitted else 0.0
+        return {
+            "in_flight": self._in_flight,
+            "max_concurrency": self.max_concurrency,
+            "queue_depth": sum(len(queue) for queue in self._queues.values()),
+            "waiting_users": len(self._queues),
+            "admitted": self.admitted,
+            "timeouts": self.timeouts,
+            "avg_wait_ms": round(avg * 1000, 3),
+            "max_wait_ms": round(self.max_wait * 1000, 3),
+            "requests_available": round(self._requests.level, 1) if self._requests.enabled else None,
+            "tokens_available": round(self._tokens.level, 1) if self._tokens.enabled else None
+        }
+
+    def _dispatch(self):
+        """Admit waiters while slots and budget allow, one user at a time."""
+        while self._queues and self._in_flight < self.max_concurrency:
+            key, queue = next(iter(self._queues.items()))
+            waiter = queue[0]
+            if waiter.future.done():
+                self._remove(key, waiter)
+                continue
+
+            self._requests.refill()
+            self._tokens.refill()
+            delay = max(self._requests.time_until(1), self._tokens.time_until(waiter.tokens))
+            if delay > 0:
+                self._schedule_wakeup(delay)
+                return
+
+            queue.popleft()
+            if queue:
+                # Round-robin: this user goes to the back of the line
+                self._queues.move_to_end(key)
+            else:
+                del self._queues[key]
+
+            self._requests.consume(1)
+            self._tokens.consume(waiter.tokens)
+            self._in_flight += 1
+
+            waited = time.monotonic() - waiter.enqueued_at
+            self.admitted += 1
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+            waiter.future.set_result(Permit(self, waiter.tokens))
+
+    def _schedule_wakeup(self, delay: float):
+        """Retry dispatching once the budget has refilled."""
+        if self._wakeup is not None:
+            return
+        loop = asyncio.get_running_loop()
+
+        def wakeup():
+            self._wakeup = None
+            self._dispatch()
+
+        self._wakeup = loop.call_later(delay, wakeup)
+
+    def _remove(self, key: str, waiter: _Waiter):
+        """Drop a waiter that gave up."""
+        queue = self._queues.get(key)
+        if queue is None:
+            return
+        try:
+            queue.remove(waiter)
+        except ValueError:
+            pass
+        if not queue:
+            del self._queues[key]
+
+    def _release(self):
+        """Free a slot and admit the next waiter."""
+        self._in_flight -= 1
+        self._dispatch()
+
+    def _settle(self, difference: int):
+        """Charge (or refund) the difference between estimated and actual tokens."""
+        if not self._tokens.enabled:
+            return
+        self._tokens.refill()
+        self._tokens.level = min(self._tokens.capacity, self._tokens.level - difference)
+        if difference < 0:
+            self._dispatch()
+
+# Shared controller for the whole worker
+llm_limiter = AdmissionController()
@@ -0,0 +1,260 @@
+import os
+import time
+import random
+import asyncio
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+import openai
+
+# Retry settings
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "3"))
+OPENAI_RETRY_BASE_DELAY = float(os.getenv("OPENAI_RETRY_BASE_DELAY", "0.5"))
+OPENAI_RETRY_MAX_DELAY = float(os.getenv("OPENAI_RETRY_MAX_DELAY", "20"))
+
+# Retries may add at most RATIO extra calls per call made in the last
+# WINDOW seconds, plus a small floor so a quiet worker can still retry.
+OPENAI_RETRY_BUDGET_RATIO = float(os.getenv("OPENAI_RETRY_BUDGET_RATIO", "0.2"))
+OPENAI_RETRY_BUDGET_MIN = int(os.getenv("OPENAI_RETRY_BUDGET_MIN", "5"))
+OPENAI_RETRY_BUDGET_WINDOW = float(os.getenv("OPENAI_RETRY_BUDGET_WINDOW", "10"))
+
+# Circuit breaker settings
+OPENAI_BREAKER_THRESHOLD = int(os.getenv("OPENAI_BREAKER_THRESHOLD", "5"))
+OPENAI_BREAKER_RECOVERY = float(os.getenv("OPENAI_BREAKER_RECOVERY", "30"))
+
+# HTTP statuses that indicate a transient provider problem
+RETRYABLE_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+# Retryable statuses that mean the provider is up but pushing back (rate
+# limits, conflicts); they call for a backoff, not for opening the circuit
+BACKOFF_STATUSES = {409, 429}
+
+T = TypeVar("T")
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the provider while the circuit is open."""
+
+def is_retryable(error: Exception) -> bool:
+    """Check if an OpenAI error is transient and worth retrying."""
+    if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        # An exhausted quota is a 429 too, but waiting will not fix it
+        if getattr(error, "code", None) == "insufficient_quota":
+            return False
+        return error.status_code in RETRYABLE_STATUSES
+    return False
+
+def is_provider_failure(error: Exception) -> bool:
+    """Check if a retryable error is a sign of provider degradation.
+
+    Only timeouts, connection errors and 5xx responses count toward the
+    circuit breaker; a run of 429s must not open it.
+    """
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code not in BACKOFF_STATUSES
+    return isinstance(error, (openai.APIConnectionError, openai.APITimeoutError))
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Get the server-requested delay in seconds from a failed response."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class RetryBudget:
+    """Caps retries to a fraction of recent calls so they cannot amplify an outage."""
+
+    def __init__(
+        self,
+        ratio: float = OPENAI_RETRY_BUDGET_RATIO,
+        min_retries: int = OPENAI_RETRY_BUDGET_MIN,
+        window: float = OPENAI_RETRY_BUDGET_WINDOW
+    ):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window = window
+        self._calls: "deque[float]" = deque()
+        self._retries: "deque[float]" = deque()
+
+    def record_call(self):
+        """Record a first attempt."""
+        self._calls.append(time.monotonic())
+
+    def try_spend(self) -> bool:
+        """Spend one retry if the budget allows it."""
+        self._expire()
+        allowed = self.min_retries + int(len(self._calls) * self.ratio)
+        if len(self._retries) >= allowed:
+            return False
+        self._retries.append(time.monotonic())
+        return True
+
+    def _expire(self):
+        """Forget calls and retries older than the window."""
+        cutoff = time.monotonic() - self.window
+        for events in (self._calls, self._retries):
+            while events and events[0] < cutoff:
+                events.popleft()
+
+class CircuitBreaker:
+    """Fails fast after repeated transient failures.
+
+    After ``failure_threshold`` consecutive failures the circuit opens and
+    calls fail immediately. After ``recovery_timeout`` seconds one trial call
+    is let through (half-open); success closes the circuit, failure opens it
+    again.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = OPENAI_BREAKER_THRESHOLD,
+        recovery_timeout: float = OPENAI_BREAKER_RECOVERY
+    ):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+
+    def before_call(self):
+        """Raise CircuitOpenError if calls are not allowed right now."""
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.recovery_timeout:
+                raise CircuitOpenError("OpenAI is temporarily unavailable, please try again shortly")
+            self.state = "half_open"
+            self._trial_in_flight = False
+
+        if self.state == "half_open":
+            if self._trial_in_flight:
+                raise CircuitOpenError("OpenAI is temporarily unavailable, please try again shortly")
+            self._trial_in_flight = True
+
+    def abandon(self):
+        """Give up a call without an outcome (e.g. cancelled)."""
+        self._trial_in_flight = False
+
+    def record_success(self):
+        """Close the circuit after a successful call."""
+        self.state = "closed"
+        self.failures = 0
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        """Count a transient failure, opening the circuit at the threshold."""
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+class RetryPolicy:
+    """Retries transient OpenAI failures with backoff, a budget and a breaker."""
+
+    def __init__(
+        self,
+        max_retries: int = OPENAI_MAX_RETRIES,
+        base_delay: float = OPENAI_RETRY_BASE_DELAY,
+        max_delay: float = OPENAI_RETRY_MAX_DELAY,
+        budget: Optional[RetryBudget] = None,
+        breaker: Optional[CircuitBreaker] = None
+    ):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget or RetryBudget()
+        self.breaker = breaker or CircuitBreaker()
+        self.retries = 0
+        self.budget_exhausted = 0
+
+    async def call(self, fn: Callable[[], Awaitable[T]]) -> T:
+        """Call ``fn``, retrying transient failures.
+
+        Args:
+            fn: Coroutine factory making one attempt
+
+        Returns:
+            The result of the first successful attempt
+        """
+        self.budget.record_call()
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            try:
+                result = await fn()
+            except asyncio.CancelledError:
+                self.breaker.abandon()
+                raise
+            except Exception as e:
+                if not is_retryable(e):
+                    if isinstance(e, openai.APIStatusError):
+                        # The provider answered; this is not a sign of degradation
+                        self.breaker.record_success()
+                    else:
+                        self.breaker.abandon()
+                    raise
+
+                if is_provider_failure(e):
+                    self.breaker.record_failure()
+                else:
+                    # Rate limited: back off, but leave the breaker alone
+                    self.breaker.abandon()
+                if attempt >= self.max_retries:
+                    raise
+                server_delay = retry_after(e)
+                if server_delay is not None and server_delay > self.max_delay:
+                    # Retrying before the server asks would only be rejected again
+                    raise
+                if not self.budget.try_spend():
+                    self.budget_exhausted += 1
+                    raise
+
+                attempt += 1
+                self.retries += 1
+                delay = self._delay(attempt, server_delay)
+                print(f"Retrying OpenAI call after {delay:.2f}s (attempt {attempt}/{self.max_retries}): {e}")
+                await asyncio.sleep(delay)
+                continue
+
+            self.breaker.record_success()
+            return result
+
+    def stats(self) -> Dict[str, Any]:
+        """Get retry and circuit breaker metrics."""
+        return {
+            "retries": self.retries,
+            "budget_exhausted": self.budget_exhausted,
+            "circuit_state": self.breaker.state,
+            "consecutive_failures": self.breaker.failures
+        }
+
+    def _delay(self, attempt: int, server_delay: Optional[float]) -> float:
+        """Get the delay before a retry, with full jitter."""
+        if server_delay is not None:
+            return server_delay
+        ceiling = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return random.uniform(0, ceiling)
+
+# Shared policy for the whole worker
+openai_retry = RetryPolicy()
@@ -0,0 +1,156 @@
+import os
+import json
+import time
+import hashlib
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional
+
+# Cache settings
+NARRATIVE_CACHE_BACKEND = os.getenv("NARRATIVE_CACHE_BACKEND", "memory")
+NARRATIVE_CACHE_TTL = int(os.getenv("NARRATIVE_CACHE_TTL", "3600"))
+NARRATIVE_CACHE_MAX_ENTRIES = int(os.getenv("NARRATIVE_CACHE_MAX_ENTRIES", "1000"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+
+# Fields that change on every submission and must not affect the cache key
+VOLATILE_FIELDS = {"timestamp"}
+
+# Multi-select fields whose order carries no meaning
+UNORDERED_FIELDS = {"selected_pertinent_negatives", "selected_abnormal_vitals"}
+
+def _normalize_value(value: Any) -> Any:
+    """Normalize a form value so trivially different inputs hash the same."""
+    if isinstance(value, str):
+        return " ".join(value.split())
+    if isinstance(value, dict):
+        normalized = {}
+        for k, v in value.items():
+            if k in VOLATILE_FIELDS:
+                continue
+            v = _normalize_value(v)
+            # Only known multi-select fields are sorted; other lists keep their order
+            if k in UNORDERED_FIELDS and isinstance(v, list) and all(isinstance(i, str) for i in v):
+                v = sorted(v)
+            normalized[k] = v
+        return normalized
+    if isinstance(value, (list, tuple)):
+        return [_normalize_value(v) for v in value]
+    return value
+
+def make_cache_key(
+    kind: str,
+    form_data: Dict[str, Any],
+    model: str,
+    temperature: float,
+    prompt_version: str,
+    context_snippets: Optional[List[str]] = None
+) -> str:
+    """Build a content-addressed cache key for a narrative request.
+
+    Args:
+        kind: Narrative type ("ems" or "fire")
+        form_data: Form payload sent to the model
+        model: Chat model name
+        temperature: Sampling temperature
+        prompt_version: Version of the system prompt
+        context_snippets: Optional reference snippets included in the prompt
+
+    Returns:
+        Hex digest identifying the request
+    """
+    payload = {
+        "kind": kind,
+        "form_data": _normalize_value(form_data),
+        "model": model,
+        "temperature": temperature,
+        "prompt_version": prompt_version,
+        "context_snippets": list(context_snippets or [])
+    }
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+class MemoryNarrativeCache:
+    """In-process narrative cache with TTL and LRU eviction."""
+
+    def __init__(self, max_entries: int = NARRATIVE_CACHE_MAX_ENTRIES, ttl: int = NARRATIVE_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[str]:
+        """Get a cached narrative, or None if missing or expired."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: str):
+        """Store a narrative, evicting the least recently used entries."""
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def clear(self):
+        """Remove all cached narratives."""
+        self._entries.clear()
+
+class RedisNarrativeCache:
+    """Redis-backed narrative cache shared across workers.
+
+    Entries expire after the TTL. LRU eviction is handled by Redis itself
+    when it is configured with ``maxmemory-policy allkeys-lru``.
+    """
+
+    def __init__(self, url: str = REDIS_URL, ttl: int = NARRATIVE_CACHE_TTL, prefix: str = "narrative:"):
+        from redis import asyncio as redis_asyncio
+
+        self.ttl = ttl
+        self.prefix = prefix
+        self._redis = redis_asyncio.from_url(url, decode_responses=True)
+
+    async def get(self, key: str) -> Optional[str]:
+        """Get a cached narrative, or None if missing or unavailable."""
+        try:
+            return await self._redis.get(self.prefix + key)
+        except Exception as e:
+            print(f"Error reading narrative cache: {e}")
+            return None
+
+    async def set(self, key: str, value: str):
+        """Store a narrative with the configured TTL."""
+        try:
+            await self._redis.set(self.prefix + key, value, ex=self.ttl)
+        except Exception as e:
+            print(f"Error writing narrative cache: {e}")
+
+    async def clear(self):
+        """Remove all cached narratives under this prefix."""
+        try:
+            async for key in self._redis.scan_iter(match=self.prefix + "*"):
+                await self._redis.delete(key)
+        except Exception as e:
+            print(f"Error clearing narrative cache: {e}")
+
+_cache = None
+
+def get_narrative_cache():
+    """Get the configured narrative cache, creating it on first use."""
+    global _cache
+    if _cache is None:
+        if NARRATIVE_CACHE_BACKEND == "redis":
+            try:
+                _cache = RedisNarrativeCache()
+            except ImportError:
+                print("Warning: redis is not installed, falling back to in-memory narrative cache")
+                _cache = MemoryNarrativeCache()
+        else:
+            _cache = MemoryNarrativeCache()
+    return _cache
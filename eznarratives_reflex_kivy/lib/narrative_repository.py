@@ -0,0 +1,262 @@
+import os
+import uuid
+import asyncio
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from lib.outbox import Outbox, OutboxEntry, get_outbox, get_outbox_dir
+
+# Write-behind settings
+NARRATIVE_WRITE_QUEUE_SIZE = int(os.getenv("NARRATIVE_WRITE_QUEUE_SIZE", "200"))
+NARRATIVE_WRITE_BATCH_SIZE = int(os.getenv("NARRATIVE_WRITE_BATCH_SIZE", "50"))
+NARRATIVE_WRITE_INTERVAL = float(os.getenv("NARRATIVE_WRITE_INTERVAL", "0.5"))
+NARRATIVE_ENQUEUE_TIMEOUT = float(os.getenv("NARRATIVE_ENQUEUE_TIMEOUT", "2"))
+
+# Narrative types and their outbox kinds
+NARRATIVE_TYPES = ("ems", "fire")
+
+def _outbox_kind(narrative_type: str) -> str:
+    """Get the outbox kind used for a narrative type."""
+    return f"{narrative_type}_narrative"
+
+async def _default_writer(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Upsert narratives through the bulk Supabase write path."""
+    from lib.supabase import bulk_save_narratives
+    return await bulk_save_narratives(rows, upsert=True, on_conflict="idempotency_key")
+
+class NarrativeRepository:
+    """Write-behind persistence for generated narratives.
+
+    ``save()`` assigns the narrative id and returns immediately; rows are
+    written in the background as bulk upserts. Pending writes are keyed by
+    narrative id, so several saves of the same narrative before a flush
+    become one row. The pending queue is bounded: when it is full, callers
+    wait up to ``enqueue_timeout`` seconds and then spill the write to the
+    durable outbox instead of growing memory. Writes that fail, and writes
+    made while offline, also go to the outbox and are sent by ``replay()``.
+    """
+
+    def __init__(
+        self,
+        writer: Callable[[List[Dict[str, Any]]], Awaitable[List[Dict[str, Any]]]] = _default_writer,
+        outbox: Optional[Outbox] = None,
+        max_pending: int = NARRATIVE_WRITE_QUEUE_SIZE,
+        batch_size: int = NARRATIVE_WRITE_BATCH_SIZE,
+        flush_interval: float = NARRATIVE_WRITE_INTERVAL,
+        enqueue_timeout: float = NARRATIVE_ENQUEUE_TIMEOUT
+    ):
+        self._writer = writer
+        self._outbox = outbox
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+
+        self._pending: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._cond: Optional[asyncio.Condition] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._closing: Optional[asyncio.Event] = None
+        self.written = 0
+        self.spilled = 0
+
+    @property
+    def outbox(self) -> Outbox:
+        """Get the outbox used for offline and failed writes."""
+        if self._outbox is None:
+            self._outbox = get_outbox()
+        return self._outbox
+
+    @property
+    def pending(self) -> int:
+        """Number of narratives waiting to be written."""
+        return len(self._pending)
+
+    async def save(
+        self,
+        narrative_type: str,
+        narrative: Dict[str, Any],
+        user_id: Optional[str] = None,
+        narrative_id: Optional[str] = None,
+        offline: bool = False
+    ) -> str:
+        """Queue a narrative for saving.
+
+        Args:
+            narrative_type: Narrative type ("ems" or "fire")
+            narrative: Narrative fields (content, title, form_data, ...)
+            user_id: Owner of the narrative
+            narrative_id: Id of an existing narrative to update; generated if omitted
+            offline: Write straight to the outbox instead of the pending queue
+
+        Returns:
+            The narrative id
+        """
+        narrative_id = narrative_id or str(uuid.uuid4())
+        row = dict(narrative)
+        row.update({
+            "id": narrative_id,
+            "idempotency_key": narrative_id,
+            "type": narrative_type
+        })
+        if user_id:
+            row["user_id"] = user_id
+
+        if offline:
+            self._spill([row])
+            return narrative_id
+
+        cond = self._get_cond()
+        async with cond:
+            if narrative_id in self._pending:
+                # Coalesce with the write that has not gone out yet
+                self._pending[narrative_id].update(row)
+                return narrative_id
+
+            try:
+                await asyncio.wait_for(
+                    cond.wait_for(lambda: len(self._pending) < self.max_pending),
+                    self.enqueue_timeout
+                )
+            except asyncio.TimeoutError:
+                print("Warning: narrative write queue is full, saving to the outbox")
+                self._spill([row])
+                return narrative_id
+
+            self._pending[narrative_id] = row
+            cond.notify_all()
+
+        self._ensure_worker()
+        return narrative_id
+
+    async def flush(self) -> int:
+        """Write all pending narratives now.
+
+        Returns:
+            Number of narratives written
+        """
+        written = 0
+        while self._pending:
+            written += await self._write_batch()
+        return written
+
+    async def replay(self, user_id: Optional[str] = None) -> int:
+        """Send narratives queued in the outbox.
+
+        Args:
+            user_id: Owner for queued narratives saved without one
+
+        Returns:
+            Number of narratives delivered
+        """
+        outbox = self.outbox
+        sent = 0
+        for narrative_type in NARRATIVE_TYPES:
+            kind = _outbox_kind(narrative_type)
+            # Pick up narratives cached as JSON files by older versions
+            outbox.import_json_files(get_outbox_dir(), f"{kind}_", kind)
+            sent += await outbox.flush(
+                lambda entries: self._send_outbox_batch(narrative_type, entries, user_id),
+                kind=kind
+            )
+        return sent
+
+    async def close(self):
+        """Write what is pending and wait for the background writer to stop.
+
+        Called when the app shuts down. The writer is not cancelled, since
+        that would drop a batch it has taken off the queue but not written.
+        """
+        closing = self._get_closing()
+        closing.set()
+        try:
+            if self._worker is not None:
+                await self._worker
+                self._worker = None
+            await self.flush()
+        finally:
+            closing.clear()
+
+    def _get_cond(self) -> asyncio.Condition:
+        """Get the condition guarding the pending queue."""
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        return self._cond
+
+    def _get_closing(self) -> asyncio.Event:
+        """Get the event that cuts the writer's coalescing delay short."""
+        if self._closing is None:
+            self._closing = asyncio.Event()
+        return self._closing
+
+    def _ensure_worker(self):
+        """Start the background writer if it is not running."""
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.ensure_future(self._run())
+
+    async def _run(self):
+        """Write pending narratives in batches until the queue is empty."""
+        while self._pending:
+            # Give closely spaced saves a chance to coalesce into one batch
+            try:
+                await asyncio.wait_for(self._get_closing().wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            await self._write_batch()
+
+    async def _write_batch(self) -> int:
+        """Write one batch of pending narratives, spilling failures to the outbox."""
+        cond = self._get_cond()
+        async with cond:
+            batch = []
+            while self._pending and len(batch) < self.batch_size:
+                batch.append(self._pending.popitem(last=False)[1])
+            cond.notify_all()
+
+        if not batch:
+            return 0
+
+        try:
+            results = await self._writer(batch)
+        except Exception as e:
+            print(f"Error saving narratives: {e}")
+            results = [{"id": None, "error": str(e)} for _ in batch]
+
+        failed = [row for row, result in zip(batch, results) if result.get("error")]
+        if failed:
+            self._spill(failed)
+
+        written = len(batch) - len(failed)
+        self.written += written
+        return written
+
+    def _spill(self, rows: List[Dict[str, Any]]):
+        """Save rows to the durable outbox for a later replay."""
+        for row in rows:
+            self.outbox.enqueue(_outbox_kind(row["type"]), row, idempotency_key=row["idempotency_key"])
+        self.spilled += len(rows)
+
+    async def _send_outbox_batch(
+        self,
+        narrative_type: str,
+        entries: List[OutboxEntry],
+        user_id: Optional[str] = None
+    ) -> Dict[str, str]:
+        """Send a batch of outbox entries, returning the rejected ones."""
+        rows = []
+        for entry in entries:
+            row = dict(entry.payload)
+            row["idempotency_key"] = entry.idempotency_key
+            row["type"] = narrative_type
+            if "user_id" not in row and user_id:
+                row["user_id"] = user_id
+            rows.append(row)
+
+        results = await self._writer(rows)
+        return {
+            entry.id: result["error"]
+            for entry, result in zip(entries, results)
+            if result.get("error")
+        }
+
+# Shared repository for the whole worker
+narrative_repository = NarrativeRepository()
@@ -1,8 +1,17 @@
 import os
 import json
-from typing import Dict, List, Any, Optional
+import time
+import asyncio
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Any, Optional
+import httpx
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import AsyncOpenAI
+
+from lib.narrative_cache import get_narrative_cache, make_cache_key
+from lib.embedding_cache import get_embedding_cache
+from lib.llm_limiter import Permit, llm_limiter, estimate_tokens
+from lib.llm_retry import openai_retry
 
 # Determine environment and load appropriate .env file
 env = os.getenv("APP_ENV", "development")
@@ -21,8 +30,27 @@ api_key = os.getenv("OPENAI_API_KEY")
 if not api_key:
     raise RuntimeError("OPENAI_API_KEY is missing in environment variables")
 
-# Initialize OpenAI client
-client = OpenAI(api_key=api_key)
+# HTTP transport settings. A single pooled transport is shared by every
+# Reflex session on this worker so concurrent requests reuse keep-alive
+# connections instead of serializing behind one socket.
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "100"))
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "20"))
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "30"))
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+
+http_client = httpx.AsyncClient(
+    limits=httpx.Limits(
+        max_connections=OPENAI_MAX_CONNECTIONS,
+        max_keepalive_connections=OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY
+    ),
+    timeout=httpx.Timeout(OPENAI_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT)
+)
+
+# Initialize OpenAI client. The SDK's built-in retries are disabled because
+# lib/llm_retry.py applies the retry policy, budget and circuit breaker.
+client = AsyncOpenAI(api_key=api_key, http_client=http_client, max_retries=0)
 
 # Models
 MODELS = {
@@ -30,84 +58,643 @@ MODELS = {
     "EMBEDDING": os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small")
 }
 
-async def generate_ems_narrative(form_data: Dict[str, Any], context_snippets: Optional[List[str]] = None) -> str:
-    """Generate an EMS narrative using OpenAI.
-    
-    Args:
-        form_data: Dictionary containing EMS form data
-        context_snippets: Optional list of context snippets from knowledge base
-        
-    Returns:
-        Generated narrative text
-    """
-    system_message = """
+async def close_client():
+    """Close the shared HTTP transport. Call once on worker shutdown."""
+    await client.close()
+
+# System prompts
+EMS_SYSTEM_MESSAGE = """
     You are an EMS narrative assistant. Generate a comprehensive NFIRS-compliant narrative 
     based on the provided run data.
     Use only the reference materials provided to inform your narrative. 
     Do not invent facts or procedures not mentioned in the reference materials.
     Format the narrative professionally and include all relevant details from the run data.
     """
+
+FIRE_SYSTEM_MESSAGE = """
+    You are a Fire narrative assistant. Generate a comprehensive NFIRS-compliant fire incident narrative 
+    based on the provided incident data.
+    Format the narrative professionally and include all relevant details from the incident data.
+    """
+
+# Narrative sampling settings. Bump PROMPT_VERSION whenever the system
+# prompts change so cached narratives from the old prompt are not reused.
+NARRATIVE_TEMPERATURE = 0.7
+PROMPT_VERSION = "2"
+
+# Prompt size budget, in estimated tokens, for the system prompt, run data
+# and reference materials together. Reference snippets are packed into what
+# the run data leaves, most relevant first; the run data is never cut.
+OPENAI_PROMPT_TOKEN_BUDGET = int(os.getenv("OPENAI_PROMPT_TOKEN_BUDGET", "3000"))
+
+# Streaming settings. Deltas are coalesced so the UI receives a state update
+# every STREAM_FLUSH_INTERVAL seconds rather than one per token.
+STREAM_FLUSH_INTERVAL = float(os.getenv("OPENAI_STREAM_FLUSH_INTERVAL", "0.15"))
+
+# Hedging settings (opt-in). A streaming call that has not produced a first
+# token within the PERCENTILE of recent time-to-first-token is raced against
+# a second identical request; DEFAULT_DELAY is used until MIN_SAMPLES calls
+# have been observed.
+OPENAI_HEDGING = os.getenv("OPENAI_HEDGING", "false").lower() == "true"
+OPENAI_HEDGE_PERCENTILE = float(os.getenv("OPENAI_HEDGE_PERCENTILE", "95"))
+OPENAI_HEDGE_WINDOW = int(os.getenv("OPENAI_HEDGE_WINDOW", "200"))
+OPENAI_HEDGE_MIN_SAMPLES = int(os.getenv("OPENAI_HEDGE_MIN_SAMPLES", "20"))
+OPENAI_HEDGE_DEFAULT_DELAY = float(os.getenv("OPENAI_HEDGE_DEFAULT_DELAY", "3"))
+
+class PromptStats:
+    """Tracks the size of the prompts sent for narratives."""
+    
+    def __init__(self):
+        self.requests = 0
+        self.total_tokens = 0
+        self.max_tokens = 0
+        self.last_tokens = 0
+        self.snippets_packed = 0
+        self.snippets_dropped = 0
+    
+    def record(self, tokens: int, packed: int = 0, dropped: int = 0):
+        """Record the estimated prompt tokens of a request."""
+        self.requests += 1
+        self.total_tokens += tokens
+        self.max_tokens = max(self.max_tokens, tokens)
+        self.last_tokens = tokens
+        self.snippets_packed += packed
+        self.snippets_dropped += dropped
+    
+    def stats(self) -> Dict[str, Any]:
+        """Get prompt size metrics."""
+        return {
+            "requests": self.requests,
+            "last_prompt_tokens": self.last_tokens,
+            "avg_prompt_tokens": round(self.total_tokens / self.requests, 1) if self.requests else 0,
+            "max_prompt_tokens": self.max_tokens,
+            "snippets_packed": self.snippets_packed,
+            "snippets_dropped": self.snippets_dropped
+        }
+
+# Shared prompt metrics for the whole worker
+prompt_stats = PromptStats()
+
+def compact_form_data(data: Any) -> Any:
+    """Drop empty fields (None, blank strings, empty lists and dicts) recursively.
+    
+    False and 0 are kept since they are meaningful answers.
+    """
+    if isinstance(data, dict):
+        items = ((key, compact_form_data(value)) for key, value in data.items())
+        return {key: value for key, value in items if not _is_empty(value)}
+    if isinstance(data, (list, tuple)):
+        values = (compact_form_data(value) for value in data)
+        return [value for value in values if not _is_empty(value)]
+    if isinstance(data, str):
+        return data.strip()
+    return data
+
+def _is_empty(value: Any) -> bool:
+    """Whether a form value carries no information."""
+    return value is None or (isinstance(value, (str, list, dict)) and not value)
+
+def _serialize_form_data(form_data: Dict[str, Any]) -> str:
+    """Serialize form data for a prompt without empty fields or indentation."""
+    return json.dumps(compact_form_data(form_data), separators=(",", ":"), ensure_ascii=False, default=str)
+
+def pack_snippets(snippets: List[str], budget: int) -> List[str]:
+    """Pack reference snippets into a token budget.
+    
+    Snippets are taken in order (most relevant first); one that does not fit
+    is skipped so a smaller, less relevant one may still be used.
+    
+    Args:
+        snippets: Snippets ordered by relevance
+        budget: Estimated tokens available for the snippets
+        
+    Returns:
+        The snippets that fit, in their original order
+    """
+    packed: List[str] = []
+    for snippet in snippets:
+        # Each snippet also costs its separator
+        cost = estimate_tokens(text=f"{snippet}\n\n")
+        if cost <= budget:
+            packed.append(snippet)
+            budget -= cost
+    return packed
+
+def _build_ems_messages(
+    form_data: Dict[str, Any],
+    context_snippets: Optional[List[str]] = None,
+    budget: Optional[int] = None
+) -> List[Dict[str, str]]:
+    """Build the chat messages for an EMS narrative request.
+    
+    Reference snippets are packed into what the prompt budget (defaults to
+    OPENAI_PROMPT_TOKEN_BUDGET) leaves after the system prompt and run data.
+    """
+    system_message = " ".join(EMS_SYSTEM_MESSAGE.split())
+    user_message = f"Run Data:\n{_serialize_form_data(form_data)}"
+    messages = [
+        {"role": "system", "content": system_message},
+        {"role": "user", "content": user_message}
+    ]
+    
+    snippets = context_snippets or []
+    header = "\n\nReference Materials:\n"
+    budget = OPENAI_PROMPT_TOKEN_BUDGET if budget is None else budget
+    packed = pack_snippets(snippets, budget - estimate_tokens(messages, text=header))
+    if packed:
+        messages[1]["content"] += header + "\n\n".join(packed)
+    
+    tokens = estimate_tokens(messages)
+    if tokens > budget:
+        print(f"Warning: EMS run data alone is {tokens} tokens, over the {budget} token prompt budget")
+    prompt_stats.record(tokens, len(packed), len(snippets) - len(packed))
+    return messages
+
+def _build_fire_messages(form_data: Dict[str, Any]) -> List[Dict[str, str]]:
+    """Build the chat messages for a Fire narrative request."""
+    system_message = " ".join(FIRE_SYSTEM_MESSAGE.split())
+    user_message = f"Incident Data:\n{_serialize_form_data(form_data)}"
+    messages = [
+        {"role": "system", "content": system_message},
+        {"role": "user", "content": user_message}
+    ]
+    
+    prompt_stats.record(estimate_tokens(messages))
+    return messages
+
+def _usage_tokens(response: Any) -> Optional[int]:
+    """Get the total tokens reported by an API response, if any."""
+    usage = getattr(response, "usage", None)
+    total = getattr(usage, "total_tokens", None)
+    return total if isinstance(total, int) else None
+
+async def _create_completion(
+    messages: List[Dict[str, str]],
+    max_tokens: int,
+    temperature: float,
+    timeout: Optional[float] = None,
+    user_id: Optional[str] = None
+) -> Any:
+    """Create a chat completion with admission control and retries."""
+    async def attempt():
+        async with llm_limiter.admit(user_id, estimate_tokens(messages, max_tokens)) as permit:
+            response = await client.chat.completions.create(
+                model=MODELS["CHAT"],
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                timeout=timeout or OPENAI_TIMEOUT
+            )
+            permit.settle(_usage_tokens(response))
+            return response
+    
+    return await openai_retry.call(attempt)
+
+class HedgeTracker:
+    """Tracks time-to-first-token to decide when to hedge a streaming call.
+    
+    The hedge delay is the configured percentile of recent time-to-first-token
+    samples, or a fixed default until enough samples have been recorded.
+    """
     
-    user_message = f"Run Data:\n{json.dumps(form_data, indent=2)}"
+    def __init__(
+        self,
+        percentile: float = OPENAI_HEDGE_PERCENTILE,
+        window: int = OPENAI_HEDGE_WINDOW,
+        min_samples: int = OPENAI_HEDGE_MIN_SAMPLES,
+        default_delay: float = OPENAI_HEDGE_DEFAULT_DELAY
+    ):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.default_delay = default_delay
+        self._samples: "deque[float]" = deque(maxlen=window)
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.skipped = 0
     
-    if context_snippets and len(context_snippets) > 0:
-        user_message += "\n\nReference Materials:\n" + "\n\n".join(context_snippets)
+    def record(self, seconds: float):
+        """Record the time to first token of a call."""
+        self._samples.append(seconds)
     
+    def delay(self) -> float:
+        """Get the seconds to wait for a first token before hedging."""
+        if len(self._samples) < self.min_samples:
+            return self.default_delay
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+        return ordered[index]
+    
+    def stats(self) -> Dict[str, Any]:
+        """Get hedging metrics."""
+        return {
+            "hedge_delay_ms": round(self.delay() * 1000, 3),
+            "samples": len(self._samples),
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "skipped": self.skipped
+        }
+
+# Shared tracker for the whole worker
+hedge_tracker = HedgeTracker()
+
+async def _open_stream(
+    messages: List[Dict[str, str]],
+    max_tokens: int,
+    timeout: Optional[float],
+    permit: Permit
+) -> Any:
+    """Open a streaming completion under an admitted permit.
+    
+    The permit is released if the stream cannot be opened.
+    """
     try:
-        response = await client.chat.completions.create(
+        stream = await client.chat.completions.create(
             model=MODELS["CHAT"],
-            messages=[
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": user_message}
-            ],
-            temperature=0.7,
-            max_tokens=1500
+            messages=messages,
+            temperature=NARRATIVE_TEMPERATURE,
+            max_tokens=max_tokens,
+            stream=True,
+            timeout=timeout or OPENAI_TIMEOUT
         )
+    except BaseException:
+        permit.release()
+        raise
+    return stream, permit
+
+async def _stream_deltas(open_stream: Callable[[], Awaitable[Any]]) -> AsyncIterator[str]:
+    """Open a stream with ``open_stream`` and yield its content deltas.
+    
+    The stream is closed and its permit released when the generator finishes,
+    fails or is closed.
+    """
+    stream, permit = await open_stream()
+    try:
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+    finally:
+        # Release the pooled connection if the consumer stops early
+        close = getattr(stream, "close", None)
+        if close is not None:
+            await close()
+        permit.release()
+
+async def _hedged_deltas(
+    primary: AsyncIterator[str],
+    start_hedge: Callable[[], Optional[AsyncIterator[str]]],
+    tracker: Optional[HedgeTracker] = None
+) -> AsyncIterator[str]:
+    """Race a second identical stream if the first is slow to start.
+    
+    If ``primary`` has not produced a first delta within the tracker's hedge
+    delay, ``start_hedge`` is asked for a second stream (it returns None when
+    there is no spare capacity). Whichever stream yields first wins and the
+    other is cancelled and closed.
+    
+    Args:
+        primary: Stream of deltas from the first request
+        start_hedge: Function starting the hedge request, or returning None
+        tracker: Latency tracker (defaults to the shared hedge_tracker)
         
-        return response.choices[0].message.content
+    Returns:
+        Async iterator of the winning stream's deltas
+    """
+    tracker = tracker or hedge_tracker
+    started = time.monotonic()
+    delay = tracker.delay()
+    attempts = {asyncio.ensure_future(primary.__anext__()): primary}
+    hedge_started = False
+    winner = None
+    first = None
+    error: Optional[BaseException] = None
+    
+    try:
+        while attempts and winner is None:
+            wait_for = None if hedge_started else max(0.0, started + delay - time.monotonic())
+            done, _ = await asyncio.wait(attempts, timeout=wait_for, return_when=asyncio.FIRST_COMPLETED)
+            
+            if not done:
+                hedge_started = True
+                hedge = start_hedge()
+                if hedge is None:
+                    # No spare capacity: keep waiting on the first request only
+                    tracker.skipped += 1
+                else:
+                    tracker.hedged += 1
+                    attempts[asyncio.ensure_future(hedge.__anext__())] = hedge
+                continue
+            
+            for task in done:
+                deltas = attempts.pop(task)
+                exception = task.exception()
+                if exception is None or isinstance(exception, StopAsyncIteration):
+                    winner = deltas
+                    first = None if exception else task.result()
+                    break
+                if error is None or deltas is primary:
+                    error = exception
+    finally:
+        # Cancel the loser (or everything, if we were cancelled)
+        for task in attempts:
+            task.cancel()
+        if attempts:
+            await asyncio.gather(*attempts, return_exceptions=True)
+        for deltas in attempts.values():
+            await deltas.aclose()
+    
+    if winner is None:
+        raise error
+    
+    tracker.record(time.monotonic() - started)
+    if winner is not primary:
+        tracker.hedge_wins += 1
+    
+    try:
+        if first is not None:
+            yield first
+            async for delta in winner:
+                yield delta
+    finally:
+        await winner.aclose()
+
+async def _stream_completion(
+    messages: List[Dict[str, str]],
+    max_tokens: int,
+    timeout: Optional[float] = None,
+    user_id: Optional[str] = None,
+    hedge: Optional[bool] = None
+) -> AsyncIterator[str]:
+    """Stream a chat completion, yielding content deltas as they arrive.
+    
+    Opening the stream is retried; once deltas have been yielded a failure
+    is raised to the caller. The admission slot is held until the stream
+    finishes or is closed, but not while backing off between attempts.
+    
+    With hedging, a slow first request is raced against a second identical
+    one. The hedge only runs if the limiter can admit it immediately, so
+    hedging backs off on its own under load.
+    """
+    tokens = estimate_tokens(messages, max_tokens)
+    
+    async def attempt():
+        permit = await llm_limiter.acquire(user_id, tokens)
+        return await _open_stream(messages, max_tokens, timeout, permit)
+    
+    def start_hedge():
+        permit = llm_limiter.try_acquire(user_id, tokens)
+        if permit is None:
+            return None
+        return _stream_deltas(lambda: _open_stream(messages, max_tokens, timeout, permit))
+    
+    deltas = _stream_deltas(lambda: openai_retry.call(attempt))
+    if OPENAI_HEDGING if hedge is None else hedge:
+        deltas = _hedged_deltas(deltas, start_hedge)
+    try:
+        async for delta in deltas:
+            yield delta
+    finally:
+        await deltas.aclose()
+
+def _narrative_cache_key(
+    kind: str,
+    form_data: Dict[str, Any],
+    context_snippets: Optional[List[str]] = None
+) -> str:
+    """Build the response cache key for a narrative request."""
+    return make_cache_key(
+        kind, form_data, MODELS["CHAT"], NARRATIVE_TEMPERATURE, PROMPT_VERSION, context_snippets
+    )
+
+async def _cached_stream(
+    messages: List[Dict[str, str]],
+    cache_key: str,
+    timeout: Optional[float] = None,
+    use_cache: bool = True,
+    user_id: Optional[str] = None,
+    hedge: Optional[bool] = None
+) -> AsyncIterator[str]:
+    """Stream a narrative completion through the response cache."""
+    cache = get_narrative_cache()
+    if use_cache:
+        cached = await cache.get(cache_key)
+        if cached is not None:
+            yield cached
+            return
+    
+    parts: List[str] = []
+    deltas = _stream_completion(messages, 1500, timeout, user_id, hedge)
+    try:
+        async for delta in deltas:
+            parts.append(delta)
+            yield delta
+    finally:
+        # Close the API stream right away if the consumer stops early
+        await deltas.aclose()
+    
+    # Only complete generations are cached
+    if use_cache and parts:
+        await cache.set(cache_key, "".join(parts))
+
+async def coalesce_deltas(
+    deltas: AsyncIterator[str],
+    interval: Optional[float] = None
+) -> AsyncIterator[str]:
+    """Merge a stream of small deltas into larger chunks.
+    
+    The first delta is passed through immediately so time-to-first-text is
+    not delayed. After that, deltas are buffered and flushed at most once
+    per interval, plus a final flush when the stream ends.
+    
+    Args:
+        deltas: Async iterator of text deltas
+        interval: Minimum seconds between flushes (defaults to STREAM_FLUSH_INTERVAL)
+        
+    Returns:
+        Async iterator of coalesced text chunks
+    """
+    interval = STREAM_FLUSH_INTERVAL if interval is None else interval
+    buffer: List[str] = []
+    last_flush: Optional[float] = None
+    
+    try:
+        async for delta in deltas:
+            buffer.append(delta)
+            now = time.monotonic()
+            if last_flush is None or now - last_flush >= interval:
+                yield "".join(buffer)
+                buffer = []
+                last_flush = now
+        
+        if buffer:
+            yield "".join(buffer)
+    finally:
+        # Propagate early closing (e.g. a cancelled generation) to the source
+        aclose = getattr(deltas, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+async def generate_ems_narrative(
+    form_data: Dict[str, Any],
+    context_snippets: Optional[List[str]] = None,
+    timeout: Optional[float] = None,
+    use_cache: bool = True,
+    user_id: Optional[str] = None,
+    hedge: Optional[bool] = None
+) -> str:
+    """Generate an EMS narrative using OpenAI.
+    
+    Args:
+        form_data: Dictionary containing EMS form data
+        context_snippets: Optional list of context snippets from knowledge base
+        timeout: Optional per-call timeout in seconds (defaults to OPENAI_TIMEOUT)
+        use_cache: Whether to serve and store the result in the narrative cache
+        user_id: User the call is made for, used for fair admission
+        hedge: Whether to hedge a slow request (defaults to OPENAI_HEDGING)
+        
+    Returns:
+        Generated narrative text
+    """
+    cache_key = _narrative_cache_key("ems", form_data, context_snippets)
+    if use_cache:
+        cached = await get_narrative_cache().get(cache_key)
+        if cached is not None:
+            return cached
+    
+    try:
+        messages = _build_ems_messages(form_data, context_snippets)
+        if OPENAI_HEDGING if hedge is None else hedge:
+            # Hedging races requests on their first token, so stream the result
+            content = "".join([delta async for delta in _stream_completion(messages, 1500, timeout, user_id, True)])
+        else:
+            response = await _create_completion(messages, 1500, NARRATIVE_TEMPERATURE, timeout, user_id)
+            content = response.choices[0].message.content
+        
+        if use_cache and content:
+            await get_narrative_cache().set(cache_key, content)
+        return content
     except Exception as e:
         print(f"Error generating narrative: {e}")
         raise
 
-async def generate_fire_narrative(form_data: Dict[str, Any]) -> str:
+async def stream_ems_narrative(
+    form_data: Dict[str, Any],
+    context_snippets: Optional[List[str]] = None,
+    timeout: Optional[float] = None,
+    use_cache: bool = True,
+    user_id: Optional[str] = None,
+    hedge: Optional[bool] = None
+) -> AsyncIterator[str]:
+    """Stream an EMS narrative using OpenAI.
+    
+    A cache hit is yielded as a single delta.
+    
+    Args:
+        form_data: Dictionary containing EMS form data
+        context_snippets: Optional list of context snippets from knowledge base
+        timeout: Optional per-call timeout in seconds (defaults to OPENAI_TIMEOUT)
+        use_cache: Whether to serve and store the result in the narrative cache
+        user_id: User the call is made for, used for fair admission
+        hedge: Whether to hedge a slow request (defaults to OPENAI_HEDGING)
+        
+    Returns:
+        Async iterator of narrative text deltas
+    """
+    try:
+        messages = _build_ems_messages(form_data, context_snippets)
+        cache_key = _narrative_cache_key("ems", form_data, context_snippets)
+        async for delta in _cached_stream(messages, cache_key, timeout, use_cache, user_id, hedge):
+            yield delta
+    except Exception as e:
+        print(f"Error streaming narrative: {e}")
+        raise
+
+async def generate_fire_narrative(
+    form_data: Dict[str, Any],
+    timeout: Optional[float] = None,
+    use_cache: bool = True,
+    user_id: Optional[str] = None,
+    hedge: Optional[bool] = None
+) -> str:
     """Generate a Fire narrative using OpenAI.
     
     Args:
         form_data: Dictionary containing Fire form data
+        timeout: Optional per-call timeout in seconds (defaults to OPENAI_TIMEOUT)
+        use_cache: Whether to serve and store the result in the narrative cache
+        user_id: User the call is made for, used for fair admission
+        hedge: Whether to hedge a slow request (defaults to OPENAI_HEDGING)
         
     Returns:
         Generated narrative text
     """
-    system_message = """
-    You are a Fire narrative assistant. Generate a comprehensive NFIRS-compliant fire incident narrative 
-    based on the provided incident data.
-    Format the narrative professionally and include all relevant details from the incident data.
-    """
-    
-    user_message = f"Incident Data:\n{json.dumps(form_data, indent=2)}"
+    cache_key = _narrative_cache_key("fire", form_data)
+    if use_cache:
+        cached = await get_narrative_cache().get(cache_key)
+        if cached is not None:
+            return cached
     
     try:
-        response = await client.chat.completions.create(
-            model=MODELS["CHAT"],
-            messages=[
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": user_message}
-            ],
-            temperature=0.7,
-            max_tokens=1500
-        )
+        messages = _build_fire_messages(form_data)
+        if OPENAI_HEDGING if hedge is None else hedge:
+            # Hedging races requests on their first token, so stream the result
+            content = "".join([delta async for delta in _stream_completion(messages, 1500, timeout, user_id, True)])
+        else:
+            response = await _create_completion(messages, 1500, NARRATIVE_TEMPERATURE, timeout, user_id)
+            content = response.choices[0].message.content
         
-        return response.choices[0].message.content
+        if use_cache and content:
+            await get_narrative_cache().set(cache_key, content)
+        return content
     except Exception as e:
         print(f"Error generating fire narrative: {e}")
         raise
 
-async def chat_completion(messages: List[Dict[str, str]], system_message: Optional[str] = None) -> str:
+async def stream_fire_narrative(
+    form_data: Dict[str, Any],
+    timeout: Optional[float] = None,
+    use_cache: bool = True,
+    user_id: Optional[str] = None,
+    hedge: Optional[bool] = None
+) -> AsyncIterator[str]:
+    """Stream a Fire narrative using OpenAI.
+    
+    A cache hit is yielded as a single delta.
+    
+    Args:
+        form_data: Dictionary containing Fire form data
+        timeout: Optional per-call timeout in seconds (defaults to OPENAI_TIMEOUT)
+        use_cache: Whether to serve and store the result in the narrative cache
+        user_id: User the call is made for, used for fair admission
+        hedge: Whether to hedge a slow request (defaults to OPENAI_HEDGING)
+        
+    Returns:
+        Async iterator of narrative text deltas
+    """
+    try:
+        messages = _build_fire_messages(form_data)
+        cache_key = _narrative_cache_key("fire", form_data)
+        async for delta in _cached_stream(messages, cache_key, timeout, use_cache, user_id, hedge):
+            yield delta
+    except Exception as e:
+        print(f"Error streaming fire narrative: {e}")
+        raise
+
+async def chat_completion(
+    messages: List[Dict[str, str]],
+    system_message: Optional[str] = None,
+    timeout: Optional[float] = None,
+    user_id: Optional[str] = None
+) -> str:
     """Generate a chat completion response.
     
     Args:
         messages: List of message dictionaries with role and content
         system_message: Optional system message to prepend
+        timeout: Optional per-call timeout in seconds (defaults to OPENAI_TIMEOUT)
+        user_id: User the call is made for, used for fair admission
         
     Returns:
         Generated response text
@@ -120,34 +707,87 @@ async def chat_completion(messages: List[Dict[str, str]], system_message: Option
             
         formatted_messages.extend(messages)
         
-        response = await client.chat.completions.create(
-            model=MODELS["CHAT"],
-            messages=formatted_messages,
-            temperature=0.7,
-            max_tokens=1000
-        )
+        response = await _create_completion(formatted_messages, 1000, 0.7, timeout, user_id)
         
         return response.choices[0].message.content
     except Exception as e:
         print(f"Error in chat completion: {e}")
         raise
 
-async def generate_embeddings(text: str) -> List[float]:
+async def generate_embeddings(
+    text: str,
+    timeout: Optional[float] = None,
+    user_id: Optional[str] = None,
+    use_cache: bool = True
+) -> List[float]:
     """Generate embeddings for the given text.
     
     Args:
         text: Text to generate embeddings for
+        timeout: Optional per-call timeout in seconds (defaults to OPENAI_TIMEOUT)
+        user_id: User the call is made for, used for fair admission
+        use_cache: Whether to serve and store the result in the embedding cache
         
     Returns:
         List of embedding values
     """
-    try:
-        response = await client.embeddings.create(
-            model=MODELS["EMBEDDING"],
-            input=text
+    if use_cache:
+        return await get_embedding_cache().get_or_create(
+            text,
+            MODELS["EMBEDDING"],
+            lambda: generate_embeddings(text, timeout, user_id, use_cache=False)
         )
+    
+    try:
+        async def attempt():
+            async with llm_limiter.admit(user_id, estimate_tokens(text=text)) as permit:
+                response = await client.embeddings.create(
+                    model=MODELS["EMBEDDING"],
+                    input=text,
+                    timeout=timeout or OPENAI_TIMEOUT
+                )
+                permit.settle(_usage_tokens(response))
+                return response
+        
+        response = await openai_retry.call(attempt)
         
         return response.data[0].embedding
+    except Exception as e:
+        print(f"Error generating embeddings: {e}")
+        raise
+
+async def generate_embeddings_batch(
+    texts: List[str],
+    timeout: Optional[float] = None,
+    user_id: Optional[str] = None
+) -> List[List[float]]:
+    """Generate embeddings for several texts in one request.
+    
+    Args:
+        texts: Texts to generate embeddings for
+        timeout: Optional per-call timeout in seconds (defaults to OPENAI_TIMEOUT)
+        user_id: User the call is made for, used for fair admission
+        
+    Returns:
+        List of embeddings, in the same order as the texts
+    """
+    if not texts:
+        return []
+    
+    try:
+        async def attempt():
+            async with llm_limiter.admit(user_id, estimate_tokens(text="".join(texts))) as permit:
+                response = await client.embeddings.create(
+                    model=MODELS["EMBEDDING"],
+                    input=texts,
+                    timeout=timeout or OPENAI_TIMEOUT
+                )
+                permit.settle(_usage_tokens(response))
+                return response
+        
+        response = await openai_retry.call(attempt)
+        
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
     except Exception as e:
         print(f"Error generating embeddings: {e}")
         raise
\ No newline at end of file
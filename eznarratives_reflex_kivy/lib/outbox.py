@@ -0,0 +1,249 @@
+import os
+import json
+import time
+import uuid
+import random
+import sqlite3
+import threading
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+# Outbox settings
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "50"))
+OUTBOX_BACKOFF_BASE = float(os.getenv("OUTBOX_BACKOFF_BASE", "2"))
+OUTBOX_BACKOFF_MAX = float(os.getenv("OUTBOX_BACKOFF_MAX", "300"))
+
+def get_outbox_dir() -> str:
+    """Get the directory used for offline storage.
+
+    Uses the documents directory on mobile platforms (via plyer) and
+    ``~/.eznarratives_cache`` on desktop.
+    """
+    try:
+        # Try to use plyer for mobile platforms
+        from plyer import storagepath
+        cache_dir = os.path.join(storagepath.get_documents_dir(), 'eznarratives_cache')
+    except ImportError:
+        # Fall back to a local directory for desktop
+        cache_dir = os.path.join(os.path.expanduser('~'), '.eznarratives_cache')
+
+    # Create the directory if it doesn't exist
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+class OutboxEntry:
+    """A queued record waiting to be sent."""
+
+    __slots__ = ("id", "idempotency_key", "kind", "payload", "attempts")
+
+    def __init__(self, id: str, idempotency_key: str, kind: str, payload: Dict[str, Any], attempts: int):
+        self.id = id
+        self.idempotency_key = idempotency_key
+        self.kind = kind
+        self.payload = payload
+        self.attempts = attempts
+
+class Outbox:
+    """Durable, SQLite-backed outbox for records created while offline.
+
+    Records are appended with a unique id and an idempotency key and stay in
+    the outbox until a send succeeds. Failed sends are retried with
+    exponential backoff. The database runs in WAL mode so an append is a
+    single fsync'd write that survives the app being killed.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        backoff_base: float = OUTBOX_BACKOFF_BASE,
+        backoff_max: float = OUTBOX_BACKOFF_MAX
+    ):
+        self.path = path
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # FULL syncs the WAL on every commit; NORMAL could lose the last
+        # appends on a power cut, and these records exist nowhere else
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS outbox (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                id TEXT NOT NULL UNIQUE,
+                idempotency_key TEXT NOT NULL UNIQUE,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL DEFAULT 0,
+                last_error TEXT
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS outbox_kind_next_attempt_idx ON outbox (kind, next_attempt_at)"
+        )
+
+    def enqueue(self, kind: str, payload: Dict[str, Any], idempotency_key: Optional[str] = None) -> str:
+        """Append a record to the outbox.
+
+        Args:
+            kind: Record type, used to route the record when replaying
+            payload: JSON-serializable record
+            idempotency_key: Key identifying the record on the server; generated if
+                omitted. Enqueuing an existing key replaces its payload.
+
+        Returns:
+            The idempotency key of the queued record
+        """
+        idempotency_key = idempotency_key or str(uuid.uuid4())
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO outbox (id, idempotency_key, kind, payload, created_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (idempotency_key) DO UPDATE SET payload = excluded.payload
+                """,
+                (str(uuid.uuid4()), idempotency_key, kind, json.dumps(payload, default=str), time.time())
+            )
+        return idempotency_key
+
+    def due(self, kind: Optional[str] = None, limit: int = OUTBOX_BATCH_SIZE) -> List[OutboxEntry]:
+        """Get the oldest records whose backoff has elapsed."""
+        query = "SELECT id, idempotency_key, kind, payload, attempts FROM outbox WHERE next_attempt_at <= ?"
+        params: List[Any] = [time.time()]
+        if kind is not None:
+            query += " AND kind = ?"
+            params.append(kind)
+        query += " ORDER BY seq LIMIT ?"
+        params.append(limit)
+
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [OutboxEntry(row[0], row[1], row[2], json.loads(row[3]), row[4]) for row in rows]
+
+    def ack(self, ids: List[str]):
+        """Remove records that were delivered."""
+        if not ids:
+            return
+        with self._lock:
+            self._conn.executemany("DELETE FROM outbox WHERE id = ?", [(id,) for id in ids])
+
+    def fail(self, ids: List[str], error: str):
+        """Record a failed delivery and schedule the next attempt."""
+        if not ids:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for id in ids:
+                    row = self._conn.execute("SELECT attempts FROM outbox WHERE id = ?", (id,)).fetchone()
+                    if row is None:
+                        continue
+                    attempts = row[0] + 1
+                    self._conn.execute(
+                        "UPDATE outbox SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                        (attempts, now + self._backoff(attempts), error, id)
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def count(self, kind: Optional[str] = None) -> int:
+        """Get the number of queued records."""
+        with self._lock:
+            if kind is None:
+                row = self._conn.execute("SELECT COUNT(*) FROM outbox").fetchone()
+            else:
+                row = self._conn.execute("SELECT COUNT(*) FROM outbox WHERE kind = ?", (kind,)).fetchone()
+        return row[0]
+
+    async def flush(
+        self,
+        send_batch: Callable[[List[OutboxEntry]], Awaitable[Optional[Dict[str, str]]]],
+        kind: Optional[str] = None,
+        batch_size: int = OUTBOX_BATCH_SIZE
+    ) -> int:
+        """Send all due records in batches.
+
+        ``send_batch`` receives a list of entries and should deliver them in one
+        request. It may return a dict mapping entry ids to error messages for
+        rows that were rejected; those are rescheduled and the rest removed.
+        If it raises, the whole batch is rescheduled with backoff and flushing
+        stops until the next call.
+
+        Returns:
+            Number of records delivered
+        """
+        sent = 0
+        while True:
+            entries = self.due(kind, batch_size)
+            if not entries:
+                return sent
+
+            ids = [entry.id for entry in entries]
+            try:
+                errors = await send_batch(entries) or {}
+            except Exception as e:
+                print(f"Error flushing outbox: {e}")
+                self.fail(ids, str(e))
+                return sent
+
+            for id, error in errors.items():
+                self.fail([id], error)
+            delivered = [id for id in ids if id not in errors]
+            self.ack(delivered)
+            sent += len(delivered)
+
+            # Rejected rows are backing off, so stop once nothing got through
+            if not delivered:
+                return sent
+
+    def import_json_files(self, directory: str, prefix: str, kind: str) -> int:
+        """Move legacy one-file-per-record JSON caches into the outbox.
+
+        Returns:
+            Number of files imported
+        """
+        if not os.path.exists(directory):
+            return 0
+
+        imported = 0
+        for file_name in sorted(os.listdir(directory)):
+            if not (file_name.startswith(prefix) and file_name.endswith(".json")):
+                continue
+            file_path = os.path.join(directory, file_name)
+            try:
+                with open(file_path, 'r') as f:
+                    payload = json.load(f)
+                # The file name is unique per record, so reuse it as the key
+                self.enqueue(kind, payload, idempotency_key=f"legacy:{file_name}")
+                os.remove(file_path)
+                imported += 1
+            except Exception as e:
+                print(f"Error importing cached record {file_name}: {e}")
+        return imported
+
+    def close(self):
+        """Close the database."""
+        with self._lock:
+            self._conn.close()
+
+    def _backoff(self, attempts: int) -> float:
+        """Get the retry delay for an attempt, with full jitter."""
+        delay = min(self.backoff_max, self.backoff_base * (2 ** (attempts - 1)))
+        return random.uniform(0, delay)
+
+_outbox = None
+
+def get_outbox() -> Outbox:
+    """Get the shared outbox, creating it on first use."""
+    global _outbox
+    if _outbox is None:
+        path = os.getenv("OUTBOX_PATH") or os.path.join(get_outbox_dir(), "outbox.sqlite3")
+        _outbox = Outbox(path)
+    return _outbox
@@ -0,0 +1,349 @@
+import time
+import asyncio
+import threading
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Callable, Dict, Optional
+
+class PoolTimeout(Exception):
+    """Raised when no connection could be checked out within the timeout."""
+
+class _PoolStats:
+    """Checkout counters shared by the sync and async pools."""
+
+    def __init__(self):
+        self.in_use = 0
+        self.waiting = 0
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_checkout_time = 0.0
+        self.max_checkout_time = 0.0
+
+    def record_checkout(self, elapsed: float):
+        """Record a successful checkout and how long it took."""
+        self.checkouts += 1
+        self.total_checkout_time += elapsed
+        self.max_checkout_time = max(self.max_checkout_time, elapsed)
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Get the counters as a dictionary."""
+        avg = self.total_checkout_time / self.checkouts if self.checkouts else 0.0
+        return {
+            "in_use": self.in_use,
+            "waiting": self.waiting,
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "avg_checkout_ms": round(avg * 1000, 3),
+            "max_checkout_ms": round(self.max_checkout_time * 1000, 3)
+        }
+
+class _PooledConnection:
+    """A pooled connection with its bookkeeping timestamps."""
+
+    __slots__ = ("conn", "created_at", "last_used")
+
+    def __init__(self, conn: Any):
+        now = time.monotonic()
+        self.conn = conn
+        self.created_at = now
+        self.last_used = now
+
+class PgConnectionPool:
+    """Thread-safe pool of psycopg2 connections.
+
+    Connections are health-checked on checkout when they have been idle for
+    longer than ``health_check_interval``, retired after ``max_lifetime``
+    seconds, and idle connections above ``min_size`` are closed after
+    ``max_idle`` seconds.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], Any],
+        min_size: int = 1,
+        max_size: int = 10,
+        max_lifetime: float = 1800,
+        max_idle: float = 300,
+        health_check_interval: float = 30,
+        checkout_timeout: float = 10
+    ):
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.health_check_interval = health_check_interval
+        self.checkout_timeout = checkout_timeout
+
+        self._cond = threading.Condition()
+        self._idle: "deque[_PooledConnection]" = deque()
+        self._in_use: Dict[int, _PooledConnection] = {}
+        self._size = 0
+        self._closed = False
+        self._stats = _PoolStats()
+
+    def open(self):
+        """Open the minimum number of connections."""
+        while True:
+            with self._cond:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                entry = _PooledConnection(self._connect())
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                raise
+            with self._cond:
+                self._idle.append(entry)
+                self._cond.notify()
+
+    def getconn(self, timeout: Optional[float] = None) -> Any:
+        """Check out a connection, waiting up to ``timeout`` seconds."""
+        timeout = self.checkout_timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+
+        while True:
+            entry = None
+            with self._cond:
+                if self._closed:
+                    raise PoolTimeout("Connection pool is closed")
+
+                while True:
+                    self._reap_idle_locked()
+                    if self._idle:
+                        # LIFO keeps a hot working set and lets extras idle out
+                        entry = self._idle.pop()
+                        break
+                    if self._size >= self.max_size:
+                        self._reclaim_closed_locked()
+                    if self._size < self.max_size:
+                        self._size += 1
+                        break
+
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats.timeouts += 1
+                        raise PoolTimeout(f"No connection available within {timeout}s")
+
+                    self._stats.waiting += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._stats.waiting -= 1
+
+            if entry is None:
+                try:
+                    entry = _PooledConnection(self._connect())
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._is_healthy(entry):
+                self._discard(entry)
+                continue
+
+            with self._cond:
+                self._in_use[id(entry.conn)] = entry
+                self._stats.in_use = len(self._in_use)
+                self._stats.record_checkout(time.monotonic() - start)
+            return entry.conn
+
+    def putconn(self, conn: Any, close: bool = False):
+        """Return a connection to the pool."""
+        with self._cond:
+            entry = self._in_use.pop(id(conn), None)
+            self._stats.in_use = len(self._in_use)
+        if entry is None:
+            return
+
+        if close or self._closed or conn.closed or self._is_expired(entry) or not self._reset(conn):
+            self._discard(entry)
+            return
+
+        entry.last_used = time.monotonic()
+        with self._cond:
+            self._idle.append(entry)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None):
+        """Check out a connection for the duration of a ``with`` block."""
+        conn = self.getconn(timeout)
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def close(self):
+        """Close all idle connections and refuse new checkouts."""
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._cond.notify_all()
+        for entry in idle:
+            self._discard(entry)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get pool statistics for sizing."""
+        with self._cond:
+            stats = self._stats.as_dict()
+            stats.update({
+                "size": self._size,
+                "idle": len(self._idle),
+                "max_size": self.max_size
+            })
+        return stats
+
+    def _is_expired(self, entry: _PooledConnection) -> bool:
+        """Check if a connection has outlived its maximum lifetime."""
+        return time.monotonic() - entry.created_at > self.max_lifetime
+
+    def _is_healthy(self, entry: _PooledConnection) -> bool:
+        """Check a connection before handing it out."""
+        if entry.conn.closed or self._is_expired(entry):
+            return False
+        if time.monotonic() - entry.last_used < self.health_check_interval:
+            return True
+        try:
+            with entry.conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            entry.conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _reset(self, conn: Any) -> bool:
+        """Roll back any open transaction so the next user starts clean."""
+        try:
+            import psycopg2.extensions as extensions
+            status = conn.get_transaction_status()
+            if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                return False
+            if status != extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _reap_idle_locked(self):
+        """Close idle connections above min_size that sat unused too long."""
+        now = time.monotonic()
+        while self._idle and self._size > self.min_size:
+            oldest = self._idle[0]
+            if now - oldest.last_used <= self.max_idle and not self._is_expired(oldest):
+                break
+            self._idle.popleft()
+            self._size -= 1
+            try:
+                oldest.conn.close()
+            except Exception:
+                pass
+
+    def _reclaim_closed_locked(self):
+        """Free slots held by checked-out connections the caller closed."""
+        for key, entry in list(self._in_use.items()):
+            if entry.conn.closed:
+                del self._in_use[key]
+                self._size -= 1
+        self._stats.in_use = len(self._in_use)
+
+    def _discard(self, entry: _PooledConnection):
+        """Close a connection and free its slot."""
+        try:
+            entry.conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+class AsyncPgConnectionPool:
+    """Async connection pool backed by asyncpg.
+
+    asyncpg handles idle reaping (``max_inactive_connection_lifetime``) and
+    resets connections on release; this wrapper adds a checkout timeout, an
+    optional health check and the same statistics as PgConnectionPool.
+    """
+
+    def __init__(
+        self,
+        dsn: str,
+        min_size: int = 1,
+        max_size: int = 10,
+        max_idle: float = 300,
+        checkout_timeout: float = 10,
+        health_check: bool = False
+    ):
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.checkout_timeout = checkout_timeout
+        self.health_check = health_check
+
+        self._pool = None
+        self._open_lock = asyncio.Lock()
+        self._stats = _PoolStats()
+
+    async def open(self):
+        """Create the underlying asyncpg pool."""
+        async with self._open_lock:
+            if self._pool is None:
+                import asyncpg
+
+                self._pool = await asyncpg.create_pool(
+                    self.dsn,
+                    min_size=self.min_size,
+                    max_size=self.max_size,
+                    max_inactive_connection_lifetime=self.max_idle
+                )
+
+    @asynccontextmanager
+    async def connection(self, timeout: Optional[float] = None):
+        """Check out a connection for the duration of an ``async with`` block."""
+        if self._pool is None:
+            await self.open()
+
+        start = time.monotonic()
+        self._stats.waiting += 1
+        try:
+            conn = await self._pool.acquire(timeout=self.checkout_timeout if timeout is None else timeout)
+        except asyncio.TimeoutError:
+            self._stats.timeouts += 1
+            raise PoolTimeout("No connection available")
+        finally:
+            self._stats.waiting -= 1
+
+        try:
+            if self.health_check:
+                await conn.execute("SELECT 1")
+            self._stats.record_checkout(time.monotonic() - start)
+            self._stats.in_use += 1
+            try:
+                yield conn
+            finally:
+                self._stats.in_use -= 1
+        finally:
+            await self._pool.release(conn)
+
+    async def close(self):
+        """Close the pool."""
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Get pool statistics for sizing."""
+        stats = self._stats.as_dict()
+        if self._pool is not None:
+            stats.update({
+                "size": self._pool.get_size(),
+                "idle": self._pool.get_idle_size(),
+                "max_size": self.max_size
+            })
+        return stats
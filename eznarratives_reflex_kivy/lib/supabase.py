@@ -1,8 +1,13 @@
 import os
+import asyncio
 import psycopg2
+from typing import Any, Dict, List, Optional
 from dotenv import load_dotenv
+from postgrest import APIError
 from supabase import create_client, Client
 
+from lib.pg_pool import PgConnectionPool, AsyncPgConnectionPool
+
 # Determine environment and load appropriate .env file
 env = os.getenv("APP_ENV", "development")
 env_file = ".env.production" if env == "production" else ".env.local"
@@ -28,16 +33,218 @@ if not dsn:
 # Initialize Supabase client
 supabase: Client = create_client(supabase_url, supabase_key)
 
-# Create PostgreSQL connection
+# PostgreSQL pool settings (per worker)
+PG_POOL_MIN_SIZE = int(os.getenv("PG_POOL_MIN_SIZE", "1"))
+PG_POOL_MAX_SIZE = int(os.getenv("PG_POOL_MAX_SIZE", "10"))
+PG_POOL_MAX_LIFETIME = float(os.getenv("PG_POOL_MAX_LIFETIME", "1800"))
+PG_POOL_MAX_IDLE = float(os.getenv("PG_POOL_MAX_IDLE", "300"))
+PG_POOL_HEALTH_CHECK_INTERVAL = float(os.getenv("PG_POOL_HEALTH_CHECK_INTERVAL", "30"))
+PG_POOL_CHECKOUT_TIMEOUT = float(os.getenv("PG_POOL_CHECKOUT_TIMEOUT", "10"))
+
+# Connection pools are created lazily on first use
+pg_pool = PgConnectionPool(
+    lambda: psycopg2.connect(dsn),
+    min_size=PG_POOL_MIN_SIZE,
+    max_size=PG_POOL_MAX_SIZE,
+    max_lifetime=PG_POOL_MAX_LIFETIME,
+    max_idle=PG_POOL_MAX_IDLE,
+    health_check_interval=PG_POOL_HEALTH_CHECK_INTERVAL,
+    checkout_timeout=PG_POOL_CHECKOUT_TIMEOUT
+)
+
+async_pg_pool = AsyncPgConnectionPool(
+    dsn,
+    min_size=PG_POOL_MIN_SIZE,
+    max_size=PG_POOL_MAX_SIZE,
+    max_idle=PG_POOL_MAX_IDLE,
+    checkout_timeout=PG_POOL_CHECKOUT_TIMEOUT
+)
+
+# Get a pooled PostgreSQL connection
 def get_pg_connection():
-    """Get a PostgreSQL connection using the connection string from environment variables."""
+    """Check out a pooled PostgreSQL connection.
+    
+    Return it with release_pg_connection(), or prefer the pg_connection()
+    context manager. Closing the connection instead also frees its slot.
+    """
     try:
-        connection = psycopg2.connect(dsn)
-        return connection
+        return pg_pool.getconn()
     except Exception as e:
         print(f"Error connecting to PostgreSQL: {e}")
         raise
 
+def release_pg_connection(connection, close: bool = False):
+    """Return a connection checked out with get_pg_connection() to the pool."""
+    pg_pool.putconn(connection, close=close)
+
+def pg_connection():
+    """Context manager that checks out a pooled PostgreSQL connection."""
+    return pg_pool.connection()
+
+def async_pg_connection():
+    """Async context manager that checks out a pooled asyncpg connection."""
+    return async_pg_pool.connection()
+
+def get_pg_pool_stats():
+    """Get connection pool statistics (in-use, waiting, checkout latency)."""
+    return {
+        "sync": pg_pool.stats(),
+        "async": async_pg_pool.stats()
+    }
+
+# Rows per request for bulk narrative writes
+NARRATIVE_BULK_CHUNK_SIZE = int(os.getenv("NARRATIVE_BULK_CHUNK_SIZE", "500"))
+
+async def bulk_save_narratives(
+    narratives: List[Dict[str, Any]],
+    upsert: bool = False,
+    on_conflict: str = "idempotency_key",
+    chunk_size: int = NARRATIVE_BULK_CHUNK_SIZE
+) -> List[Dict[str, Any]]:
+    """Write many narratives with chunked multi-row requests.
+    
+    Each chunk is one insert (or upsert) request. If the database rejects a
+    chunk, it is split in half until the offending rows are isolated, so
+    one bad row does not fail the whole batch.
+    
+    Args:
+        narratives: Narrative rows to write
+        upsert: Upsert on ``on_conflict`` instead of inserting
+        on_conflict: Conflict column used for upserts
+        chunk_size: Maximum rows per request
+        
+    Returns:
+        One ``{"id": ..., "error": ...}`` dict per input row, in input order
+    """
+    results = [{"id": None, "error": None} for _ in narratives]
+    for start in range(0, len(narratives), chunk_size):
+        indexes = list(range(start, min(start + chunk_size, len(narratives))))
+        await _write_narrative_chunk(narratives, indexes, results, upsert, on_conflict)
+    return results
+
+async def _write_narrative_chunk(
+    narratives: List[Dict[str, Any]],
+    indexes: List[int],
+    results: List[Dict[str, Any]],
+    upsert: bool,
+    on_conflict: str
+):
+    """Write one chunk of narratives and record per-row results."""
+    rows = [narratives[i] for i in indexes]
+    try:
+        table = supabase.from_("narratives")
+        if upsert:
+            # Missing keys take the column default instead of NULL
+            query = table.upsert(rows, on_conflict=on_conflict, default_to_null=False)
+        else:
+            query = table.insert(rows, default_to_null=False)
+        # The client is synchronous; keep the request off the event loop
+        response = await asyncio.to_thread(query.execute)
+    except APIError as e:
+        if len(indexes) == 1:
+            results[indexes[0]]["error"] = str(e)
+            return
+        # Split the chunk to isolate the rows the database rejected
+        middle = len(indexes) // 2
+        await _write_narrative_chunk(narratives, indexes[:middle], results, upsert, on_conflict)
+        await _write_narrative_chunk(narratives, indexes[middle:], results, upsert, on_conflict)
+        return
+    except Exception as e:
+        # Transport errors affect the whole request; splitting would not help
+        print(f"Error saving narratives to Supabase: {e}")
+        for i in indexes:
+            results[i]["error"] = str(e)
+        return
+    
+    returned = response.data or []
+    if upsert and all(row.get(on_conflict) for row in rows):
+        ids = {row.get(on_conflict): row.get("id") for row in returned}
+        for i in indexes:
+            results[i]["id"] = ids.get(narratives[i][on_conflict])
+    else:
+        # Inserted rows come back in request order
+        for i, row in zip(indexes, returned):
+            results[i]["id"] = row.get("id")
+
+# Function to fetch a page of session summaries
+async def fetch_session_page(
+    user_id: str,
+    cursor: Optional[Dict[str, Any]] = None,
+    limit: int = 20
+) -> List[Dict[str, Any]]:
+    """Fetch a user's session summaries after a keyset cursor, newest first.
+    
+    Sessions are ordered by (date, id) descending; dates are ISO strings so
+    they sort chronologically.
+    
+    Args:
+        user_id: Owner of the sessions
+        cursor: ``{"date": ..., "id": ...}`` of the last session already loaded
+        limit: Maximum number of rows
+        
+    Returns:
+        Rows with id, name and date
+    """
+    query = supabase.table("sessions").select("id, name, date").eq("user_id", user_id)
+    
+    if cursor:
+        date = cursor["date"]
+        session_id = cursor["id"]
+        query = query.or_(f'date.lt."{date}",and(date.eq."{date}",id.lt."{session_id}")')
+    
+    query = query.order("date", desc=True).order("id", desc=True).limit(limit)
+    # The client is synchronous; keep the request off the event loop
+    response = await asyncio.to_thread(query.execute)
+    return response.data or []
+
+# Function to fetch a window of session messages
+async def fetch_message_page(
+    session_id: str,
+    cursor: Optional[Dict[str, Any]] = None,
+    limit: int = 50
+) -> List[Dict[str, Any]]:
+    """Fetch a session's messages older than a keyset cursor, newest first.
+    
+    Args:
+        session_id: Session to read
+        cursor: ``{"created_at": ..., "id": ...}`` of the oldest message already loaded
+        limit: Maximum number of rows
+        
+    Returns:
+        Rows with id, type, content, timestamp and created_at
+    """
+    query = supabase.table("session_messages").select(
+        "id, type, content, timestamp, created_at"
+    ).eq("session_id", session_id)
+    
+    if cursor:
+        created_at = cursor["created_at"]
+        message_id = cursor["id"]
+        query = query.or_(f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt.{message_id})')
+    
+    query = query.order("created_at", desc=True).order("id", desc=True).limit(limit)
+    response = await asyncio.to_thread(query.execute)
+    return response.data or []
+
+# Function to append a chat message to a session
+async def insert_session_message(row: Dict[str, Any]) -> bool:
+    """Append one message to session_messages as a single insert.
+    
+    Args:
+        row: Message row with session_id, user_id, type, content and timestamp
+        
+    Returns:
+        Whether the insert succeeded
+    """
+    try:
+        query = supabase.table("session_messages").insert(row)
+        # The client is synchronous; keep the request off the event loop
+        await asyncio.to_thread(query.execute)
+        return True
+    except Exception as e:
+        print(f"Error adding message to session: {e}")
+        return False
+
 # Function to check if Supabase is properly configured
 def is_supabase_configured() -> bool:
     """Check if Supabase is properly configured."""
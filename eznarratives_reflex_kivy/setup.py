@@ -10,6 +10,7 @@ setup(
         "kivymd",
         "supabase",
         "openai",
+        "numpy",
         "python-dotenv",
     ],
 )
\ No newline at end of file
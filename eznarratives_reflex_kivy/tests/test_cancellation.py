@@ -0,0 +1,116 @@
+"""
+Test Generation Cancellation
+============================
+
+This module tests cancelling narrative generation stages and streams.
+"""
+
+import os
+import sys
+import asyncio
+import pytest
+
+# Add the parent directory to the path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib.cancellation import (
+    GenerationCancelled,
+    await_unless_cancelled,
+    begin_cancellable,
+    end_cancellable,
+    iter_unless_cancelled,
+    request_cancel
+)
+from lib.openai_client import coalesce_deltas
+
+
+class SlowStream:
+    """Async generator factory that stalls before its second delta."""
+
+    def __init__(self):
+        self.closed = False
+
+    async def __call__(self):
+        try:
+            yield "First"
+            await asyncio.sleep(10)
+            yield "Second"
+        finally:
+            self.closed = True
+
+
+async def consume(cancelled, stream, status):
+    """Consume a stream the way the narrative states do."""
+    status.update(text="", status="Generating narrative", error=None)
+    try:
+        chunks = iter_unless_cancelled(cancelled, stream)
+        try:
+            async for chunk in chunks:
+                status["text"] += chunk
+        finally:
+            await chunks.aclose()
+        status["status"] = "Done"
+    except GenerationCancelled:
+        status["status"] = "Cancelled"
+    except Exception as e:
+        status["error"] = str(e)
+
+
+@pytest.mark.asyncio
+async def test_cancel_while_chunk_is_pending():
+    """Test that cancelling mid-stream closes the stream and ends as cancelled."""
+    source = SlowStream()
+    cancelled = begin_cancellable("ems:token-1")
+    status = {}
+
+    task = asyncio.ensure_future(consume(cancelled, coalesce_deltas(source()), status))
+    await asyncio.sleep(0.05)
+    assert status["text"] == "First"
+
+    assert request_cancel("ems:token-1")
+    await asyncio.wait_for(task, 1)
+    end_cancellable("ems:token-1", cancelled)
+
+    assert status["status"] == "Cancelled"
+    assert status["error"] is None
+    assert source.closed
+    assert not request_cancel("ems:token-1")
+
+
+@pytest.mark.asyncio
+async def test_stage_result_is_returned_without_cancel():
+    """Test that an uncancelled stage returns its result and errors propagate."""
+    cancelled = asyncio.Event()
+
+    async def failing_stage():
+        raise ValueError("failed")
+
+    assert await await_unless_cancelled(cancelled, asyncio.sleep(0.01, "ok")) == "ok"
+    with pytest.raises(ValueError):
+        await await_unless_cancelled(cancelled, failing_stage())
+
+
+@pytest.mark.asyncio
+async def test_cancelled_stage_is_unwound():
+    """Test that a cancelled stage has finished unwinding before the cancel is raised."""
+    cancelled = asyncio.Event()
+    unwound = []
+
+    async def stage():
+        try:
+            await asyncio.sleep(10)
+        finally:
+            unwound.append(True)
+
+    asyncio.get_running_loop().call_later(0.02, cancelled.set)
+    with pytest.raises(GenerationCancelled):
+        await await_unless_cancelled(cancelled, stage())
+    assert unwound == [True]
+
+
+if __name__ == "__main__":
+    asyncio.run(test_cancel_while_chunk_is_pending())
+    asyncio.run(test_stage_result_is_returned_without_cancel())
+    asyncio.run(test_cancelled_stage_is_unwound())
+
+    print("All cancellation tests passed!")
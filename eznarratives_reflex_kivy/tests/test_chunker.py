@@ -0,0 +1,138 @@
+"""
+Test Knowledge Base Chunker
+===========================
+
+This module tests text normalization and token-windowed chunking of the
+knowledge base documents.
+"""
+
+import os
+import sys
+import pytest
+
+# Add the parent directory to the path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib.chunker import (
+    CHUNKER_VERSION,
+    chunk_guideline_pages,
+    chunk_protocols,
+    join_lines,
+    normalize_text,
+    window_units
+)
+from lib.llm_limiter import estimate_tokens
+
+
+def page(guideline, number, body):
+    """Create a national guidelines page with its running header."""
+    return {
+        "title": "NASEMSO",
+        "content": (
+            "National Model EMS Clinical Guidelines  \n \n________________________   Go To TOC  \n"
+            f"Respiratory  Rev. March  2022  \n{guideline}  {number} \nVersion 3.0 \n{body}"
+        )
+    }
+
+
+def test_normalize_text_removes_pdf_artifacts():
+    """Test whitespace collapsing and dot leader removal."""
+    text = "Airway   Management \n \n \nBRADYCARDIA  ................................ ......  42 \n"
+
+    assert normalize_text(text) == "Airway Management\nBRADYCARDIA 42"
+
+
+def test_join_lines_rejoins_wrapped_sentences():
+    """Test that wrapped lines are joined but list items stay separate."""
+    lines = [("Syncope is heralded by the loss of", 25), ("consciousness.", 26), ("1. Stabilize", 26), ("2. Transfer", 26)]
+
+    assert join_lines(lines) == [
+        ("Syncope is heralded by the loss of consciousness.", 25),
+        ("1. Stabilize", 26),
+        ("2. Transfer", 26)
+    ]
+
+
+def test_windows_respect_budget_and_overlap():
+    """Test token-budgeted windows that repeat the tail of the previous one."""
+    units = [(f"Sentence number {i} of the section.", 1) for i in range(10)]
+
+    windows = window_units(units, max_tokens=30, overlap=10)
+
+    assert len(windows) > 1
+    for window in windows:
+        assert sum(estimate_tokens(text=text) for text, _ in window) <= 30
+    for previous, window in zip(windows, windows[1:]):
+        assert window[0] == previous[-1]
+    assert windows[-1][-1] == units[-1]
+
+
+def test_guideline_pages_split_by_section_with_provenance():
+    """Test that a guideline spanning pages is split at its section headings."""
+    pages = [
+        page("Airway Management", 180, "Patient Care Goal s \nMaintain oxygenation and ventilation in every patient. \n"
+             "Inclusion Criteria \nPatients with an inadequate or threatened airway"),
+        page("Airway Managemen t", 181, "who cannot protect it. \nConsider a supraglottic airway early. \n"
+             "References \n1. Smith J. Airway study. 2020."),
+        page("Asthma", 182, "Aliases \nNone noted")
+    ]
+
+    chunks = list(chunk_guideline_pages(pages, "guidelines", "ems_guidelines.json"))
+
+    assert [chunk["title"] for chunk in chunks] == [
+        "Airway Management - Patient Care Goals",
+        "Airway Management - Inclusion Criteria"
+    ]
+    assert chunks[1]["content"] == (
+        "Patients with an inadequate or threatened airway who cannot protect it.\n"
+        "Consider a supraglottic airway early."
+    )
+    assert chunks[1]["provenance"] == {
+        "file": "ems_guidelines.json",
+        "category": "Respiratory",
+        "guideline": "Airway Management",
+        "section": "Inclusion Criteria",
+        "occurrence": 0,
+        "pages": [180, 181],
+        "window": 0,
+        "chunker_version": CHUNKER_VERSION
+    }
+
+
+def test_content_ids_are_stable_when_other_sections_change():
+    """Test that editing one section does not renumber the others."""
+    body = "Patient Care Goals \nMaintain oxygenation and ventilation in every patient."
+    before = list(chunk_guideline_pages([page("Asthma", 1, body), page("Croup", 2, body)], "g", "f"))
+    after = list(chunk_guideline_pages([page("Croup", 2, body)], "g", "f"))
+
+    assert before[1]["content_id"] == after[0]["content_id"]
+
+
+def test_protocols_are_windowed_and_deduplicated():
+    """Test protocol subsections are chunked once each within the budget."""
+    long_content = " ".join(f"Step {i} of the stroke assessment is documented." for i in range(60))
+    protocols = [
+        {"title": "STROKE", "subsections": [
+            {"title": "EMS", "content": long_content},
+            {"title": "Paramedic", "content": long_content},
+            {"title": "General Information", "content": "Protocol information not available in detail."}
+        ]}
+    ]
+
+    chunks = list(chunk_protocols(protocols, "protocols", "protocols.json", max_tokens=100, overlap=20))
+
+    assert len(chunks) > 1
+    assert {chunk["provenance"]["subsection"] for chunk in chunks} == {"EMS"}
+    assert all(estimate_tokens(text=chunk["content"]) <= 100 for chunk in chunks)
+    assert [chunk["provenance"]["window"] for chunk in chunks] == list(range(len(chunks)))
+
+
+if __name__ == "__main__":
+    test_normalize_text_removes_pdf_artifacts()
+    test_join_lines_rejoins_wrapped_sentences()
+    test_windows_respect_budget_and_overlap()
+    test_guideline_pages_split_by_section_with_provenance()
+    test_content_ids_are_stable_when_other_sections_change()
+    test_protocols_are_windowed_and_deduplicated()
+
+    print("All chunker tests passed!")
@@ -0,0 +1,140 @@
+"""
+Test Connectivity Monitor
+=========================
+
+This module tests the cached connectivity monitor with a fake probe.
+"""
+
+import os
+import sys
+import asyncio
+import pytest
+from dotenv import load_dotenv
+
+# Add the parent directory to the path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Load environment variables
+load_dotenv(".env.local")
+
+from lib.connectivity import ConnectivityMonitor
+
+
+class FakeProbe:
+    """Fake probe that counts calls and returns a settable status."""
+
+    def __init__(self, online=True, delay=0.0):
+        self.online = online
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return self.online
+
+
+@pytest.mark.asyncio
+async def test_status_is_cached_within_ttl():
+    """Test that repeated checks within the TTL do not probe again."""
+    probe = FakeProbe()
+    monitor = ConnectivityMonitor(probe=probe, ttl=60)
+
+    assert await monitor.is_online() is True
+    assert await monitor.is_online() is True
+    assert probe.calls == 1
+
+    # A forced check always probes
+    assert await monitor.is_online(force=True) is True
+    assert probe.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_stale_status_is_refreshed():
+    """Test that an expired status triggers a new probe."""
+    probe = FakeProbe()
+    monitor = ConnectivityMonitor(probe=probe, ttl=0)
+
+    await monitor.is_online()
+    await monitor.is_online()
+    assert probe.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_concurrent_checks_share_one_probe():
+    """Test that concurrent callers join the in-flight probe."""
+    probe = FakeProbe(delay=0.05)
+    monitor = ConnectivityMonitor(probe=probe, ttl=60)
+
+    results = await asyncio.gather(*[monitor.is_online() for _ in range(10)])
+
+    assert all(results)
+    assert probe.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_probe_error_means_offline():
+    """Test that a failing probe reports offline."""
+    async def failing_probe():
+        raise RuntimeError("network down")
+
+    monitor = ConnectivityMonitor(probe=failing_probe, ttl=60)
+
+    assert await monitor.is_online() is False
+
+
+@pytest.mark.asyncio
+async def test_subscribers_notified_on_change():
+    """Test that subscribers are called only when the status changes."""
+    probe = FakeProbe()
+    monitor = ConnectivityMonitor(probe=probe, ttl=60)
+    changes = []
+
+    async def on_change(online):
+        changes.append(online)
+
+    monitor.subscribe(on_change)
+
+    await monitor.refresh()
+    await monitor.refresh()
+    probe.online = False
+    await monitor.refresh()
+    probe.online = True
+    await monitor.refresh()
+
+    assert changes == [False, True]
+
+    monitor.unsubscribe(on_change)
+    probe.online = False
+    await monitor.refresh()
+    assert changes == [False, True]
+
+
+@pytest.mark.asyncio
+async def test_wait_for_change_returns_new_status():
+    """Test that a waiter is woken by the background poller."""
+    probe = FakeProbe()
+    monitor = ConnectivityMonitor(probe=probe, ttl=60, poll_interval=0.01)
+
+    try:
+        assert await monitor.wait_for_change(None, timeout=1) is True
+
+        probe.online = False
+        assert await monitor.wait_for_change(True, timeout=1) is False
+
+        # Times out with the unchanged status
+        assert await monitor.wait_for_change(False, timeout=0.05) is False
+    finally:
+        await monitor.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(test_status_is_cached_within_ttl())
+    asyncio.run(test_stale_status_is_refreshed())
+    asyncio.run(test_concurrent_checks_share_one_probe())
+    asyncio.run(test_probe_error_means_offline())
+    asyncio.run(test_subscribers_notified_on_change())
+    asyncio.run(test_wait_for_change_returns_new_status())
+
+    print("All connectivity tests passed!")
@@ -0,0 +1,127 @@
+"""
+Test Embedding Cache
+====================
+
+This module tests the two-tier query embedding cache.
+"""
+
+import os
+import sys
+import asyncio
+import tempfile
+import pytest
+from unittest.mock import patch, MagicMock, AsyncMock
+
+# Add the parent directory to the path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib.embedding_cache import (
+    EmbeddingCache,
+    SqliteEmbeddingStore,
+    make_embedding_key,
+    pack_embedding,
+    unpack_embedding
+)
+from lib.openai_client import generate_embeddings
+
+MODEL = "text-embedding-3-small"
+
+
+@pytest.fixture
+def store():
+    """Temporary SQLite embedding store."""
+    with tempfile.TemporaryDirectory() as directory:
+        store = SqliteEmbeddingStore(os.path.join(directory, "embeddings.sqlite3"))
+        yield store
+        store.close()
+
+
+def test_embeddings_are_packed_as_float32():
+    """Test that vectors round-trip through 4 bytes per dimension."""
+    embedding = [0.25, -1.5, 3.0]
+    data = pack_embedding(embedding)
+
+    assert len(data) == 12
+    assert unpack_embedding(data) == embedding
+
+
+def test_key_normalizes_text_and_includes_model():
+    """Test that case and whitespace do not change the key but the model does."""
+    assert make_embedding_key("Stroke  protocol ", MODEL) == make_embedding_key("stroke protocol", MODEL)
+    assert make_embedding_key("stroke protocol", MODEL) != make_embedding_key("stroke protocol", "other-model")
+
+
+@pytest.mark.asyncio
+async def test_memory_tier_evicts_least_recently_used():
+    """Test LRU eviction in the memory tier."""
+    cache = EmbeddingCache(max_entries=2)
+    await cache.set("a", MODEL, [1.0])
+    await cache.set("b", MODEL, [2.0])
+    await cache.get("a", MODEL)
+    await cache.set("c", MODEL, [3.0])
+
+    assert await cache.get("a", MODEL) == [1.0]
+    assert await cache.get("b", MODEL) is None
+    assert await cache.get("c", MODEL) == [3.0]
+
+
+@pytest.mark.asyncio
+async def test_persistent_tier_survives_restart(store):
+    """Test that a new cache instance is served from the persistent tier."""
+    await EmbeddingCache(store).set("peds epi dose", MODEL, [0.5, 0.25])
+
+    cache = EmbeddingCache(store)
+    assert await cache.get("Peds EPI dose", MODEL) == [0.5, 0.25]
+    assert cache.stats()["store_hits"] == 1
+
+    assert await cache.get("peds epi dose", MODEL) == [0.5, 0.25]
+    assert cache.stats()["memory_hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_share_one_call():
+    """Test that identical concurrent queries make a single API call."""
+    cache = EmbeddingCache()
+    calls = 0
+
+    async def create():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return [1.0, 2.0]
+
+    results = await asyncio.gather(*[
+        cache.get_or_create("stroke protocol", MODEL, create) for _ in range(5)
+    ])
+
+    assert results == [[1.0, 2.0]] * 5
+    assert calls == 1
+    assert cache.stats()["misses"] == 1
+
+
+@pytest.mark.asyncio
+async def test_generate_embeddings_uses_cache():
+    """Test that repeated questions only hit the embeddings API once."""
+    response = MagicMock(data=[MagicMock(embedding=[0.1, 0.2])], usage=None)
+
+    with patch('lib.openai_client.get_embedding_cache', return_value=EmbeddingCache()), \
+         patch('lib.openai_client.client.embeddings.create',
+               new_callable=AsyncMock, return_value=response) as mock_create:
+        first = await generate_embeddings("Stroke protocol")
+        second = await generate_embeddings("stroke  protocol")
+
+        assert first == second == pytest.approx([0.1, 0.2])
+        assert mock_create.call_count == 1
+
+
+if __name__ == "__main__":
+    # Run the sync tests
+    test_embeddings_are_packed_as_float32()
+    test_key_normalizes_text_and_includes_model()
+
+    # Run the async tests
+    asyncio.run(test_memory_tier_evicts_least_recently_used())
+    asyncio.run(test_concurrent_misses_share_one_call())
+    asyncio.run(test_generate_embeddings_uses_cache())
+
+    print("All embedding cache tests passed!")
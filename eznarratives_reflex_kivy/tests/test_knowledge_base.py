@@ -0,0 +1,239 @@
+"""
+Test Knowledge Base Retrieval
+=============================
+
+This module tests loading the knowledge base files and in-memory vector search.
+"""
+
+import os
+import sys
+import json
+import asyncio
+import tempfile
+import numpy as np
+import pytest
+from unittest.mock import patch, AsyncMock
+
+# Add the parent directory to the path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib.chunk_store import ChunkStore, ChunkStoreWriter
+from lib.knowledge_base import (
+    KnowledgeBase,
+    KnowledgeIndex,
+    load_knowledge_base_chunks,
+    build_ems_query
+)
+
+
+def make_chunk(i, source="national-ems-guidelines-chunks"):
+    """Create a test chunk."""
+    return {"content_id": f"{source}-{i}", "title": f"Title {i}", "content": f"Content {i}", "source": source}
+
+
+def guideline_page(guideline, page, body):
+    """Create a national guidelines page with its running header."""
+    header = "National Model EMS Clinical Guidelines \n________________________ Go To TOC \n"
+    return {"title": "NASEMSO", "content": f"{header}Cardiovascular Rev. March 2022 \n{guideline} {page} \nVersion 3.0 \n{body}"}
+
+
+def fake_embedding(text):
+    """Deterministic embedding: one-hot on the trailing digit of the text."""
+    vector = [0.0] * 10
+    vector[int(text.strip()[-1])] = 1.0
+    return vector
+
+
+@pytest.fixture
+def knowledge_dir():
+    """Temporary knowledge base directory with both file formats."""
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.path.join(directory, "ems_guidelines.json"), "w") as f:
+            json.dump({"sections": [
+                guideline_page("Airway Management", 1, "Patient Care Goals \nMaintain a patent airway with airway management 1"),
+                guideline_page("Chest Pain", 2, "Treatment and Interventions \nGive aspirin for ischemic chest pain 2")
+            ]}, f)
+        with open(os.path.join(directory, "South_FL_Regional_ems_protocols.json"), "w") as f:
+            json.dump({"sections": [{"protocols": [{"title": "STROKE", "subsections": [
+                {"title": "EMS", "content": "Stroke assessment with a prehospital scale 3", "chunks": []},
+                {"title": "General Information", "content": "Protocol information not available in detail.", "chunks": []}
+            ]}]}]}, f)
+        yield directory
+
+
+def test_index_search_ranks_by_cosine_similarity():
+    """Test exact top-k search with source filtering and a threshold."""
+    chunks = [make_chunk(0), make_chunk(1), make_chunk(2, "south-fl-regional-protocols")]
+    embeddings = [[1, 0], [0.6, 0.8], [3, 0.3]]
+    index = KnowledgeIndex(chunks, embeddings)
+
+    results = index.search([1, 0], top_k=2, min_similarity=0)
+    assert [chunk["content_id"] for chunk, _ in results] == [
+        "national-ems-guidelines-chunks-0",
+        "south-fl-regional-protocols-2"
+    ]
+    assert results[0][1] == pytest.approx(1.0)
+
+    results = index.search([1, 0], top_k=5, sources=["national-ems-guidelines-chunks"], min_similarity=0.7)
+    assert [chunk["content_id"] for chunk, _ in results] == ["national-ems-guidelines-chunks-0"]
+
+    assert index.search([0, 0]) == []
+
+
+def test_load_knowledge_base_chunks(knowledge_dir):
+    """Test that both file formats are chunked and placeholders are skipped."""
+    chunks = load_knowledge_base_chunks(knowledge_dir)
+
+    assert [chunk["content"] for chunk in chunks] == [
+        "Maintain a patent airway with airway management 1",
+        "Give aspirin for ischemic chest pain 2",
+        "Stroke assessment with a prehospital scale 3"
+    ]
+    assert len({chunk["content_id"] for chunk in chunks}) == 3
+    assert chunks[1]["title"] == "Chest Pain - Treatment and Interventions"
+    assert chunks[1]["provenance"]["pages"] == [2, 2]
+    assert chunks[2]["title"] == "STROKE - EMS"
+
+
+def test_streamed_chunks_match_whole_file_parse():
+    """Test the streaming reader against json.load on the shipped knowledge base."""
+    from lib.json_stream import iter_json_items
+    from lib.knowledge_base import KNOWLEDGE_BASE_DIR
+
+    path = os.path.join(KNOWLEDGE_BASE_DIR, "South_FL_Regional_ems_protocols.json")
+    with open(path, "r", encoding="utf-8") as f:
+        expected = [protocol for section in json.load(f)["sections"] for protocol in section["protocols"]]
+    with open(path, "r", encoding="utf-8") as f:
+        streamed = list(iter_json_items(f, "sections.item.protocols.item", buffer_size=512))
+
+    assert streamed == expected
+
+
+def test_build_ems_query():
+    """Test that the query is built from the clinical fields of the form."""
+    query = build_ems_query({
+        "unit": "Medic 1",
+        "chief_complaint": "Chest pain",
+        "treatment_provided": "",
+        "selected_abnormal_vitals": ["Tachycardia"]
+    })
+
+    assert query == "Chest pain\nAbnormal vitals: Tachycardia"
+
+
+@pytest.mark.asyncio
+async def test_knowledge_base_reuses_stored_embeddings(knowledge_dir):
+    """Test that chunks are embedded once and the stored embeddings are reused."""
+    index_path = os.path.join(knowledge_dir, "index.kbstore")
+    embed_batch = AsyncMock(side_effect=lambda texts: [fake_embedding(text) for text in texts])
+    embed_query = AsyncMock(side_effect=lambda text, user_id=None: fake_embedding(text))
+
+    with patch('lib.knowledge_base.generate_embeddings_batch', embed_batch), \
+         patch('lib.knowledge_base.generate_embeddings', embed_query):
+        knowledge_base = KnowledgeBase(knowledge_dir, index_path)
+        await knowledge_base.build_index()
+        snippets = await knowledge_base.retrieve_snippets("chest pain 2", top_k=1)
+
+        assert snippets == ["Chest Pain - Treatment and Interventions\nGive aspirin for ischemic chest pain 2"]
+        assert embed_batch.call_count == 1
+
+        reloaded = KnowledgeBase(knowledge_dir, index_path)
+        index = await reloaded.build_index()
+
+        assert len(index) == 3
+        assert embed_batch.call_count == 1
+        assert np.allclose(index.matrix, (await knowledge_base.build_index()).matrix)
+
+
+def test_chunk_store_round_trip(knowledge_dir):
+    """Test that chunks and normalized vectors are read back from the mapped file."""
+    path = os.path.join(knowledge_dir, "chunks.kbstore")
+    chunks = [make_chunk(0), make_chunk(1, "south-fl-regional-protocols")]
+    writer = ChunkStoreWriter(path, {"signature": "test"})
+    writer.add(chunks[0], "00" * 32, [3.0, 4.0])
+    writer.add(chunks[1], "11" * 32, [0.0, 2.0])
+    writer.close()
+
+    store = ChunkStore(path)
+    assert len(store) == 2
+    assert list(store) == chunks
+    assert store.metadata == {"signature": "test"}
+    assert np.allclose(store.vectors, [[0.6, 0.8], [0.0, 1.0]])
+    assert store.hash_rows() == {"00" * 32: 0, "11" * 32: 1}
+
+    index = KnowledgeIndex.from_store(store)
+    results = index.search([0, 1], top_k=1, sources=["south-fl-regional-protocols"], min_similarity=0)
+    assert results[0][0] == chunks[1]
+    del index, results
+    store.close()
+
+
+@pytest.mark.asyncio
+async def test_knowledge_base_only_embeds_changed_chunks(knowledge_dir):
+    """Test that editing the knowledge base only re-embeds the edited chunk."""
+    index_path = os.path.join(knowledge_dir, "index.kbstore")
+    embed_batch = AsyncMock(side_effect=lambda texts: [fake_embedding(text) for text in texts])
+
+    with patch('lib.knowledge_base.generate_embeddings_batch', embed_batch):
+        await KnowledgeBase(knowledge_dir, index_path).build_index()
+
+        with open(os.path.join(knowledge_dir, "ems_guidelines.json"), "w") as f:
+            json.dump({"sections": [
+                guideline_page("Airway Management", 1, "Patient Care Goals \nMaintain a patent airway with airway management 4")
+            ]}, f)
+        index = await KnowledgeBase(knowledge_dir, index_path).build_index()
+
+        assert embed_batch.call_args.args[0] == ["Maintain a patent airway with airway management 4"]
+        assert sorted(chunk["content"] for chunk in index.chunks) == [
+            "Maintain a patent airway with airway management 4",
+            "Stroke assessment with a prehospital scale 3"
+        ]
+        assert index.search(fake_embedding("3"), top_k=1)[0][0]["title"] == "STROKE - EMS"
+
+        store = ChunkStore(index_path)
+        assert len(store) == 2
+        store.close()
+
+
+@pytest.mark.asyncio
+async def test_search_does_not_wait_for_the_index(knowledge_dir):
+    """Test that a search before the index is ready builds it in the background."""
+    embed_batch = AsyncMock(side_effect=lambda texts: [fake_embedding(text) for text in texts])
+    embed_query = AsyncMock(side_effect=lambda text, user_id=None: fake_embedding(text))
+
+    with patch('lib.knowledge_base.generate_embeddings_batch', embed_batch), \
+         patch('lib.knowledge_base.generate_embeddings', embed_query):
+        knowledge_base = KnowledgeBase(knowledge_dir, os.path.join(knowledge_dir, "index.kbstore"))
+
+        assert await knowledge_base.search("chest pain 2") == []
+        assert embed_query.call_count == 0
+
+        await knowledge_base._task
+        assert len(await knowledge_base.search("chest pain 2")) == 1
+        await knowledge_base.close()
+
+
+@pytest.mark.asyncio
+async def test_failed_build_backs_off(knowledge_dir):
+    """Test that a failed build is not retried on every search."""
+    embed_batch = AsyncMock(side_effect=RuntimeError("offline"))
+
+    with patch('lib.knowledge_base.generate_embeddings_batch', embed_batch):
+        knowledge_base = KnowledgeBase(knowledge_dir, os.path.join(knowledge_dir, "index.kbstore"))
+
+        with pytest.raises(RuntimeError):
+            await knowledge_base.build_index()
+        assert await knowledge_base.retrieve_snippets("chest pain") == []
+
+        assert knowledge_base._task is None
+        assert embed_batch.call_count == 1
+        assert [name for name in os.listdir(knowledge_dir) if name.endswith(".tmp")] == []
+
+
+if __name__ == "__main__":
+    # Run the sync tests
+    test_index_search_ranks_by_cosine_similarity()
+    test_build_ems_query()
+    test_streamed_chunks_match_whole_file_parse()
+
+    print("All knowledge base tests passed!")
@@ -0,0 +1,174 @@
+"""
+Test Knowledge Base Ingestion
+=============================
+
+This module tests batched embedding and resumable knowledge base ingestion.
+"""
+
+import os
+import sys
+import asyncio
+import tempfile
+import pytest
+from unittest.mock import patch, AsyncMock
+
+# Add the parent directory to the path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib.knowledge_ingest import (
+    IngestCheckpoint,
+    batch_by_tokens,
+    embed_chunks,
+    ingest_knowledge_base,
+    reindex_knowledge_base,
+    content_hash,
+    _encode_vector,
+    _decode_vector
+)
+
+
+def make_chunks(count, size=40):
+    """Create test chunks whose content is ``size`` characters long."""
+    return [
+        {"content_id": f"test-{i}", "title": f"Title {i}", "content": f"{i:04d}".ljust(size, "x"), "source": "test"}
+        for i in range(count)
+    ]
+
+
+class FakeEmbedder:
+    """Fake batch embedder that tracks concurrency and can fail once."""
+
+    def __init__(self, fail_on_call=None):
+        self.fail_on_call = fail_on_call
+        self.calls = 0
+        self.in_flight = 0
+        self.peak = 0
+
+    async def __call__(self, texts):
+        self.calls += 1
+        call = self.calls
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(0.01)
+            if call == self.fail_on_call:
+                raise RuntimeError("rate limited")
+            return [[float(text[:4])] for text in texts]
+        finally:
+            self.in_flight -= 1
+
+
+@pytest.fixture
+def checkpoint_path():
+    """Temporary checkpoint database path."""
+    with tempfile.TemporaryDirectory() as directory:
+        yield os.path.join(directory, "checkpoint.sqlite3")
+
+
+def test_batches_are_bounded_by_tokens_and_inputs():
+    """Test token-aware batch sizing."""
+    # Each 40-character chunk is estimated at 11 tokens
+    batches = batch_by_tokens(make_chunks(10), max_tokens=35, max_inputs=100)
+    assert [len(batch) for batch in batches] == [3, 3, 3, 1]
+
+    batches = batch_by_tokens(make_chunks(10), max_tokens=10000, max_inputs=4)
+    assert [len(batch) for batch in batches] == [4, 4, 2]
+
+
+@pytest.mark.asyncio
+async def test_embed_chunks_runs_batches_concurrently_in_order():
+    """Test that batches overlap but embeddings keep the chunk order."""
+    embedder = FakeEmbedder()
+    chunks = make_chunks(20, size=100000)
+
+    embeddings = await embed_chunks(chunks, concurrency=3, embed=embedder)
+
+    assert embeddings == [[float(i)] for i in range(20)]
+    assert embedder.peak == 3
+
+
+@pytest.mark.asyncio
+async def test_ingestion_resumes_from_checkpoint(checkpoint_path):
+    """Test that an interrupted ingestion only redoes the missing batches."""
+    chunks = make_chunks(8, size=200000)
+    written = []
+
+    async def writer(batch, embeddings):
+        written.extend(chunk["content_id"] for chunk in batch)
+
+    with pytest.raises(RuntimeError):
+        await ingest_knowledge_base(
+            chunks, checkpoint_path, concurrency=1, writer=writer, embed=FakeEmbedder(fail_on_call=3)
+        )
+    assert len(written) == 7
+
+    embedder = FakeEmbedder()
+    stats = await ingest_knowledge_base(chunks, checkpoint_path, concurrency=1, writer=writer, embed=embedder)
+
+    assert stats["skipped"] == 7
+    assert stats["embedded"] == 1
+    assert embedder.calls == 1
+    assert sorted(written) == sorted(chunk["content_id"] for chunk in chunks)
+
+    checkpoint = IngestCheckpoint(checkpoint_path)
+    assert checkpoint.completed() == {}
+    checkpoint.close()
+
+
+@pytest.mark.asyncio
+async def test_reindex_only_embeds_changed_chunks_and_deletes_removed():
+    """Test incremental re-indexing against the stored content hashes."""
+    chunks = make_chunks(4)
+    changed = dict(chunks[1], content="0001 updated")
+    stored = {
+        "test-0": content_hash(chunks[0]),
+        "test-1": content_hash(chunks[1]),
+        "test-2": content_hash(chunks[2]),
+        "test-9": "removed"
+    }
+    written = []
+
+    async def writer(batch, embeddings):
+        written.extend(chunk["content_id"] for chunk in batch)
+
+    embedder = FakeEmbedder()
+    with patch('lib.knowledge_ingest.fetch_content_hashes', AsyncMock(return_value=stored)) as fetch, \
+         patch('lib.knowledge_ingest.copy_embeddings', writer), \
+         patch('lib.knowledge_ingest.delete_embeddings', AsyncMock()) as delete:
+        stats = await reindex_knowledge_base([chunks[0], changed, chunks[2], chunks[3]], embed=embedder)
+
+    fetch.assert_awaited_once_with(["test"])
+    assert sorted(written) == ["test-1", "test-3"]
+    delete.assert_awaited_once_with(["test-9"])
+    assert stats["unchanged"] == 2
+    assert stats["embedded"] == 2
+    assert stats["deleted"] == 1
+
+
+def test_content_hash_includes_chunker_version():
+    """Test that bumping the chunker version changes every hash."""
+    chunk = make_chunks(1)[0]
+    original = content_hash(chunk)
+    with patch('lib.knowledge_ingest.CHUNKER_VERSION', "test"):
+        assert content_hash(chunk) != original
+    assert content_hash(dict(chunk, content_id="other")) == original
+
+
+def test_vector_binary_format():
+    """Test the pgvector binary encoding used for COPY."""
+    data = _encode_vector([1.0, -0.5])
+
+    assert data[:4] == b"\x00\x02\x00\x00"
+    assert _decode_vector(data) == [1.0, -0.5]
+
+
+if __name__ == "__main__":
+    # Run the sync tests
+    test_batches_are_bounded_by_tokens_and_inputs()
+    test_vector_binary_format()
+    test_content_hash_includes_chunker_version()
+
+    # Run the async tests
+    asyncio.run(test_embed_chunks_runs_batches_concurrently_in_order())
+
+    print("All knowledge base ingestion tests passed!")
@@ -0,0 +1,168 @@
+"""
+Test LLM Admission Controller
+=============================
+
+This module tests concurrency, fairness and budget limits for LLM calls.
+"""
+
+import os
+import sys
+import asyncio
+import pytest
+
+# Add the parent directory to the path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib.llm_limiter import AdmissionController, AdmissionTimeout, estimate_tokens
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_bounded():
+    """Test that no more than max_concurrency calls run at once."""
+    controller = AdmissionController(max_concurrency=3, requests_per_minute=0, tokens_per_minute=0)
+    running = 0
+    peak = 0
+
+    async def call():
+        nonlocal running, peak
+        async with controller.admit("user-1"):
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+    await asyncio.gather(*[call() for _ in range(10)])
+
+    assert peak == 3
+    stats = controller.stats()
+    assert stats["admitted"] == 10
+    assert stats["in_flight"] == 0
+    assert stats["queue_depth"] == 0
+
+
+@pytest.mark.asyncio
+async def test_waiting_users_are_served_in_turn():
+    """Test that a burst from one user does not starve another user."""
+    controller = AdmissionController(max_concurrency=1, requests_per_minute=0, tokens_per_minute=0)
+    order = []
+
+    blocker = await controller.acquire("busy")
+
+    async def call(user_id):
+        async with controller.admit(user_id):
+            order.append(user_id)
+
+    tasks = [asyncio.ensure_future(call("busy")) for _ in range(3)]
+    await asyncio.sleep(0)
+    tasks.append(asyncio.ensure_future(call("quiet")))
+    await asyncio.sleep(0)
+
+    assert controller.stats()["queue_depth"] == 4
+    assert controller.stats()["waiting_users"] == 2
+
+    blocker.release()
+    await asyncio.gather(*tasks)
+
+    assert order == ["busy", "quiet", "busy", "busy"]
+
+
+@pytest.mark.asyncio
+async def test_request_budget_delays_admission():
+    """Test that calls wait for the per-minute request budget to refill."""
+    # 600 RPM refills one request every 0.1s
+    controller = AdmissionController(max_concurrency=10, requests_per_minute=600, tokens_per_minute=0)
+    controller._requests.level = 1
+
+    async with controller.admit():
+        pass
+
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    async with controller.admit():
+        pass
+
+    assert loop.time() - start >= 0.05
+    assert controller.stats()["max_wait_ms"] > 0
+
+
+@pytest.mark.asyncio
+async def test_token_budget_is_settled_with_actual_usage():
+    """Test that unused estimated tokens are refunded."""
+    controller = AdmissionController(max_concurrency=10, requests_per_minute=0, tokens_per_minute=1000)
+
+    async with controller.admit(tokens=800) as permit:
+        assert controller.stats()["tokens_available"] < 300
+        permit.settle(100)
+
+    assert controller.stats()["tokens_available"] >= 900
+
+
+@pytest.mark.asyncio
+async def test_admission_timeout():
+    """Test that a call gives up when it cannot be admitted in time."""
+    controller = AdmissionController(max_concurrency=1, requests_per_minute=0, tokens_per_minute=0)
+    permit = await controller.acquire()
+
+    with pytest.raises(AdmissionTimeout):
+        await controller.acquire(timeout=0.01)
+
+    stats = controller.stats()
+    assert stats["timeouts"] == 1
+    assert stats["queue_depth"] == 0
+
+    permit.release()
+    assert controller.stats()["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_timeout_admits_the_next_waiter():
+    """Test that a waiter giving up lets the waiters behind it in."""
+    controller = AdmissionController(max_concurrency=10, requests_per_minute=0, tokens_per_minute=1000)
+    controller._tokens.level = 100
+
+    # The large call would wait most of a minute for its tokens
+    large = asyncio.ensure_future(controller.acquire("busy", tokens=900, timeout=0.05))
+    await asyncio.sleep(0)
+    small = await controller.acquire("quiet", tokens=50, timeout=1)
+
+    with pytest.raises(AdmissionTimeout):
+        await large
+    small.release()
+    assert controller.stats()["queue_depth"] == 0
+
+
+@pytest.mark.asyncio
+async def test_try_acquire_never_queues():
+    """Test that optional calls are only admitted when there is spare capacity."""
+    controller = AdmissionController(max_concurrency=1, requests_per_minute=0, tokens_per_minute=0)
+
+    permit = controller.try_acquire()
+    assert permit is not None
+    assert controller.try_acquire() is None
+
+    permit.release()
+    assert controller.stats()["in_flight"] == 0
+
+
+def test_estimate_tokens():
+    """Test the rough token estimate."""
+    messages = [{"role": "user", "content": "x" * 400}]
+
+    assert estimate_tokens(messages, max_tokens=1000) == 1101
+    assert estimate_tokens(text="x" * 40) == 11
+
+
+if __name__ == "__main__":
+    # Run the async tests
+    asyncio.run(test_concurrency_is_bounded())
+    asyncio.run(test_waiting_users_are_served_in_turn())
+    asyncio.run(test_request_budget_delays_admission())
+    asyncio.run(test_token_budget_is_settled_with_actual_usage())
+    asyncio.run(test_admission_timeout())
+    asyncio.run(test_timeout_admits_the_next_waiter())
+    asyncio.run(test_try_acquire_never_queues())
+
+    # Run the sync tests
+    test_estimate_tokens()
+
+    print("All LLM limiter tests passed!")
@@ -0,0 +1,181 @@
+"""
+Test OpenAI Retry Policy
+========================
+
+This module tests retries, the retry budget and the circuit breaker.
+"""
+
+import os
+import sys
+import asyncio
+import httpx
+import openai
+import pytest
+
+# Add the parent directory to the path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib.llm_retry import (
+    RetryPolicy,
+    RetryBudget,
+    CircuitBreaker,
+    CircuitOpenError,
+    is_retryable,
+    retry_after
+)
+
+
+def make_status_error(status, headers=None, error_class=openai.APIStatusError):
+    """Create an OpenAI status error with the given status and headers."""
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    response = httpx.Response(status, headers=headers or {}, request=request)
+    return error_class("error", response=response, body=None)
+
+
+class FlakyCall:
+    """Callable that fails a number of times before succeeding."""
+
+    def __init__(self, failures, error):
+        self.failures = failures
+        self.error = error
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise self.error
+        return "ok"
+
+
+def test_is_retryable():
+    """Test which errors are treated as transient."""
+    assert is_retryable(make_status_error(429, error_class=openai.RateLimitError))
+    assert is_retryable(make_status_error(503))
+    assert is_retryable(openai.APIConnectionError(request=httpx.Request("POST", "https://x")))
+    assert not is_retryable(make_status_error(400, error_class=openai.BadRequestError))
+    assert not is_retryable(ValueError("bad input"))
+
+
+def test_retry_after_header():
+    """Test that Retry-After is read in milliseconds or seconds."""
+    assert retry_after(make_status_error(429, {"retry-after-ms": "250"})) == 0.25
+    assert retry_after(make_status_error(429, {"retry-after": "2"})) == 2.0
+    assert retry_after(make_status_error(429)) is None
+
+
+@pytest.mark.asyncio
+async def test_transient_failures_are_retried():
+    """Test that transient failures are retried until success."""
+    policy = RetryPolicy(max_retries=3, base_delay=0.001)
+    call = FlakyCall(2, make_status_error(503))
+
+    assert await policy.call(call) == "ok"
+    assert call.calls == 3
+    assert policy.stats()["retries"] == 2
+
+
+@pytest.mark.asyncio
+async def test_retry_after_is_honored():
+    """Test that the server-requested delay is used."""
+    policy = RetryPolicy(max_retries=1, base_delay=10)
+    call = FlakyCall(1, make_status_error(429, {"retry-after-ms": "20"}, openai.RateLimitError))
+
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    assert await policy.call(call) == "ok"
+
+    assert 0.015 <= loop.time() - start < 1
+
+
+@pytest.mark.asyncio
+async def test_client_errors_are_not_retried():
+    """Test that non-transient errors are raised immediately."""
+    policy = RetryPolicy(max_retries=3, base_delay=0.001)
+    call = FlakyCall(1, make_status_error(400, error_class=openai.BadRequestError))
+
+    with pytest.raises(openai.BadRequestError):
+        await policy.call(call)
+    assert call.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_retry_budget_limits_retries():
+    """Test that retries stop once the budget is spent."""
+    policy = RetryPolicy(
+        max_retries=5,
+        base_delay=0.001,
+        budget=RetryBudget(ratio=0, min_retries=2),
+        breaker=CircuitBreaker(failure_threshold=100)
+    )
+    call = FlakyCall(10, make_status_error(503))
+
+    with pytest.raises(openai.APIStatusError):
+        await policy.call(call)
+
+    assert call.calls == 3
+    assert policy.stats()["budget_exhausted"] == 1
+
+
+@pytest.mark.asyncio
+async def test_circuit_breaker_fails_fast_and_recovers():
+    """Test that the circuit opens after repeated failures and closes after a good trial."""
+    breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=0.05)
+    policy = RetryPolicy(max_retries=0, breaker=breaker)
+    failing = FlakyCall(100, make_status_error(503))
+
+    for _ in range(2):
+        with pytest.raises(openai.APIStatusError):
+            await policy.call(failing)
+
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        await policy.call(failing)
+    assert failing.calls == 2
+
+    await asyncio.sleep(0.06)
+    assert await policy.call(FlakyCall(0, None)) == "ok"
+    assert breaker.state == "closed"
+
+
+@pytest.mark.asyncio
+async def test_rate_limits_do_not_open_the_circuit():
+    """Test that a run of 429s backs off without opening the circuit."""
+    breaker = CircuitBreaker(failure_threshold=2)
+    policy = RetryPolicy(max_retries=0, breaker=breaker)
+    rate_limited = FlakyCall(100, make_status_error(429, error_class=openai.RateLimitError))
+
+    for _ in range(5):
+        with pytest.raises(openai.RateLimitError):
+            await policy.call(rate_limited)
+
+    assert breaker.state == "closed"
+    assert breaker.failures == 0
+    assert rate_limited.calls == 5
+
+
+@pytest.mark.asyncio
+async def test_long_retry_after_is_not_cut_short():
+    """Test that a Retry-After beyond the maximum delay is not retried early."""
+    policy = RetryPolicy(max_retries=3, max_delay=1)
+    call = FlakyCall(1, make_status_error(429, {"retry-after": "30"}, openai.RateLimitError))
+
+    with pytest.raises(openai.RateLimitError):
+        await policy.call(call)
+    assert call.calls == 1
+
+
+if __name__ == "__main__":
+    # Run the sync tests
+    test_is_retryable()
+    test_retry_after_header()
+
+    # Run the async tests
+    asyncio.run(test_transient_failures_are_retried())
+    asyncio.run(test_retry_after_is_honored())
+    asyncio.run(test_client_errors_are_not_retried())
+    asyncio.run(test_retry_budget_limits_retries())
+    asyncio.run(test_circuit_breaker_fails_fast_and_recovers())
+    asyncio.run(test_rate_limits_do_not_open_the_circuit())
+    asyncio.run(test_long_retry_after_is_not_cut_short())
+
+    print("All retry tests passed!")
@@ -0,0 +1,140 @@
+"""
+Test Narrative Cache
+====================
+
+This module tests the narrative response cache.
+"""
+
+import os
+import sys
+import pytest
+import asyncio
+from unittest.mock import patch, AsyncMock, MagicMock
+from dotenv import load_dotenv
+
+# Add the parent directory to the path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Load environment variables
+load_dotenv(".env.local")
+
+from lib.narrative_cache import MemoryNarrativeCache, make_cache_key
+from lib.openai_client import generate_ems_narrative, stream_fire_narrative
+
+
+def _key(form_data, **overrides):
+    args = {"model": "gpt-4.1-nano", "temperature": 0.7, "prompt_version": "1"}
+    args.update(overrides)
+    return make_cache_key("ems", form_data, **args)
+
+
+def test_cache_key_ignores_volatile_fields():
+    """Test that timestamp, whitespace and multi-select order do not change the key."""
+    first = {
+        "unit": "Medic 1",
+        "patient_presentation": "Patient found  sitting upright ",
+        "selected_abnormal_vitals": ["Hypertensive", "Tachycardic"],
+        "timestamp": "2025-01-01 10:00:00"
+    }
+    second = {
+        "unit": "Medic 1",
+        "patient_presentation": "Patient found sitting upright",
+        "selected_abnormal_vitals": ["Tachycardic", "Hypertensive"],
+        "timestamp": "2025-01-01 10:05:00"
+    }
+    
+    assert _key(first) == _key(second)
+
+
+def test_cache_key_keeps_ordered_lists():
+    """Test that the order of lists other than multi-select fields changes the key."""
+    first = {"unit": "Medic 1", "interventions": ["IV access", "Oxygen"]}
+    second = {"unit": "Medic 1", "interventions": ["Oxygen", "IV access"]}
+    
+    assert _key(first) != _key(second)
+
+
+def test_cache_key_includes_model_settings():
+    """Test that model, temperature and prompt version are part of the key."""
+    form_data = {"unit": "Medic 1"}
+    
+    assert _key(form_data) != _key(form_data, model="gpt-4.1-mini")
+    assert _key(form_data) != _key(form_data, temperature=0.2)
+    assert _key(form_data) != _key(form_data, prompt_version="2")
+    assert _key({"unit": "Medic 1"}) != _key({"unit": "Medic 2"})
+
+
+@pytest.mark.asyncio
+async def test_memory_cache_lru_eviction():
+    """Test that the least recently used entry is evicted first."""
+    cache = MemoryNarrativeCache(max_entries=2, ttl=60)
+    await cache.set("a", "A")
+    await cache.set("b", "B")
+    
+    # Touch "a" so "b" becomes the eviction candidate
+    assert await cache.get("a") == "A"
+    await cache.set("c", "C")
+    
+    assert await cache.get("a") == "A"
+    assert await cache.get("b") is None
+    assert await cache.get("c") == "C"
+
+
+@pytest.mark.asyncio
+async def test_memory_cache_ttl():
+    """Test that expired entries are not returned."""
+    cache = MemoryNarrativeCache(max_entries=10, ttl=0)
+    await cache.set("a", "A")
+    await asyncio.sleep(0.01)
+    
+    assert await cache.get("a") is None
+
+
+@pytest.mark.asyncio
+async def test_generate_uses_cache():
+    """Test that a repeated request is served from the cache."""
+    response = MagicMock()
+    response.choices = [MagicMock(message=MagicMock(content="EMS NARRATIVE"))]
+    
+    with patch('lib.narrative_cache._cache', MemoryNarrativeCache()):
+        with patch('lib.openai_client.client.chat.completions.create',
+                   new_callable=AsyncMock, return_value=response) as mock_create:
+            first = await generate_ems_narrative({"unit": "Medic 1", "timestamp": "10:00"})
+            second = await generate_ems_narrative({"unit": "Medic 1", "timestamp": "10:01"})
+            
+            assert first == second == "EMS NARRATIVE"
+            assert mock_create.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_stream_cache_hit_yields_once():
+    """Test that a cached streaming request yields the full narrative at once."""
+    with patch('lib.narrative_cache._cache', MemoryNarrativeCache()):
+        with patch('lib.openai_client._stream_completion') as mock_stream:
+            async def deltas(*args, **kwargs):
+                for delta in ["FIRE ", "REPORT"]:
+                    yield delta
+            mock_stream.side_effect = deltas
+            
+            first = [delta async for delta in stream_fire_narrative({"unit": "Engine 3"})]
+            second = [delta async for delta in stream_fire_narrative({"unit": "Engine 3"})]
+            
+            assert first == ["FIRE ", "REPORT"]
+            assert second == ["FIRE REPORT"]
+            assert mock_stream.call_count == 1
+
+
+if __name__ == "__main__":
+    # Run the sync tests
+    test_cache_key_ignores_volatile_fields()
+    test_cache_key_keeps_ordered_lists()
+    test_cache_key_includes_model_settings()
+    
+    # Run the async tests
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(test_memory_cache_lru_eviction())
+    loop.run_until_complete(test_memory_cache_ttl())
+    loop.run_until_complete(test_generate_uses_cache())
+    loop.run_until_complete(test_stream_cache_hit_yields_once())
+    
+    print("All narrative cache tests passed!")
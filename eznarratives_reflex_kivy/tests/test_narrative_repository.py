@@ -0,0 +1,171 @@
+"""
+Test Narrative Repository
+=========================
+
+This module tests write-behind narrative persistence with a fake writer.
+"""
+
+import os
+import sys
+import asyncio
+import tempfile
+import pytest
+from unittest.mock import MagicMock, patch
+
+# Add the parent directory to the path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib.outbox import Outbox
+from lib.narrative_repository import NarrativeRepository, _default_writer
+
+
+class FakeWriter:
+    """Fake bulk writer that records batches and can reject rows."""
+
+    def __init__(self, delay=0.0, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.batches = []
+
+    async def __call__(self, rows):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.batches.append([dict(row) for row in rows])
+        if self.fail:
+            return [{"id": None, "error": "offline"} for _ in rows]
+        return [{"id": row["id"], "error": None} for row in rows]
+
+
+@pytest.fixture
+def outbox():
+    """Temporary outbox."""
+    with tempfile.TemporaryDirectory() as directory:
+        outbox = Outbox(os.path.join(directory, "outbox.sqlite3"))
+        yield outbox
+        outbox.close()
+
+
+@pytest.mark.asyncio
+async def test_save_returns_before_write(outbox):
+    """Test that save returns an id immediately and writes in the background."""
+    writer = FakeWriter()
+    repository = NarrativeRepository(writer=writer, outbox=outbox, flush_interval=0.01)
+    narrative = {"title": "EMS Narrative", "content": "Text"}
+
+    narrative_id = await repository.save("ems", narrative, user_id="user-1")
+
+    assert narrative_id
+    assert writer.batches == []
+    assert "id" not in narrative
+
+    await asyncio.sleep(0.05)
+
+    assert len(writer.batches) == 1
+    row = writer.batches[0][0]
+    assert row["id"] == narrative_id
+    assert row["idempotency_key"] == narrative_id
+    assert row["type"] == "ems"
+    assert row["user_id"] == "user-1"
+
+
+@pytest.mark.asyncio
+async def test_writes_are_batched_and_coalesced(outbox):
+    """Test that pending writes go out together and repeated saves of one narrative merge."""
+    writer = FakeWriter()
+    repository = NarrativeRepository(writer=writer, outbox=outbox, flush_interval=0.05)
+
+    first = await repository.save("ems", {"content": "Draft"})
+    await repository.save("ems", {"content": "Final"}, narrative_id=first)
+    await repository.save("fire", {"content": "Fire"})
+
+    assert repository.pending == 2
+
+    await repository.close()
+
+    assert len(writer.batches) == 1
+    contents = [row["content"] for row in writer.batches[0]]
+    assert contents == ["Final", "Fire"]
+
+
+@pytest.mark.asyncio
+async def test_full_queue_spills_to_outbox(outbox):
+    """Test that a full queue applies backpressure and then spills to the outbox."""
+    writer = FakeWriter()
+    repository = NarrativeRepository(
+        writer=writer,
+        outbox=outbox,
+        max_pending=1,
+        flush_interval=10,
+        enqueue_timeout=0.01
+    )
+
+    await repository.save("ems", {"content": "One"})
+    await repository.save("ems", {"content": "Two"})
+
+    assert repository.pending == 1
+    assert outbox.count("ems_narrative") == 1
+    assert repository.spilled == 1
+
+    await repository.close()
+
+
+@pytest.mark.asyncio
+async def test_failed_and_offline_writes_are_replayed(outbox):
+    """Test that failed and offline writes go to the outbox and are replayed."""
+    writer = FakeWriter(fail=True)
+    repository = NarrativeRepository(writer=writer, outbox=outbox, flush_interval=0)
+
+    await repository.save("ems", {"content": "Online"})
+    await repository.flush()
+    await repository.save("fire", {"content": "Offline"}, offline=True)
+
+    assert outbox.count() == 2
+
+    writer.fail = False
+    sent = await repository.replay(user_id="user-1")
+
+    assert sent == 2
+    assert outbox.count() == 0
+    replayed = writer.batches[-2:]
+    assert [batch[0]["type"] for batch in replayed] == ["ems", "fire"]
+
+
+@pytest.mark.asyncio
+async def test_default_writer_with_sync_client(outbox):
+    """Test the real Supabase write path against a synchronous client."""
+    upserts = []
+
+    def upsert(rows, **kwargs):
+        upserts.append(list(rows))
+        query = MagicMock()
+        # Like supabase-py's sync client, execute() returns the response itself
+        query.execute = lambda: MagicMock(data=[dict(row) for row in rows])
+        return query
+
+    table = MagicMock()
+    table.upsert.side_effect = upsert
+    repository = NarrativeRepository(writer=_default_writer, outbox=outbox, flush_interval=60)
+
+    with patch("lib.supabase.supabase") as mock_supabase:
+        mock_supabase.from_.return_value = table
+        narrative_id = await repository.save("ems", {"content": "Text"}, user_id="user-1")
+        await repository.close()
+
+    assert [row["id"] for batch in upserts for row in batch] == [narrative_id]
+    assert repository.written == 1
+    assert repository.spilled == 0
+    assert outbox.count() == 0
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as directory:
+        for i, test in enumerate([
+            test_save_returns_before_write,
+            test_writes_are_batched_and_coalesced,
+            test_full_queue_spills_to_outbox,
+            test_failed_and_offline_writes_are_replayed,
+            test_default_writer_with_sync_client
+        ]):
+            asyncio.run(test(Outbox(os.path.join(directory, f"{i}.sqlite3"))))
+
+    print("All narrative repository tests passed!")
@@ -9,7 +9,7 @@ import os
 import sys
 import pytest
 import asyncio
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
 from dotenv import load_dotenv
 
 # Add the parent directory to the path so we can import our modules
@@ -18,7 +18,27 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 # Load environment variables
 load_dotenv(".env.local")
 
-from lib.openai_client import generate_ems_narrative, generate_fire_narrative
+from lib.openai_client import (
+    generate_ems_narrative,
+    generate_fire_narrative,
+    stream_ems_narrative,
+    coalesce_deltas,
+    compact_form_data,
+    pack_snippets,
+    prompt_stats,
+    _build_ems_messages,
+    HedgeTracker
+)
+from lib.llm_limiter import estimate_tokens
+from lib.narrative_cache import MemoryNarrativeCache
+from lib.llm_limiter import llm_limiter
+
+
+@pytest.fixture(autouse=True)
+def fresh_narrative_cache():
+    """Give each test an empty narrative cache."""
+    with patch('lib.narrative_cache._cache', MemoryNarrativeCache()):
+        yield
 
 
 class MockResponse:
@@ -28,6 +48,26 @@ class MockResponse:
         self.choices = [MagicMock(message=MagicMock(content=content))]
 
 
+class MockStream:
+    """Mock streaming response for OpenAI API calls."""
+    
+    def __init__(self, deltas, delay=0):
+        self.deltas = deltas
+        self.delay = delay
+        self.closed = False
+    
+    def __aiter__(self):
+        return self._iterate()
+    
+    async def _iterate(self):
+        await asyncio.sleep(self.delay)
+        for delta in self.deltas:
+            yield MagicMock(choices=[MagicMock(delta=MagicMock(content=delta))])
+    
+    async def close(self):
+        self.closed = True
+
+
 @pytest.mark.asyncio
 async def test_generate_ems_narrative():
     """Test generating an EMS narrative."""
@@ -79,7 +119,7 @@ Patient transported to Memorial Hospital in position of comfort.
     
     # Mock the OpenAI client
     with patch('lib.openai_client.client.chat.completions.create', 
-               return_value=MockResponse(expected_narrative)):
+               new_callable=AsyncMock, return_value=MockResponse(expected_narrative)):
         # Generate the narrative
         narrative = await generate_ems_narrative(form_data)
         
@@ -117,7 +157,7 @@ No civilian or firefighter injuries reported.
     
     # Mock the OpenAI client
     with patch('lib.openai_client.client.chat.completions.create', 
-               return_value=MockResponse(expected_narrative)):
+               new_callable=AsyncMock, return_value=MockResponse(expected_narrative)):
         # Generate the narrative
         narrative = await generate_fire_narrative(form_data)
         
@@ -129,10 +169,190 @@ No civilian or firefighter injuries reported.
         assert "defensive attack" in narrative
 
 
+@pytest.mark.asyncio
+async def test_concurrent_narratives_do_not_serialize():
+    """Test that concurrent generations overlap on the shared async client."""
+    async def slow_create(*args, **kwargs):
+        await asyncio.sleep(0.2)
+        return MockResponse("narrative")
+    
+    with patch('lib.openai_client.client.chat.completions.create', side_effect=slow_create):
+        start = asyncio.get_event_loop().time()
+        results = await asyncio.gather(*[
+            generate_fire_narrative({"unit": f"Engine {i}"}) for i in range(10)
+        ])
+        elapsed = asyncio.get_event_loop().time() - start
+        
+        assert results == ["narrative"] * 10
+        # Ten serialized calls would take ~2s
+        assert elapsed < 1.0
+
+
+@pytest.mark.asyncio
+async def test_stream_ems_narrative():
+    """Test streaming an EMS narrative delta by delta."""
+    stream = MockStream(["EMS ", None, "NARRATIVE ", "REPORT"])
+    
+    with patch('lib.openai_client.client.chat.completions.create',
+               new_callable=AsyncMock, return_value=stream) as mock_create:
+        deltas = [delta async for delta in stream_ems_narrative({"unit": "Medic 1"})]
+        
+        assert deltas == ["EMS ", "NARRATIVE ", "REPORT"]
+        assert mock_create.call_args.kwargs["stream"] is True
+        assert stream.closed
+
+
+@pytest.mark.asyncio
+async def test_coalesce_deltas():
+    """Test that deltas are merged between flushes without losing text."""
+    async def deltas():
+        for token in ["a", "b", "c", "d"]:
+            yield token
+    
+    # First delta is flushed immediately, the rest are held until the end
+    chunks = [chunk async for chunk in coalesce_deltas(deltas(), interval=60)]
+    assert chunks == ["a", "bcd"]
+    
+    # A zero interval passes every delta through
+    chunks = [chunk async for chunk in coalesce_deltas(deltas(), interval=0)]
+    assert chunks == ["a", "b", "c", "d"]
+
+
+@pytest.mark.asyncio
+async def test_coalesce_deltas_closes_source_early():
+    """Test that stopping a coalesced stream early closes the source stream."""
+    closed = []
+    
+    async def deltas():
+        try:
+            for token in ["a", "b", "c", "d"]:
+                yield token
+        finally:
+            closed.append(True)
+    
+    stream = coalesce_deltas(deltas(), interval=0)
+    async for chunk in stream:
+        break
+    await stream.aclose()
+    
+    assert closed == [True]
+
+
+@pytest.mark.asyncio
+async def test_hedged_stream_uses_faster_request():
+    """Test that a slow stream is hedged and the loser is closed."""
+    slow = MockStream(["slow"], delay=1)
+    fast = MockStream(["fast ", "narrative"])
+    tracker = HedgeTracker(min_samples=5, default_delay=0.05)
+    
+    with patch('lib.openai_client.hedge_tracker', tracker), \
+         patch('lib.openai_client.client.chat.completions.create',
+               new_callable=AsyncMock, side_effect=[slow, fast]) as mock_create:
+        start = asyncio.get_event_loop().time()
+        deltas = [delta async for delta in stream_ems_narrative({"unit": "Medic 1"}, hedge=True)]
+        elapsed = asyncio.get_event_loop().time() - start
+        
+        assert deltas == ["fast ", "narrative"]
+        assert mock_create.call_count == 2
+        assert elapsed < 0.5
+        assert slow.closed and fast.closed
+        assert tracker.stats()["hedge_wins"] == 1
+        assert llm_limiter.stats()["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_hedge_skipped_without_spare_capacity():
+    """Test that no hedge is sent when the limiter has no spare capacity."""
+    slow = MockStream(["slow"], delay=0.1)
+    tracker = HedgeTracker(min_samples=5, default_delay=0.01)
+    
+    with patch('lib.openai_client.hedge_tracker', tracker), \
+         patch.object(llm_limiter, 'try_acquire', return_value=None), \
+         patch('lib.openai_client.client.chat.completions.create',
+               new_callable=AsyncMock, return_value=slow) as mock_create:
+        narrative = await generate_fire_narrative({"unit": "Engine 1"}, hedge=True)
+        
+        assert narrative == "slow"
+        assert mock_create.call_count == 1
+        assert tracker.stats()["skipped"] == 1
+        assert tracker.stats()["samples"] == 1
+
+
+def test_hedge_delay_percentile():
+    """Test that the hedge delay follows the latency percentile."""
+    tracker = HedgeTracker(percentile=90, min_samples=10, default_delay=3)
+    assert tracker.delay() == 3
+    
+    for i in range(1, 101):
+        tracker.record(i / 100)
+    
+    assert tracker.delay() == 0.91
+
+
+def test_compact_form_data_strips_empty_fields():
+    """Test that empty answers are dropped but False and 0 are kept."""
+    form_data = {
+        "unit": " Medic 1 ",
+        "duration": "",
+        "medications": [],
+        "notes": None,
+        "vital_signs_normal": False,
+        "gcs_score": 0,
+        "selected_abnormal_vitals": ["Tachycardic", ""],
+        "history": {"allergies": "", "cardiac": True}
+    }
+    
+    assert compact_form_data(form_data) == {
+        "unit": "Medic 1",
+        "vital_signs_normal": False,
+        "gcs_score": 0,
+        "selected_abnormal_vitals": ["Tachycardic"],
+        "history": {"cardiac": True}
+    }
+
+
+def test_pack_snippets_fills_budget_by_relevance():
+    """Test that snippets that do not fit are skipped in favor of later ones."""
+    snippets = ["a" * 400, "b" * 800, "c" * 200, "d" * 400]
+    
+    # About 101, 201, 51 and 101 tokens each
+    assert pack_snippets(snippets, 160) == ["a" * 400, "c" * 200]
+    assert pack_snippets(snippets, 0) == []
+
+
+def test_ems_prompt_stays_within_budget():
+    """Test that the EMS prompt is compact and bounded by the token budget."""
+    form_data = {"unit": "Medic 1", "chief_complaint": "Chest pain", "duration": ""}
+    snippets = [f"Protocol {i}\n" + "x" * 1000 for i in range(10)]
+    
+    messages = _build_ems_messages(form_data, snippets, budget=1000)
+    
+    assert estimate_tokens(messages) <= 1000
+    assert '{"unit":"Medic 1","chief_complaint":"Chest pain"}' in messages[1]["content"]
+    assert "Protocol 0" in messages[1]["content"]
+    assert "Protocol 9" not in messages[1]["content"]
+    assert prompt_stats.stats()["last_prompt_tokens"] == estimate_tokens(messages)
+    
+    messages = _build_ems_messages(form_data, snippets, budget=10)
+    assert "Reference Materials" not in messages[1]["content"]
+
+
 if __name__ == "__main__":
     # Run the async tests
     loop = asyncio.get_event_loop()
     loop.run_until_complete(test_generate_ems_narrative())
     loop.run_until_complete(test_generate_fire_narrative())
+    loop.run_until_complete(test_concurrent_narratives_do_not_serialize())
+    loop.run_until_complete(test_stream_ems_narrative())
+    loop.run_until_complete(test_coalesce_deltas())
+    loop.run_until_complete(test_coalesce_deltas_closes_source_early())
+    loop.run_until_complete(test_hedged_stream_uses_faster_request())
+    loop.run_until_complete(test_hedge_skipped_without_spare_capacity())
+    
+    # Run the sync tests
+    test_hedge_delay_percentile()
+    test_compact_form_data_strips_empty_fields()
+    test_pack_snippets_fills_budget_by_relevance()
+    test_ems_prompt_stays_within_budget()
     
     print("All OpenAI tests passed!")
\ No newline at end of file
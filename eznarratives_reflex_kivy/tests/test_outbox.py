@@ -0,0 +1,142 @@
+"""
+Test Offline Outbox
+===================
+
+This module tests the SQLite-backed offline outbox.
+"""
+
+import os
+import sys
+import json
+import asyncio
+import tempfile
+import pytest
+
+# Add the parent directory to the path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib.outbox import Outbox
+
+
+@pytest.fixture
+def outbox_path():
+    """Temporary path for an outbox database."""
+    with tempfile.TemporaryDirectory() as directory:
+        yield os.path.join(directory, "outbox.sqlite3")
+
+
+def test_enqueue_persists_across_instances(outbox_path):
+    """Test that queued records survive reopening the database."""
+    outbox = Outbox(outbox_path)
+    first = outbox.enqueue("ems_narrative", {"content": "First"})
+    second = outbox.enqueue("ems_narrative", {"content": "Second"})
+    outbox.close()
+
+    assert first != second
+
+    reopened = Outbox(outbox_path)
+    entries = reopened.due("ems_narrative")
+
+    assert [entry.payload["content"] for entry in entries] == ["First", "Second"]
+    assert [entry.idempotency_key for entry in entries] == [first, second]
+    reopened.close()
+
+
+def test_enqueue_is_idempotent(outbox_path):
+    """Test that enqueuing the same key twice keeps one record."""
+    outbox = Outbox(outbox_path)
+    outbox.enqueue("ems_narrative", {"content": "Report"}, idempotency_key="abc")
+    outbox.enqueue("ems_narrative", {"content": "Report"}, idempotency_key="abc")
+
+    assert outbox.count() == 1
+
+
+@pytest.mark.asyncio
+async def test_flush_sends_in_batches(outbox_path):
+    """Test that queued records are delivered in batches and removed."""
+    outbox = Outbox(outbox_path)
+    for i in range(30):
+        outbox.enqueue("ems_narrative", {"content": f"Report {i}"})
+    outbox.enqueue("fire_narrative", {"content": "Fire report"})
+
+    batches = []
+
+    async def send_batch(entries):
+        batches.append([entry.payload["content"] for entry in entries])
+
+    sent = await outbox.flush(send_batch, kind="ems_narrative", batch_size=50)
+
+    assert sent == 30
+    assert len(batches) == 1
+    assert batches[0][0] == "Report 0"
+    assert outbox.count("ems_narrative") == 0
+    assert outbox.count("fire_narrative") == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_is_retried_with_backoff(outbox_path):
+    """Test that a failed batch stays queued and is not due until the backoff elapses."""
+    outbox = Outbox(outbox_path, backoff_base=60)
+    outbox.enqueue("ems_narrative", {"content": "Report"})
+
+    async def failing_send(entries):
+        raise ConnectionError("offline")
+
+    sent = await outbox.flush(failing_send)
+
+    assert sent == 0
+    assert outbox.count() == 1
+    assert outbox.due() == []
+
+    # With no backoff the record is retried immediately
+    outbox.backoff_base = 0
+    outbox.fail([row[0] for row in outbox._conn.execute("SELECT id FROM outbox")], "offline")
+    entries = outbox.due()
+
+    assert len(entries) == 1
+    assert entries[0].attempts == 2
+
+
+@pytest.mark.asyncio
+async def test_rejected_rows_stay_queued(outbox_path):
+    """Test that only rows reported as rejected are kept for retry."""
+    outbox = Outbox(outbox_path, backoff_base=60)
+    for i in range(3):
+        outbox.enqueue("ems_narrative", {"content": f"Report {i}"})
+
+    async def send_batch(entries):
+        return {entries[1].id: "violates check constraint"}
+
+    sent = await outbox.flush(send_batch)
+
+    assert sent == 2
+    assert outbox.count() == 1
+    assert outbox.due() == []
+
+
+def test_import_json_files(outbox_path):
+    """Test that legacy JSON cache files are moved into the outbox."""
+    outbox = Outbox(outbox_path)
+    legacy_dir = os.path.dirname(outbox_path)
+    for name in ["ems_narrative_20240101120000.json", "fire_narrative_20240101120000.json"]:
+        with open(os.path.join(legacy_dir, name), "w") as f:
+            json.dump({"content": name}, f)
+
+    imported = outbox.import_json_files(legacy_dir, "ems_narrative_", "ems_narrative")
+
+    assert imported == 1
+    assert outbox.count("ems_narrative") == 1
+    assert not os.path.exists(os.path.join(legacy_dir, "ems_narrative_20240101120000.json"))
+    assert os.path.exists(os.path.join(legacy_dir, "fire_narrative_20240101120000.json"))
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as directory:
+        test_enqueue_persists_across_instances(os.path.join(directory, "a.sqlite3"))
+        test_enqueue_is_idempotent(os.path.join(directory, "b.sqlite3"))
+        asyncio.run(test_flush_sends_in_batches(os.path.join(directory, "c.sqlite3")))
+        asyncio.run(test_failed_batch_is_retried_with_backoff(os.path.join(directory, "d.sqlite3")))
+        asyncio.run(test_rejected_rows_stay_queued(os.path.join(directory, "e.sqlite3")))
+        test_import_json_files(os.path.join(directory, "f.sqlite3"))
+
+    print("All outbox tests passed!")
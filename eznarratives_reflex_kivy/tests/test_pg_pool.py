@@ -0,0 +1,190 @@
+"""
+Test PostgreSQL Connection Pool
+===============================
+
+This module tests the connection pool with fake connections.
+"""
+
+import os
+import sys
+import time
+import threading
+import pytest
+import psycopg2.extensions as extensions
+
+# Add the parent directory to the path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib.pg_pool import PgConnectionPool, PoolTimeout
+
+
+class FakeCursor:
+    """Fake cursor that can be told to fail."""
+    
+    def __init__(self, conn):
+        self.conn = conn
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *args):
+        return False
+    
+    def execute(self, query):
+        if self.conn.broken:
+            raise Exception("server closed the connection unexpectedly")
+
+
+class FakeConnection:
+    """Fake psycopg2 connection."""
+    
+    def __init__(self):
+        self.closed = 0
+        self.broken = False
+        self.rollbacks = 0
+        self.transaction_status = extensions.TRANSACTION_STATUS_IDLE
+    
+    def cursor(self):
+        return FakeCursor(self)
+    
+    def rollback(self):
+        self.rollbacks += 1
+        self.transaction_status = extensions.TRANSACTION_STATUS_IDLE
+    
+    def get_transaction_status(self):
+        return self.transaction_status
+    
+    def close(self):
+        self.closed = 1
+
+
+def make_pool(**kwargs):
+    created = []
+    
+    def connect():
+        conn = FakeConnection()
+        created.append(conn)
+        return conn
+    
+    return PgConnectionPool(connect, **kwargs), created
+
+
+def test_connections_are_reused():
+    """Test that a returned connection is handed out again."""
+    pool, created = make_pool(min_size=1, max_size=2)
+    pool.open()
+    
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        pass
+    
+    assert first is second
+    assert len(created) == 1
+    assert pool.stats()["checkouts"] == 2
+
+
+def test_open_transaction_is_rolled_back():
+    """Test that connections are reset before going back to the pool."""
+    pool, created = make_pool()
+    
+    with pool.connection() as conn:
+        conn.transaction_status = extensions.TRANSACTION_STATUS_INTRANS
+    
+    assert conn.rollbacks == 1
+
+
+def test_checkout_times_out_when_exhausted():
+    """Test that checkout waits and then times out at max_size."""
+    pool, created = make_pool(max_size=1)
+    conn = pool.getconn()
+    
+    with pytest.raises(PoolTimeout):
+        pool.getconn(timeout=0.05)
+    
+    assert pool.stats()["timeouts"] == 1
+    pool.putconn(conn)
+
+
+def test_waiter_gets_released_connection():
+    """Test that a waiting thread receives a connection once one is returned."""
+    pool, created = make_pool(max_size=1)
+    conn = pool.getconn()
+    result = {}
+    
+    def worker():
+        result["conn"] = pool.getconn(timeout=2)
+    
+    thread = threading.Thread(target=worker)
+    thread.start()
+    time.sleep(0.05)
+    assert pool.stats()["waiting"] == 1
+    
+    pool.putconn(conn)
+    thread.join()
+    
+    assert result["conn"] is conn
+
+
+def test_unhealthy_connection_is_replaced():
+    """Test that a broken idle connection is discarded on checkout."""
+    pool, created = make_pool(health_check_interval=0)
+    
+    with pool.connection() as conn:
+        pass
+    conn.broken = True
+    
+    with pool.connection() as replacement:
+        pass
+    
+    assert replacement is not conn
+    assert conn.closed
+    assert pool.stats()["size"] == 1
+
+
+def test_expired_connection_is_retired():
+    """Test that connections past max_lifetime are not reused."""
+    pool, created = make_pool(max_lifetime=0)
+    
+    with pool.connection() as conn:
+        pass
+    
+    assert conn.closed
+    assert pool.stats()["size"] == 0
+
+
+def test_idle_connections_are_reaped():
+    """Test that idle connections above min_size are closed."""
+    pool, created = make_pool(min_size=1, max_size=3, max_idle=0)
+    conns = [pool.getconn() for _ in range(3)]
+    for conn in conns:
+        pool.putconn(conn)
+    time.sleep(0.01)
+    
+    with pool.connection():
+        pass
+    
+    assert pool.stats()["size"] == 1
+
+
+def test_closed_connection_frees_slot():
+    """Test that a caller closing a connection does not leak a pool slot."""
+    pool, created = make_pool(max_size=1)
+    conn = pool.getconn()
+    conn.close()
+    
+    with pool.connection() as replacement:
+        assert replacement is not conn
+
+
+if __name__ == "__main__":
+    test_connections_are_reused()
+    test_open_transaction_is_rolled_back()
+    test_checkout_times_out_when_exhausted()
+    test_waiter_gets_released_connection()
+    test_unhealthy_connection_is_replaced()
+    test_expired_connection_is_retired()
+    test_idle_connections_are_reaped()
+    test_closed_connection_frees_slot()
+    
+    print("All connection pool tests passed!")
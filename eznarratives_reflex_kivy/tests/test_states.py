@@ -9,7 +9,7 @@ import os
 import sys
 import pytest
 import asyncio
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
 from dotenv import load_dotenv
 
 # Add the parent directory to the path so we can import our modules
@@ -94,6 +94,37 @@ class TestSessionState:
                 # Check that sign_up was called with the correct arguments
                 mock_sign_up.assert_called_once()
 
+    
+    @pytest.mark.asyncio
+    async def test_add_message_to_session(self):
+        """Test that adding a message is a single append-only insert."""
+        # Create a session state with an active session
+        session_state = SessionState()
+        session_state.user = {"id": "123"}
+        session_state.active_session = "session-1"
+        
+        # Mock the supabase client
+        with patch('lib.supabase.supabase') as mock_supabase:
+            mock_table = MagicMock()
+            # The client is synchronous: execute() returns the response
+            mock_table.insert.return_value.execute = MagicMock(return_value=MagicMock(data=[]))
+            mock_supabase.table.return_value = mock_table
+            
+            # Add a message
+            await session_state.add_message_to_session("user", "Hello", "10:00 AM")
+            
+            # Check that only session_messages was touched, with one insert and no read
+            mock_supabase.table.assert_called_once_with("session_messages")
+            mock_table.insert.assert_called_once_with({
+                "session_id": "session-1",
+                "user_id": "123",
+                "type": "user",
+                "content": "Hello",
+                "timestamp": "10:00 AM"
+            })
+            mock_table.select.assert_not_called()
+            mock_table.insert.return_value.execute.assert_called_once_with()
+
 
 class TestUIState:
     """Test the UIState class."""
@@ -147,7 +178,7 @@ class TestEMSState:
     """Test the EMSState class."""
     
     def test_form_data(self):
-        """Test the form_data property."""
+        """Test the form data snapshot."""
         # Create an EMS state
         ems_state = EMSState()
         
@@ -159,7 +190,7 @@ class TestEMSState:
         ems_state.chief_complaint = "Chest pain"
         
         # Get the form data
-        form_data = ems_state.form_data
+        form_data = ems_state._build_form_data(timestamp="2025-01-01 10:00:00")
         
         # Check that the form data contains the expected values
         assert form_data["unit"] == "Medic 1"
@@ -167,6 +198,47 @@ class TestEMSState:
         assert form_data["patient_sex"] == "Male"
         assert form_data["patient_age"] == "65"
         assert form_data["chief_complaint"] == "Chest pain"
+        assert form_data["timestamp"] == "2025-01-01 10:00:00"
+    
+    @pytest.mark.asyncio
+    async def test_update_fields(self):
+        """Test the batched update_fields method."""
+        # Create an EMS state
+        ems_state = EMSState()
+        
+        # Apply a batch with valid, unknown and mistyped fields
+        await ems_state.update_fields({
+            "unit": "Medic 1",
+            "chief_complaint": "Chest pain",
+            "aao_person": False,
+            "selected_abnormal_vitals": ["Hypertensive"],
+            "narrative_text": "injected",
+            "patient_age": 65,
+        })
+        
+        # Check that only known, well-typed fields were applied
+        assert ems_state.unit == "Medic 1"
+        assert ems_state.chief_complaint == "Chest pain"
+        assert ems_state.aao_person is False
+        assert ems_state.selected_abnormal_vitals == ["Hypertensive"]
+        assert ems_state.narrative_text == ""
+        assert ems_state.patient_age == ""
+    
+    @pytest.mark.asyncio
+    async def test_cancel_generation(self):
+        """Test that cancel_generation only flags a running generation."""
+        # Create an EMS state
+        ems_state = EMSState()
+        
+        # Nothing to cancel while idle
+        await ems_state.cancel_generation()
+        assert ems_state._cancel_requested is False
+        
+        # A running generation is flagged and reports that it is stopping
+        ems_state.is_generating = True
+        await ems_state.cancel_generation()
+        assert ems_state._cancel_requested is True
+        assert ems_state.generation_status == "Cancelling"
     
     @pytest.mark.asyncio
     async def test_prefill_form(self):
@@ -200,7 +272,7 @@ class TestFireState:
     """Test the FireState class."""
     
     def test_form_data(self):
-        """Test the form_data property."""
+        """Test the form data snapshot."""
         # Create a Fire state
         fire_state = FireState()
         
@@ -210,13 +282,34 @@ class TestFireState:
         fire_state.additional_info = "Two-story residential structure with heavy smoke showing from second floor."
         
         # Get the form data
-        form_data = fire_state.form_data
+        form_data = fire_state._build_form_data()
         
         # Check that the form data contains the expected values
         assert form_data["unit"] == "Engine 3"
         assert form_data["emergency_type"] == "Structure Fire"
         assert form_data["additional_info"] == "Two-story residential structure with heavy smoke showing from second floor."
     
+    @pytest.mark.asyncio
+    async def test_update_fields(self):
+        """Test the batched update_fields method."""
+        # Create a Fire state
+        fire_state = FireState()
+        
+        # Apply a batch of field edits
+        await fire_state.update_fields({
+            "unit": "Engine 3",
+            "emergency_type": "Other",
+            "custom_emergency_type": "Boat Fire",
+            "is_generating": True,
+        })
+        
+        # Check that known fields were applied and derived state updated
+        assert fire_state.unit == "Engine 3"
+        assert fire_state.emergency_type == "Other"
+        assert fire_state.custom_emergency_type == "Boat Fire"
+        assert fire_state.show_custom_emergency_type is True
+        assert fire_state.is_generating is False
+    
     @pytest.mark.asyncio
     async def test_prefill_form(self):
         """Test the prefill_form method."""
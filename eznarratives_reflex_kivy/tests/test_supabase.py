@@ -9,7 +9,9 @@ import os
 import sys
 import pytest
 import asyncio
+from unittest.mock import MagicMock, patch
 from dotenv import load_dotenv
+from postgrest import APIError
 
 # Add the parent directory to the path so we can import our modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -17,7 +19,16 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 # Load environment variables
 load_dotenv(".env.local")
 
-from lib.supabase import supabase, is_supabase_configured, get_pg_connection
+from lib.supabase import (
+    supabase,
+    is_supabase_configured,
+    get_pg_connection,
+    pg_connection,
+    bulk_save_narratives,
+    insert_session_message,
+    fetch_session_page,
+    fetch_message_page
+)
 
 
 def test_supabase_configured():
@@ -61,14 +72,148 @@ def test_postgres_connection():
         pytest.fail(f"PostgreSQL connection failed: {str(e)}")
 
 
+def test_postgres_pooled_connection():
+    """Test that pooled PostgreSQL connections are reused."""
+    try:
+        with pg_connection() as conn:
+            first_id = id(conn)
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+                assert cursor.fetchone() == (1,)
+        
+        with pg_connection() as conn:
+            assert id(conn) == first_id
+    except Exception as e:
+        pytest.fail(f"PostgreSQL pooled connection failed: {str(e)}")
+
+
+def make_fake_narratives_table(requests):
+    """Fake narratives table that rejects rows with a "bad" key."""
+    def write(rows, **kwargs):
+        requests.append(list(rows))
+        
+        def execute():
+            if any(row.get("bad") for row in rows):
+                raise APIError({"message": "violates check constraint"})
+            return MagicMock(data=[{"id": f"id-{row['title']}", **row} for row in rows])
+        
+        query = MagicMock()
+        query.execute = execute
+        return query
+    
+    table = MagicMock()
+    table.insert.side_effect = write
+    table.upsert.side_effect = write
+    return table
+
+
+@pytest.mark.asyncio
+async def test_bulk_save_narratives_chunks_requests():
+    """Test that narratives are written in chunked multi-row requests."""
+    requests = []
+    narratives = [{"title": str(i)} for i in range(5)]
+    
+    with patch("lib.supabase.supabase") as mock_supabase:
+        mock_supabase.from_.return_value = make_fake_narratives_table(requests)
+        results = await bulk_save_narratives(narratives, chunk_size=2)
+    
+    assert [len(rows) for rows in requests] == [2, 2, 1]
+    assert [result["id"] for result in results] == [f"id-{i}" for i in range(5)]
+    assert all(result["error"] is None for result in results)
+
+
+@pytest.mark.asyncio
+async def test_bulk_save_narratives_isolates_bad_rows():
+    """Test that a rejected row gets an error without failing its chunk."""
+    requests = []
+    narratives = [{"title": str(i), "idempotency_key": f"key-{i}"} for i in range(4)]
+    narratives[2]["bad"] = True
+    
+    with patch("lib.supabase.supabase") as mock_supabase:
+        mock_supabase.from_.return_value = make_fake_narratives_table(requests)
+        results = await bulk_save_narratives(narratives, upsert=True)
+    
+    assert [result["id"] for result in results] == ["id-0", "id-1", None, "id-3"]
+    assert results[2]["error"]
+    assert all(results[i]["error"] is None for i in (0, 1, 3))
+
+
+@pytest.mark.asyncio
+async def test_insert_session_message_with_sync_client():
+    """Test that a session message is one insert on the synchronous client."""
+    row = {"session_id": "session-1", "user_id": "123", "type": "user", "content": "Hello", "timestamp": "10:00 AM"}
+    
+    with patch("lib.supabase.supabase") as mock_supabase:
+        table = MagicMock()
+        table.insert.return_value.execute = MagicMock(return_value=MagicMock(data=[row]))
+        mock_supabase.table.return_value = table
+        
+        assert await insert_session_message(row) is True
+    
+    mock_supabase.table.assert_called_once_with("session_messages")
+    table.insert.assert_called_once_with(row)
+    table.insert.return_value.execute.assert_called_once_with()
+
+
+def make_fake_query(rows):
+    """Fake synchronous query builder that records its calls."""
+    query = MagicMock()
+    for method in ("select", "eq", "or_", "order", "limit"):
+        getattr(query, method).return_value = query
+    # Like supabase-py's sync client, execute() returns the response itself
+    query.execute = MagicMock(return_value=MagicMock(data=rows))
+    return query
+
+
+@pytest.mark.asyncio
+async def test_fetch_session_page_uses_keyset_cursor():
+    """Test that a session page continues after the (date, id) cursor."""
+    rows = [{"id": "session-2", "name": "Session", "date": "2025-04-26"}]
+    query = make_fake_query(rows)
+    
+    with patch("lib.supabase.supabase") as mock_supabase:
+        mock_supabase.table.return_value = query
+        first = await fetch_session_page("123", limit=21)
+        result = await fetch_session_page("123", {"date": "2025-04-26", "id": "session-3"}, limit=21)
+    
+    assert first == rows and result == rows
+    mock_supabase.table.assert_called_with("sessions")
+    query.or_.assert_called_once_with('date.lt."2025-04-26",and(date.eq."2025-04-26",id.lt."session-3")')
+    query.limit.assert_called_with(21)
+    assert query.execute.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_fetch_message_page_uses_keyset_cursor():
+    """Test that a message window continues before the (created_at, id) cursor."""
+    query = make_fake_query(None)
+    
+    with patch("lib.supabase.supabase") as mock_supabase:
+        mock_supabase.table.return_value = query
+        result = await fetch_message_page("session-1", {"created_at": "2025-04-26T10:00:00Z", "id": 7}, limit=51)
+    
+    assert result == []
+    mock_supabase.table.assert_called_once_with("session_messages")
+    query.or_.assert_called_once_with(
+        'created_at.lt."2025-04-26T10:00:00Z",and(created_at.eq."2025-04-26T10:00:00Z",id.lt.7)'
+    )
+    query.execute.assert_called_once_with()
+
+
 if __name__ == "__main__":
     # Run the async tests
     loop = asyncio.get_event_loop()
     loop.run_until_complete(test_supabase_auth())
     loop.run_until_complete(test_supabase_database())
+    loop.run_until_complete(test_bulk_save_narratives_chunks_requests())
+    loop.run_until_complete(test_bulk_save_narratives_isolates_bad_rows())
+    loop.run_until_complete(test_insert_session_message_with_sync_client())
+    loop.run_until_complete(test_fetch_session_page_uses_keyset_cursor())
+    loop.run_until_complete(test_fetch_message_page_uses_keyset_cursor())
     
     # Run the sync tests
     test_supabase_configured()
     test_postgres_connection()
+    test_postgres_pooled_connection()
     
     print("All Supabase tests passed!")
\ No newline at end of file
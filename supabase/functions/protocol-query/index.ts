@@ -35,6 +35,124 @@ async function generateEmbedding(text: string): Promise<number[]> {
   }
 }
 
+// Query embedding cache. Recent embeddings are kept in memory for the life
+// of this function instance; the query_embedding_cache table is shared with
+// the Python app (db-scripts/create-query-embedding-cache-table.sql).
+const EMBEDDING_CACHE_MAX_ENTRIES = 500;
+const embeddingCache = new Map<string, number[]>();
+
+/**
+ * Normalize a query so trivially different phrasings share a cache entry
+ * @param text - The query text
+ * @returns The lowercased text with whitespace collapsed
+ */
+function normalizeQuery(text: string): string {
+  return text.toLowerCase().split(/\s+/).filter(Boolean).join(' ');
+}
+
+/**
+ * Build the cache key for a query: hex SHA-256 of "<model>\n<normalized text>"
+ * @param text - The query text
+ * @returns The cache key
+ */
+async function embeddingCacheKey(text: string): Promise<string> {
+  const data = new TextEncoder().encode(`${EMBEDDING_MODEL}\n${normalizeQuery(text)}`);
+  const digest = await crypto.subtle.digest('SHA-256', data);
+  return Array.from(new Uint8Array(digest))
+    .map((byte) => byte.toString(16).padStart(2, '0'))
+    .join('');
+}
+
+/**
+ * Pack an embedding as little-endian float32 in Postgres bytea hex format
+ * @param embedding - The embedding
+ * @returns The bytea literal
+ */
+function packEmbedding(embedding: number[]): string {
+  const view = new DataView(new ArrayBuffer(embedding.length * 4));
+  embedding.forEach((value, i) => view.setFloat32(i * 4, value, true));
+  return '\\x' + Array.from(new Uint8Array(view.buffer))
+    .map((byte) => byte.toString(16).padStart(2, '0'))
+    .join('');
+}
+
+/**
+ * Unpack a bytea hex string of little-endian float32 values
+ * @param hex - The bytea value as returned by PostgREST
+ * @returns The embedding
+ */
+function unpackEmbedding(hex: string): number[] {
+  const digits = hex.startsWith('\\x') ? hex.slice(2) : hex;
+  const bytes = new Uint8Array(digits.length / 2);
+  for (let i = 0; i < bytes.length; i++) {
+    bytes[i] = parseInt(digits.substr(i * 2, 2), 16);
+  }
+  const view = new DataView(bytes.buffer);
+  const embedding = new Array<number>(bytes.length / 4);
+  for (let i = 0; i < embedding.length; i++) {
+    embedding[i] = view.getFloat32(i * 4, true);
+  }
+  return embedding;
+}
+
+/**
+ * Remember an embedding in memory, evicting the least recently used entry
+ * @param key - The cache key
+ * @param embedding - The embedding
+ */
+function rememberEmbedding(key: string, embedding: number[]) {
+  embeddingCache.delete(key);
+  embeddingCache.set(key, embedding);
+  if (embeddingCache.size > EMBEDDING_CACHE_MAX_ENTRIES) {
+    embeddingCache.delete(embeddingCache.keys().next().value);
+  }
+}
+
+/**
+ * Get the embedding for a query from the cache, generating it on a miss
+ * @param text - The query text
+ * @returns A vector of embeddings
+ */
+async function getQueryEmbedding(text: string): Promise<number[]> {
+  const key = await embeddingCacheKey(text);
+  const cached = embeddingCache.get(key);
+  if (cached) {
+    rememberEmbedding(key, cached);
+    return cached;
+  }
+
+  const { data, error } = await supabase
+    .from('query_embedding_cache')
+    .select('embedding')
+    .eq('cache_key', key)
+    .maybeSingle();
+  if (error) {
+    console.error('Error reading query embedding cache:', error);
+  }
+
+  let embedding = data ? unpackEmbedding(data.embedding) : null;
+  if (!embedding) {
+    embedding = await generateEmbedding(text);
+    const { error: insertError } = await supabase
+      .from('query_embedding_cache')
+      .upsert(
+        {
+          cache_key: key,
+          model: EMBEDDING_MODEL,
+          dimensions: embedding.length,
+          embedding: packEmbedding(embedding),
+        },
+        { onConflict: 'cache_key', ignoreDuplicates: true }
+      );
+    if (insertError) {
+      console.error('Error writing query embedding cache:', insertError);
+    }
+  }
+
+  rememberEmbedding(key, embedding);
+  return embedding;
+}
+
 serve(async (req) => {
   try {
     // CORS headers
@@ -68,7 +186,7 @@ serve(async (req) => {
     }
 
     // Generate embedding for the question
-    const embedding = await generateEmbedding(question);
+    const embedding = await getQueryEmbedding(question);
 
     // Query the database for similar embeddings
     const { data, error } = await supabase.rpc('match_embeddings', {